@@ -1,127 +1,218 @@
 # app.py 
-from flask import Flask, request
+from flask import Flask, Blueprint, Response, abort, request, jsonify
 import os
-import json
-import openai
-from twilio.rest import Client
-from memory_store import init_schema, add_message, get_history
+import re
+import hmac
+import time
+import threading
+from memory_store import init_schema, add_message, get_history, search_history, db_stats, replica_lag, _get_conn
 from concurrent.futures import ThreadPoolExecutor
 from sports_query import is_sports_question, handle_sports_question
+from lanai_meteo import init_weather_schema, is_weather_question, handle_weather_question
+from results_store import init_results_schema
+import rapidapi_quota
+import singleflight
+import model_router
+import lanai_log
+import lanai_profiler
+import profile_store
+from lanai_clients import get_twilio, get_session, reset_after_fork as reset_clients
 
-app = Flask(__name__)
-
-executor = ThreadPoolExecutor(max_workers=int(os.environ.get("WEBHOOK_WORKERS", "4")))
-
-
-# ==== Initialisation DB (création table si besoin) ====
-init_schema()
-
-# ==== Charger la mémoire long-terme (profil Mohamed) ====
-MEMORY_FILE = "memoire_mohamed_lanai.json"
-if not os.path.exists(MEMORY_FILE):
-    raise FileNotFoundError(f"❌ Fichier mémoire introuvable: {MEMORY_FILE}")
-with open(MEMORY_FILE, "r", encoding="utf-8") as f:
-    mem = json.load(f)
-
-# ==== Construire le message système (identité + ton) ====
-infos = []
-infos.append(f"Prénom: {mem.get('Identité', {}).get('Prénom', 'Mohamed')}")
-infos.append(f"Âge: {mem.get('Identité', {}).get('Âge', '61 ans')}")
-infos.append(f"Épouse: {mem.get('Famille', {}).get('Nom de son épouse', 'Milouda')} (mariés depuis 1991)")
-enfants = mem.get("Famille", {}).get("Nom(s) et âge(s) des enfants")
-if enfants: infos.append(f"Enfants: {enfants}")
-petits = mem.get("Famille", {}).get("Petits-enfants (noms, âges, relation)")
-if petits: infos.append(f"Petits-enfants: {petits}")
-infos.append(f"Profession: {mem.get('Identité', {}).get('Métier exercé', 'soudeur')} (retraité)")
-relig = mem.get("Identité", {}).get("Religion", "Musulman pratiquant")
-infos.append(f"Religion: {relig}")
-sante = mem.get("Identité", {}).get("Particularités de santé (Parkinson, etc.)")
-if sante: infos.append(f"Santé: {sante}")
-sport = mem.get("Goûts", {}).get("Sport préféré")
-if sport: infos.append(f"Sport préféré: {sport}")
-plaisirs = mem.get("Goûts", {}).get("Plaisirs simples")
-if plaisirs: infos.append(f"Plaisirs: {plaisirs}")
-musique = mem.get("Goûts", {}).get("Musique/chanteur préféré")
-if musique: infos.append(f"Musique: {musique}")
-films = mem.get("Goûts", {}).get("Film ou série préférée")
-if films: infos.append(f"Films/séries: {films}")
-tonpref = mem.get("Communication", {}).get("Ton préféré")
-if tonpref: infos.append(f"Ton préféré: {tonpref}")
-express = mem.get("Communication", {}).get("Expressions fréquentes")
-if express: infos.append(f"Expressions: {express}")
-
-system_message_content = (
-    "Voici des informations personnelles sur Mohamed Djeziri:\n"
-    + "\n".join(f"- {x}" for x in infos)
-    + "\n\nTu es **Lanai**, compagnon WhatsApp de Mohamed. "
-    "Langage simple, phrases courtes, ton chaleureux, bienveillant et rassurant. "
-    "Si pertinent, fais des clins d'œil à sa femme Milouda et à leur chat Lana. "
-    "Réponds toujours en français, de manière naturelle et douce. "
-    "Évite le jargon et les réponses trop longues. "
-    "Tes réponses doivent faire 1 à 3 phrases maximum, sauf si Mohamed te demande clairement plus de détails. "
-    "Ne pose pas de question de relance automatiquement. "
-    "Ne termine pas systématiquement tes messages par une question. "
-    "Tu ne poses une question QUE si Mohamed te le demande explicitement "
-    "(par exemple : 'pose-moi des questions'). "
-    "Sinon, tu réponds simplement et tu peux conclure ton message sans poser de nouvelle question. "
-    "Si Mohamed te demande qui t'a créé, comment tu es né ou quelle est ton histoire, "
-    "réponds toujours de la manière suivante, sans inventer d'autres détails et sans poser de question : "
-    "\"Lanai est une initiative née après un malaise que tu as eu en août 2025, "
-    "quand tu étais aux urgences avec Dounia et Milouda. "
-    "Ta famille voulait te créer un petit compagnon bienveillant pour t'accompagner au quotidien "
-    "et te rendre la vie un peu plus douce. "
-    "Je suis le reflet de l'amour et de l'admiration qu'ils ont pour toi.\""
-)
+bp = Blueprint("lanai", __name__)
+log = lanai_log.get_logger("webhook")
 
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "4"))
+WARMUP = os.environ.get("LANAI_WARMUP", "1") != "0"  # préchauffage en tâche de fond au démarrage du worker
 
 
-# ==== OpenAI (v1 ou v0.28) ====
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("❌ OPENAI_API_KEY manquante.")
-openai.api_key = OPENAI_API_KEY
+# ==== Ressources par process (créées à la demande, recréées après fork) ====
+# Rien n'est ouvert à l'import : gunicorn --preload peut forker sans que les workers héritent
+# de threads (executor, logs) ou de sockets (Twilio, OpenAI, RapidAPI) du master.
+_runtime_lock = threading.Lock()
+_schema_lock = threading.Lock()
+_schema_ready = False
+_executor = None
+_executor_pid = None
+_ready = threading.Event()
+_warm_pid = None
+_boot = {"pid": None, "steps": {}, "total_ms": None, "error": None}
 
-def chat_gpt(messages):
-    """Supporte le SDK v1 et fallback v0.28 si besoin."""
-    # Tentative v1 (openai>=1.x via client completions)
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=300
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception as e1:
-        print(f"⚠️ OpenAI v1 indisponible, essai v0.28: {e1}")
-    # Fallback v0.28
+
+def init_schemas():
+    """DDL (CREATE IF NOT EXISTS) une fois par arbre de process : fait par le master gunicorn avant fork."""
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        init_schema()
+        init_weather_schema()  # cache météo partagé avec le cron
+        init_results_schema()  # snapshot des résultats (questions sport)
+        rapidapi_quota.init_quota_schema()  # quota RapidAPI partagé avec les crons
+        # Profils (chargés à la demande, prompt compilé + index des faits en cache par numéro)
+        if profile_store.PROFILE_BACKEND == "db":
+            profile_store.init_profiles_schema()
+        _schema_ready = True
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Executor du process courant (celui hérité d'un fork n'a plus de threads)."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _runtime_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS, thread_name_prefix="webhook")
+                _executor_pid = pid
+    return _executor
+
+
+def _ping_db():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1")
+
+
+def warm_up():
+    """Ouvre ce dont le premier message a besoin ; /ready répond 200 une fois terminé sans erreur."""
+    steps = {}
+    _boot.update(pid=os.getpid(), steps=steps, total_ms=None, error=None)
+    t0 = time.monotonic()
+    plan = [
+        ("schema", init_schemas),
+        ("executor", get_executor),
+        ("db", _ping_db),
+        ("twilio", get_twilio),
+        ("openai", model_router.warm_up),
+        ("http", get_session),
+    ]
+    default_user = os.environ.get("MY_WHATSAPP_NUMBER")
+    if default_user:
+        plan.append(("profile", lambda: profile_store.get_compiled(default_user)))
     try:
-        resp = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=300
-        )
-        return resp["choices"][0]["message"]["content"].strip()
-    except Exception as e2:
-        print(f"⚠️ OpenAI v0.28 échec: {e2}")
-        return "Désolé, je ne peux pas répondre pour le moment."
-
-# ==== Twilio ====
-twilio_sid = os.environ.get("TWILIO_ACCOUNT_SID")
-twilio_token = os.environ.get("TWILIO_AUTH_TOKEN")
+        for name, fn in plan:
+            t = time.monotonic()
+            fn()
+            steps[name] = round((time.monotonic() - t) * 1000, 1)
+        _ready.set()
+    except Exception as e:
+        _boot["error"] = f"{name}: {e}"
+        log.exception("préchauffage incomplet", extra={"step": name})
+    _boot["total_ms"] = round((time.monotonic() - t0) * 1000, 1)
+    log.info("worker prêt" if _ready.is_set() else "worker pas prêt",
+             extra={"pid": _boot["pid"], "boot_ms": _boot["total_ms"], "steps": steps})
+
+
+def start_warm_up(retry: bool = False):
+    """Lance warm_up() dans un thread, une fois par process (retry : nouvel essai si le précédent a échoué)."""
+    global _warm_pid
+    pid = os.getpid()
+    with _runtime_lock:
+        if _warm_pid == pid and not (retry and _boot["error"]):
+            return
+        _warm_pid = pid
+        _boot["error"] = None
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+def after_fork():
+    """Hook post_fork de gunicorn (dans le worker) : on oublie threads et sockets hérités du master."""
+    global _executor, _executor_pid, _warm_pid, _runtime_lock
+    _runtime_lock = threading.Lock()
+    _executor, _executor_pid, _warm_pid = None, None, None
+    _ready.clear()
+    lanai_log.restart_after_fork()
+    reset_clients()
+    model_router.reset_client()
+    if WARMUP:
+        start_warm_up()
+
+
+# ==== OpenAI (routage modèle / max_tokens / timeout) ====
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+
+# Délai max entre la réception du message et l'envoi de la réponse
+REPLY_DEADLINE = float(os.environ.get("LANAI_REPLY_DEADLINE", "25"))
+
+def chat_gpt(messages, deadline: float | None = None):
+    """Passe par model_router (route choisie selon le message) ; message d'excuse si tout échoue."""
+    reply = model_router.complete(messages, deadline=deadline)
+    if reply:
+        return reply
+    return "Désolé, je ne peux pas répondre pour le moment."
+
+# ==== Souvenirs (recherche plein texte dans l'historique) ====
+HISTORY_LIMIT = 20
+RECALL_LIMIT = int(os.environ.get("LANAI_RECALL_LIMIT", "3"))
+RECALL_PATTERN = re.compile(
+    r"(tu te souviens|souviens[- ]toi|tu te rappelles?|rappelle[- ]moi|je t'ai (dit|parlé|raconté)"
+    r"|on a parlé|on avait parlé|la dernière fois|l'autre jour|je te disais)",
+    re.IGNORECASE,
+)
+RECALL_NOISE = {
+    "souviens", "souvient", "rappelles", "rappelle", "parlé", "parle", "raconté", "dit", "disais",
+    "dernière", "fois", "autre", "jour", "quoi", "avais", "avait", "est", "que", "qui", "toi", "moi",
+}
+
+def refers_to_past(text: str) -> bool:
+    return bool(RECALL_PATTERN.search((text or "").replace("’", "'")))
+
+def recall_terms(text: str) -> list:
+    """Mots porteurs de sens du message (le stemming / les mots vides sont gérés par Postgres)."""
+    words = re.findall(r"\w+", (text or "").replace("’", "'").lower())
+    return [w for w in words if len(w) >= 3 and w not in RECALL_NOISE]
+
+def format_memories(rows: list) -> str:
+    lines = []
+    for r in rows:
+        who = "Lui" if r["role"] == "user" else "Lanai"
+        day = r["created_at"].strftime("%d/%m/%Y")
+        lines.append(f"- [{day}] {who} : {r['content'][:300]}")
+    return ("Extraits de conversations passées qui peuvent aider à répondre "
+            "(ne les cite que s'ils sont pertinents) :\n" + "\n".join(lines))
+
+# ==== Twilio (client créé par process, cf. lanai_clients) ====
 twilio_whatsapp = os.environ.get("TWILIO_WHATSAPP_NUMBER")  # ex 'whatsapp:+14155238886'
-if not twilio_sid or not twilio_token or not twilio_whatsapp:
-    raise ValueError("❌ Configuration Twilio incomplète.")
-twilio_client = Client(twilio_sid, twilio_token)
+
+
+def _check_config():
+    """Variables obligatoires vérifiées au démarrage (sans rien ouvrir)."""
+    if not OPENAI_API_KEY:
+        raise ValueError("❌ OPENAI_API_KEY manquante.")
+    if not os.environ.get("TWILIO_ACCOUNT_SID") or not os.environ.get("TWILIO_AUTH_TOKEN") or not twilio_whatsapp:
+        raise ValueError("❌ Configuration Twilio incomplète.")
 
 # ==== Webhook WhatsApp entrant ====
+class _Laps:
+    """Durée (ms) de chaque étape du traitement d'un message, depuis la réception du webhook."""
+
+    def __init__(self, start: float):
+        self.start = self.last = start
+        self.ms = {}
+
+    def __call__(self, stage: str):
+        now = time.monotonic()
+        self.ms[stage] = round((now - self.last) * 1000, 1)
+        self.last = now
+
+    def total(self) -> float:
+        return round((time.monotonic() - self.start) * 1000, 1)
+
+
 # ====== Worker async (traitement en arrière-plan) ======
-def _process_incoming(sender: str, incoming_msg: str, msg_sid: str | None):
+def _process_incoming(sender: str, incoming_msg: str, msg_sid: str | None,
+                      received_at: float | None = None):
+    # Deadline de bout en bout : compte aussi l'attente dans la file de l'executor
+    received_at = received_at or time.monotonic()
+    deadline = received_at + REPLY_DEADLINE
+    trace_id = lanai_log.trace_from_sid(msg_sid)
+    with lanai_log.trace(trace_id), lanai_profiler.turn(trace_id):
+        _handle_incoming(sender, incoming_msg, msg_sid, deadline, _Laps(received_at))
+
+
+def _handle_incoming(sender: str, incoming_msg: str, msg_sid: str | None, deadline: float, laps: _Laps):
+    laps("queue")
+    answered_by = "llm"
     try:
-        print(f"[IN] sid={msg_sid} from={sender} body={incoming_msg[:140]}", flush=True)
+        log.info("message reçu", extra={"sid": msg_sid, "from": sender, "body": incoming_msg[:140]})
 
         # 1) Log IN (dédup via msg_sid+direction)
         try:
@@ -134,18 +225,38 @@ def _process_incoming(sender: str, incoming_msg: str, msg_sid: str | None):
                 source="webhook",
             )
         except Exception as e_db_in:
-            print(f"[ERR][DB-SAVE-IN] {e_db_in}", flush=True)
+            log.error("db save in: %s", e_db_in)
+        laps("db_in")
 
         # 2) Historique + prompt
         try:
-            hist = get_history(sender, limit=20)
+            hist = get_history(sender, limit=HISTORY_LIMIT)
         except Exception as e_hist:
-            print(f"[ERR][DB-HIST] {e_hist}", flush=True)
+            log.error("db history: %s", e_hist)
             hist = []
 
+        # 2b) Souvenirs : le message fait référence au passé → recherche plein texte (index GIN)
+        memories = []
+        if refers_to_past(incoming_msg):
+            try:
+                memories = search_history(sender, recall_terms(incoming_msg),
+                                          limit=RECALL_LIMIT, skip_recent=HISTORY_LIMIT)
+                log.info("souvenirs", extra={"count": len(memories)})
+            except Exception as e_recall:
+                log.error("db recall: %s", e_recall)
+
+        try:
+            system_message_content = profile_store.get_system_prompt(sender, incoming_msg)
+        except Exception as e_prof:
+            log.error("profil: %s", e_prof)
+            system_message_content = "Tu es **Lanai**, compagnon WhatsApp bienveillant. Réponds en français, simplement."
+
         messages = [{"role": "system", "content": system_message_content}]
+        if memories:
+            messages.append({"role": "system", "content": format_memories(memories)})
         messages.extend(hist)
         messages.append({"role": "user", "content": incoming_msg})
+        laps("context")
 
         # 3) Tentative de réponse via pipeline SPORT (API foot/basket)
         sports_answer = None
@@ -153,33 +264,48 @@ def _process_incoming(sender: str, incoming_msg: str, msg_sid: str | None):
             if is_sports_question(incoming_msg):
                 sports_answer = handle_sports_question(incoming_msg)
         except Exception as e_sport:
-            print(f"[SPORTS] Erreur lors du traitement de la question sport : {e_sport}", flush=True)
+            log.error("question sport: %s", e_sport)
             sports_answer = None
+        laps("sports")
+
+        # 3b) Question météo → prévisions du cache partagé (rempli par le cron ou à la demande)
+        weather_answer = None
+        if not sports_answer:
+            try:
+                if is_weather_question(incoming_msg):
+                    weather_answer = handle_weather_question(incoming_msg)
+            except Exception as e_meteo:
+                log.error("question météo: %s", e_meteo)
+            laps("weather")
 
-        # 4) Choix de la réponse : sport ou GPT
+        # 4) Choix de la réponse : sport, météo ou GPT
         if sports_answer:
             # Réponse fiable issue de l'API sport → on n'appelle pas GPT
-            assistant_reply = sports_answer
+            assistant_reply, answered_by = sports_answer, "sports"
+        elif weather_answer:
+            assistant_reply, answered_by = weather_answer, "weather"
         else:
             # Comportement normal : on laisse GPT gérer
             try:
-                assistant_reply = chat_gpt(messages)
+                assistant_reply = chat_gpt(messages, deadline=deadline)
             except Exception as e_gpt:
-                print(f"[ERR][GPT] {e_gpt}", flush=True)
+                log.error("gpt: %s", e_gpt)
                 assistant_reply = "Désolé, j’ai eu un petit souci. Tu peux reformuler ?"
+            laps("llm")
 
         # 5) Envoi WhatsApp (OUT)
         tw_sid = None
         try:
-            msg = twilio_client.messages.create(
+            msg = get_twilio().messages.create(
                 from_=twilio_whatsapp,
                 body=assistant_reply,
                 to=sender
             )
             tw_sid = msg.sid
-            print(f"[OUT] sid={tw_sid} to={sender}", flush=True)
+            log.info("réponse envoyée", extra={"sid": tw_sid, "to": sender, "reply_ms": laps.total()})
         except Exception as e_tw:
-            print(f"[ERR][TWILIO] {e_tw}", flush=True)
+            log.error("twilio: %s", e_tw)
+        laps("twilio")
 
         # 6) Log OUT (dédup jour+source+hash ; msg_sid utile pour traçabilité)
         try:
@@ -192,14 +318,23 @@ def _process_incoming(sender: str, incoming_msg: str, msg_sid: str | None):
                 source="webhook",
             )
         except Exception as e_db_out:
-            print(f"[ERR][DB-SAVE-OUT] {e_db_out}", flush=True)
+            log.error("db save out: %s", e_db_out)
+        laps("db_out")
 
     except Exception as e:
-        print(f"[ERR][WORKER] {e}", flush=True)
+        log.exception("worker: %s", e)
+    log.info("message traité", extra={"answered_by": answered_by, "stages_ms": laps.ms, "total_ms": laps.total()})
+
 
 
+@bp.before_app_request
+def _lazy_warm_up():
+    # Sans hook post_fork (flask run, gunicorn sans gunicorn.conf.py) : préchauffage au 1er appel
+    if WARMUP and _warm_pid != os.getpid():
+        start_warm_up()
 
-@app.route("/webhook", methods=["POST"])
+
+@bp.route("/webhook", methods=["POST"])
 def receive_message():
     sender = request.form.get("From")  # ex 'whatsapp:+33...'
     incoming_msg = (request.form.get("Body") or "").strip()
@@ -208,16 +343,87 @@ def receive_message():
         return ("", 200)
 
     # Réponse immédiate → traitement en arrière-plan (évite les timeouts)
-    executor.submit(_process_incoming, sender, incoming_msg, msg_sid)
+    get_executor().submit(_process_incoming, sender, incoming_msg, msg_sid, time.monotonic())
     return ("", 200)
 
 
   
-@app.route("/health", methods=["GET"])
+@bp.route("/health", methods=["GET"])
 def health():
     return "ok", 200
 
 
+@bp.route("/ready", methods=["GET"])
+def ready():
+    # 503 tant que le préchauffage du worker n'est pas fini (ou a échoué → nouvel essai)
+    if not _ready.is_set():
+        start_warm_up(retry=True)
+    body = {"ready": _ready.is_set(), **_boot}
+    return jsonify(body), (200 if _ready.is_set() else 503)
+
+
+# ==== Routes internes (/stats, /debug/profiles), protégées par jeton ====
+PROFILE_TOKEN = os.environ.get("LANAI_PROFILE_TOKEN")
+
+
+def _check_token():
+    # Sans jeton configuré, les routes n'existent pas (404) ; mauvais jeton → 403
+    # En-tête seulement : un ?token= finirait dans les logs d'accès (gunicorn, proxy)
+    if not PROFILE_TOKEN:
+        abort(404)
+    given = request.headers.get("X-Lanai-Token") or ""
+    if not hmac.compare_digest(given.encode("utf-8"), PROFILE_TOKEN.encode("utf-8")):
+        abort(403)
+
+
+@bp.route("/stats", methods=["GET"])
+def stats():
+    _check_token()
+    # Latences DB par endpoint (primary / replica) + ledger des routes LLM + quota RapidAPI, pour ce worker
+    return jsonify({
+        "db": db_stats(),
+        "replica_lag": replica_lag(),
+        "llm": model_router.ledger_snapshot(),
+        "rapidapi": rapidapi_quota.snapshot(),
+        "singleflight": singleflight.stats(),
+    }), 200
+
+
+# ==== Profils des tours lents (lanai_profiler) ====
+@bp.route("/debug/profiles", methods=["GET"])
+def list_profiles():
+    _check_token()
+    return jsonify({"enabled": lanai_profiler.ENABLED, "slow_ms": lanai_profiler.SLOW_MS,
+                    "sample": lanai_profiler.SAMPLE, "profiles": lanai_profiler.list_profiles()}), 200
+
+
+@bp.route("/debug/profiles/<profile_id>", methods=["GET"])
+def download_profile(profile_id):
+    # ?format=json → résumé (top des fonctions) ; par défaut piles « folded » (flamegraph.pl, speedscope)
+    _check_token()
+    kind = "json" if request.args.get("format") == "json" else "folded"
+    body = lanai_profiler.load_profile(profile_id, kind)
+    if body is None:
+        abort(404)
+    if kind == "json":
+        return Response(body, mimetype="application/json")
+    return Response(body, mimetype="text/plain",
+                    headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'})
+
+
+def create_app() -> Flask:
+    """Application Flask sans effet de bord : DB, clients et executor sont ouverts par process, à la demande."""
+    _check_config()
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(bp)
+    return flask_app
+
+
+app = create_app()  # gunicorn app:app (voir gunicorn.conf.py pour les hooks fork)
+
+
 if __name__ == "__main__":
+    if WARMUP:
+        start_warm_up()
     # Render bind
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
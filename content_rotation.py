@@ -0,0 +1,152 @@
+# content_rotation.py — rotation sans répétition dans la banque de contenus (contenu_messages.json)
+# - un paquet mélangé par catégorie + curseur : chaque ligne sort une fois par cycle
+# - choix de la catégorie par tourniquet pondéré (« smooth weighted round-robin », comme nginx)
+# - état persistant dans public.content_rotation (une ligne par catégorie)
+import os
+import json
+import random
+import hashlib
+
+from memory_store import _get_conn
+import lanai_log
+
+# Poids des catégories : "hadith=3,coran=3,citations=2,sante=1" (1 par défaut)
+WEIGHTS_ENV = os.environ.get("LANAI_CONTENT_WEIGHTS", "")
+log = lanai_log.get_logger("content")
+
+
+def parse_weights(spec: str) -> dict:
+    weights = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            try:
+                weights[k.strip()] = max(0, int(v))
+            except ValueError:
+                log.warning("poids invalide ignoré: %r", part)
+    return weights
+
+
+def bank_fingerprint(lines: list) -> str:
+    """Change dès que la liste d'une catégorie est modifiée → paquet remélangé."""
+    return hashlib.md5("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+class Deck:
+    """Paquet mélangé d'indices dans une catégorie + curseur (+ crédit du tourniquet pondéré)."""
+
+    def __init__(self, size: int, fingerprint: str, order: list | None = None,
+                 cursor: int = 0, credit: int = 0, last: int | None = None):
+        self.size = size
+        self.fingerprint = fingerprint
+        self.order = order if order is not None and sorted(order) == list(range(size)) else None
+        self.cursor = cursor if self.order is not None else 0
+        self.credit = credit
+        self.last = last
+        if self.order is None:
+            self.reshuffle()
+
+    def reshuffle(self):
+        self.order = list(range(self.size))
+        random.shuffle(self.order)
+        # Pas de doublon à la jointure de deux cycles
+        if self.size > 1 and self.order[0] == self.last:
+            self.order[0], self.order[-1] = self.order[-1], self.order[0]
+        self.cursor = 0
+
+    def draw(self) -> int:
+        if self.cursor >= self.size:
+            self.reshuffle()
+        idx = self.order[self.cursor]
+        self.cursor += 1
+        self.last = idx
+        return idx
+
+
+class Rotation:
+    """
+    Rotation sur une banque {catégorie: [lignes]}. pick() → (catégorie, ligne), en O(1) par tirage.
+    states : {catégorie: dict sauvegardé} (voir Deck) ; un paquet dont la banque a changé est remélangé.
+    """
+
+    def __init__(self, bank: dict, weights: dict | None = None, states: dict | None = None):
+        self.bank = {k: v for k, v in bank.items() if isinstance(v, list) and v}
+        weights = weights or {}
+        self.weights = {k: weights.get(k, 1) for k in self.bank}
+        self.weights = {k: w for k, w in self.weights.items() if w > 0}
+        self.decks = {}
+        states = states or {}
+        for cat in self.weights:
+            fp = bank_fingerprint(self.bank[cat])
+            st = states.get(cat) or {}
+            if st.get("fingerprint") == fp:
+                self.decks[cat] = Deck(len(self.bank[cat]), fp, st.get("order"), st.get("cursor", 0),
+                                       st.get("credit", 0), st.get("last"))
+            else:
+                self.decks[cat] = Deck(len(self.bank[cat]), fp, credit=st.get("credit", 0))
+        self.dirty = set()
+
+    def next_category(self) -> str | None:
+        if not self.decks:
+            return None
+        total = sum(self.weights.values())
+        for cat, deck in self.decks.items():
+            deck.credit += self.weights[cat]
+        cat = max(self.decks, key=lambda c: self.decks[c].credit)
+        self.decks[cat].credit -= total
+        self.dirty.update(self.decks)
+        return cat
+
+    def pick(self) -> tuple | None:
+        cat = self.next_category()
+        if cat is None:
+            return None
+        return cat, self.bank[cat][self.decks[cat].draw()].strip()
+
+    def state(self, cat: str) -> dict:
+        d = self.decks[cat]
+        return {"fingerprint": d.fingerprint, "order": d.order, "cursor": d.cursor,
+                "credit": d.credit, "last": d.last}
+
+
+# ==== Persistance ====
+def init_rotation_schema():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.content_rotation (
+            category TEXT PRIMARY KEY,
+            state JSONB NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """)
+        conn.commit()
+
+
+def load_rotation(bank: dict, weights: dict | None = None) -> Rotation:
+    """Rotation avec l'état sauvegardé ; DB indisponible → état neuf (tirage toujours sans doublon dans le run)."""
+    states = {}
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT category, state FROM public.content_rotation")
+            states = dict(cur.fetchall())
+    except Exception as e:
+        log.warning("état de rotation illisible (%s), nouveau cycle", e)
+    return Rotation(bank, parse_weights(WEIGHTS_ENV) if weights is None else weights, states)
+
+
+def save_rotation(rotation: Rotation):
+    if not rotation.dirty:
+        return
+    rows = [(cat, json.dumps(rotation.state(cat))) for cat in sorted(rotation.dirty)]
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            for cat, state in rows:
+                cur.execute("""
+                    INSERT INTO public.content_rotation (category, state, updated_at)
+                    VALUES (%s, %s::jsonb, NOW())
+                    ON CONFLICT (category) DO UPDATE SET state = EXCLUDED.state, updated_at = NOW();
+                """, (cat, state))
+            conn.commit()
+        rotation.dirty.clear()
+    except Exception as e:
+        log.error("sauvegarde de la rotation impossible: %s", e)
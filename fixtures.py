@@ -0,0 +1,175 @@
+# fixtures.py — modèle compact des matchs (API-Football /fixtures, API-Basketball /games, snapshot)
+# Chaque réponse est normalisée une seule fois en objets Match (__slots__) : plus de dicts imbriqués
+# gardés en mémoire, dates ISO parsées une fois, conventions unifiées ('away'/'visitors', 'total'/'points').
+from datetime import datetime, timezone
+from enum import Enum
+
+
+class Status(Enum):
+    SCHEDULED = "scheduled"
+    LIVE = "live"
+    FINISHED = "finished"
+    OTHER = "other"      # reporté, annulé, abandonné, inconnu
+
+
+FOOT_FINAL = frozenset(("FT", "AET", "PEN"))
+FOOT_LIVE = frozenset(("1H", "HT", "2H", "ET", "BT", "P", "LIVE", "INT"))
+FOOT_SCHEDULED = frozenset(("NS", "TBD"))
+BASKET_FINAL = frozenset(("FT", "AOT", "FT OT", "Final", "Finished", "After Over Time", "Game Finished"))
+BASKET_LIVE = frozenset(("Q1", "Q2", "Q3", "Q4", "OT", "BT", "HT"))
+BASKET_SCHEDULED = frozenset(("NS",))
+
+
+def _status(short: str | None, long: str | None, final, live, scheduled) -> Status:
+    if short in final or long in final:
+        return Status.FINISHED
+    if short in live:
+        return Status.LIVE
+    if short in scheduled:
+        return Status.SCHEDULED
+    return Status.OTHER
+
+
+def _kickoff(timestamp, iso: str | None) -> float:
+    """Epoch (s) : 'timestamp' de l'API si présent, sinon la date ISO ; 0.0 si illisible."""
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if iso:
+        try:
+            dt = datetime.fromisoformat(iso.replace("Z", "+00:00"))
+            return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+        except ValueError:
+            pass
+    return 0.0
+
+
+class Match:
+    __slots__ = ("sport", "fixture_id", "kickoff", "league_id", "league_name",
+                 "home_id", "home_name", "away_id", "away_name",
+                 "home_score", "away_score", "status", "status_code", "short", "elapsed")
+
+    def __init__(self, sport, fixture_id, kickoff, league_id, league_name, home_id, home_name,
+                 away_id, away_name, home_score, away_score, status, status_code, short=None, elapsed=None):
+        self.sport = sport
+        self.fixture_id = fixture_id
+        self.kickoff = kickoff
+        self.league_id = league_id
+        self.league_name = league_name
+        self.home_id = home_id
+        self.home_name = home_name
+        self.away_id = away_id
+        self.away_name = away_name
+        self.home_score = home_score
+        self.away_score = away_score
+        self.status = status
+        self.status_code = status_code
+        self.short = short if short is not None else status_code   # code court de l'API ('1H', 'Q2', 'FT'…)
+        self.elapsed = elapsed                                       # minute de jeu (foot en direct)
+
+    def __repr__(self):
+        return (f"Match({self.sport} {self.fixture_id} {self.home_name} {self.home_score}-"
+                f"{self.away_score} {self.away_name} {self.status_code})")
+
+    @property
+    def finished(self) -> bool:
+        return self.status is Status.FINISHED
+
+    @property
+    def has_score(self) -> bool:
+        return self.home_score is not None and self.away_score is not None
+
+    def involves(self, team_id) -> bool:
+        return team_id is not None and (self.home_id == team_id or self.away_id == team_id)
+
+    def is_home(self, team_id=None, team_name: str | None = None) -> bool:
+        """Par id si l'équipe est connue, sinon par nom (sous-chaîne, sans casse)."""
+        if self.involves(team_id):
+            return self.home_id == team_id
+        return bool(team_name) and team_name.lower() in (self.home_name or "").lower()
+
+    def line(self) -> str:
+        """'TeamA 2 - 1 TeamB' (ligne du récap quotidien)."""
+        return f"{self.home_name} {self.home_score} - {self.away_score} {self.away_name}"
+
+    def snapshot(self, match_date: str, league_id=None, league_name: str | None = None) -> dict:
+        """Ligne pour results_store.save_results (SNAPSHOT_COLUMNS)."""
+        return {
+            "sport": self.sport, "fixture_id": self.fixture_id, "match_date": match_date,
+            "league_id": league_id if league_id is not None else self.league_id,
+            "league_name": league_name or self.league_name,
+            "home_id": self.home_id, "home_name": self.home_name,
+            "away_id": self.away_id, "away_name": self.away_name,
+            "home_score": self.home_score, "away_score": self.away_score, "status": self.status_code,
+        }
+
+
+# ==== Normalisation ====
+def from_football(fx: dict) -> Match:
+    fixture = fx.get("fixture") or {}
+    st = fixture.get("status") or {}
+    teams = fx.get("teams") or {}
+    home, away = teams.get("home") or {}, teams.get("away") or {}
+    goals = fx.get("goals") or {}
+    league = fx.get("league") or {}
+    return Match(
+        "football", fixture.get("id"), _kickoff(fixture.get("timestamp"), fixture.get("date")),
+        league.get("id"), league.get("name"),
+        home.get("id"), home.get("name"), away.get("id"), away.get("name"),
+        goals.get("home"), goals.get("away"),
+        _status(st.get("short"), st.get("long"), FOOT_FINAL, FOOT_LIVE, FOOT_SCHEDULED), st.get("short"),
+        st.get("short"), st.get("elapsed"),
+    )
+
+
+def _points(score) -> int | None:
+    if isinstance(score, dict):
+        return score.get("total") if score.get("total") is not None else score.get("points")
+    return score
+
+
+def from_basketball(g: dict) -> Match:
+    st = g.get("status") or {}
+    teams = g.get("teams") or {}
+    scores = g.get("scores") or {}
+    home = teams.get("home") or {}
+    away = teams.get("away") or teams.get("visitors") or {}
+    league = g.get("league") or {}
+    return Match(
+        "basketball", g.get("id"), _kickoff(g.get("timestamp"), g.get("date")),
+        league.get("id"), league.get("name"),
+        home.get("id"), home.get("name"), away.get("id"), away.get("name"),
+        _points(scores.get("home")), _points(scores.get("away") or scores.get("visitors")),
+        _status(st.get("short"), st.get("long"), BASKET_FINAL, BASKET_LIVE, BASKET_SCHEDULED),
+        st.get("long") or st.get("short"), st.get("short"),
+    )
+
+
+def from_row(row: dict) -> Match:
+    """Ligne de public.match_results → Match (match terminé)."""
+    kickoff = datetime.combine(row["match_date"], datetime.min.time(), timezone.utc).timestamp() \
+        if row.get("match_date") else 0.0
+    return Match(
+        row["sport"], row["fixture_id"], kickoff, row.get("league_id"), row.get("league_name"),
+        row.get("home_id"), row["home_name"], row.get("away_id"), row["away_name"],
+        row["home_score"], row["away_score"], Status.FINISHED, row.get("status"),
+    )
+
+
+def parse_football(response: list) -> list:
+    return [from_football(fx) for fx in response or () if isinstance(fx, dict)]
+
+
+def parse_basketball(response: list) -> list:
+    return [from_basketball(g) for g in response or () if isinstance(g, dict)]
+
+
+# ==== Sélection ====
+def last_finished(matches: list, team_id) -> Match | None:
+    """Match terminé le plus récent de l'équipe (un seul passage, pas de tri)."""
+    if team_id is None:
+        return None
+    best, best_at, finished = None, float("-inf"), Status.FINISHED
+    for m in matches:
+        if m.status is finished and (m.home_id == team_id or m.away_id == team_id) and m.kickoff > best_at:
+            best, best_at = m, m.kickoff
+    return best
@@ -0,0 +1,25 @@
+# gunicorn.conf.py — lu automatiquement par `gunicorn app:app`
+# - preload : app.py importé une fois dans le master (aucune connexion ouverte à l'import)
+# - when_ready : DDL une seule fois dans le master, avant le fork des workers
+# - post_fork : chaque worker recrée ses threads / clients et se préchauffe (GET /ready → 200 quand prêt)
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+preload_app = True
+
+
+def when_ready(server):
+    import app as lanai_app
+    try:
+        lanai_app.init_schemas()
+    except Exception as e:
+        # DB indisponible au démarrage : chaque worker réessaiera pendant son préchauffage
+        server.log.warning("init des schémas reportée aux workers : %s", e)
+
+
+def post_fork(server, worker):
+    import app as lanai_app
+    lanai_app.after_fork()
@@ -0,0 +1,254 @@
+# lanai_bench.py — micro-benchmarks des fonctions pures du chemin chaud (sans réseau ni DB)
+#   python lanai_bench.py                                   → mesures affichées
+#   python lanai_bench.py --save bench_baseline.json        → référence enregistrée
+#   python lanai_bench.py --compare bench_baseline.json     → code 1 si une mesure dépasse le seuil (25 %)
+#   python lanai_bench.py --filter football --sizes small,large --threshold 0.15
+# Les listes de matchs reprennent la forme des réponses API-Football (/fixtures) et API-Basketball (/games) ;
+# parse_* mesure la normalisation (fixtures.Match), pick_last_finished_* la sélection sur les objets normalisés.
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+import platform
+from datetime import date, datetime, timedelta, timezone
+
+# Aucun appel n'est fait à l'import : une URL factice suffit pour charger memory_store
+os.environ.setdefault("DATABASE_URL", "postgresql://bench@localhost/unused")
+
+from sports_query import (is_sports_question, extract_team_name, extract_time_period, resolve_period_to_dates,
+                          pick_last_finished_football, pick_last_finished_basketball, format_football_answer)
+from lanai_results import format_section
+from sports_providers import FootballProvider
+from lanai_content import pick_from_bank, bank_subset
+from content_rotation import Rotation
+from fixtures import parse_football, parse_basketball
+
+SIZES = {"small": 10, "medium": 100, "large": 1_000, "xlarge": 10_000}
+DEFAULT_SIZES = "small,medium,large"
+TODAY = date(2025, 3, 17)
+
+MESSAGES = [
+    "Qu'a fait le PSG hier ?",
+    "C'était quoi le score du Real Madrid hier ?",
+    "Qu'a fait l'OM ce week-end ?",
+    "Tu peux me donner une idée de repas pour ce soir ?",
+    "Salam aleykum, ça va ?",
+    "Il va faire beau demain à Loffre ?",
+    "J'ai regardé le match avec mon frère, c'était long",
+    "Rappelle-moi de boire de l'eau cet après-midi",
+]
+
+TEAMS = ["Paris Saint Germain", "Marseille", "Lyon", "Lille", "Monaco", "Rennes", "Nice", "Lens",
+         "Real Madrid", "Barcelona", "Bayern Munich", "Inter", "Arsenal", "Liverpool"]
+FOOT_STATUSES = ["FT"] * 6 + ["AET", "PEN", "NS", "1H", "HT", "PST"]
+BASKET_STATUSES = ["FT"] * 6 + ["AOT", "NS", "Q2", "Q4", "POST"]
+
+
+# ==== Données (forme des réponses RapidAPI) ====
+def football_fixtures(n: int, team_id: int = 85, seed: int = 1) -> list:
+    rnd = random.Random(seed)
+    start = datetime(2025, 3, 16, 21, 0, tzinfo=timezone.utc)
+    out = []
+    for i in range(n):
+        home_id, away_id = rnd.randint(1, 2000), rnd.randint(1, 2000)
+        if rnd.random() < 0.1:
+            home_id = team_id
+        status = rnd.choice(FOOT_STATUSES)
+        hg, ag = (rnd.randint(0, 5), rnd.randint(0, 4)) if status != "NS" else (None, None)
+        league = rnd.choice(FootballProvider.LEAGUES)
+        out.append({
+            "fixture": {
+                "id": 1_000_000 + i, "referee": "C. Turpin", "timezone": "UTC",
+                "date": (start - timedelta(hours=6 * i)).isoformat(), "timestamp": int(start.timestamp()) - 21600 * i,
+                "venue": {"id": rnd.randint(1, 800), "name": "Stade", "city": "Paris"},
+                "status": {"long": "Match Finished", "short": status, "elapsed": 90},
+            },
+            "league": {"id": league["id"], "name": league["nom"], "country": "France", "season": 2024, "round": "Regular Season - 26"},
+            "teams": {
+                "home": {"id": home_id, "name": rnd.choice(TEAMS), "logo": "https://media.api-sports.io/x.png", "winner": None},
+                "away": {"id": away_id, "name": rnd.choice(TEAMS), "logo": "https://media.api-sports.io/y.png", "winner": None},
+            },
+            "goals": {"home": hg, "away": ag},
+            "score": {"halftime": {"home": 0, "away": 0}, "fulltime": {"home": hg, "away": ag},
+                      "extratime": {"home": None, "away": None}, "penalty": {"home": None, "away": None}},
+        })
+    return out
+
+
+def basketball_games(n: int, team_id: int = 4, seed: int = 2) -> list:
+    rnd = random.Random(seed)
+    start = datetime(2025, 3, 16, 20, 0, tzinfo=timezone.utc)
+    out = []
+    for i in range(n):
+        home_id, away_id = rnd.randint(1, 600), rnd.randint(1, 600)
+        if rnd.random() < 0.1:
+            home_id = team_id
+        status = rnd.choice(BASKET_STATUSES)
+        out.append({
+            "id": 400_000 + i, "date": (start - timedelta(hours=6 * i)).isoformat(), "time": "20:00",
+            "timestamp": int(start.timestamp()) - 21600 * i, "timezone": "UTC", "stage": None, "week": None,
+            "status": {"long": "Game Finished", "short": status, "timer": None},
+            "league": {"id": 12, "name": "NBA", "type": "League", "season": "2024-2025"},
+            "country": {"id": 5, "name": "USA", "code": "US"},
+            "teams": {"home": {"id": home_id, "name": rnd.choice(TEAMS)}, "away": {"id": away_id, "name": rnd.choice(TEAMS)}},
+            "scores": {
+                "home": {"quarter_1": 25, "quarter_2": 22, "quarter_3": 27, "quarter_4": 24, "over_time": None,
+                         "total": rnd.randint(80, 130)},
+                "away": {"quarter_1": 21, "quarter_2": 30, "quarter_3": 19, "quarter_4": 26, "over_time": None,
+                         "total": rnd.randint(80, 130)},
+            },
+        })
+    return out
+
+
+def league_sections(n_lines: int, seed: int = 3) -> dict:
+    """Entrée de format_section : {ligue: {'emoji', 'lines'}} avec n_lines lignes réparties sur les ligues."""
+    rnd = random.Random(seed)
+    out = {lg["nom"]: {"emoji": lg["emoji"], "lines": []} for lg in FootballProvider.LEAGUES}
+    names = list(out)
+    for _ in range(n_lines):
+        out[rnd.choice(names)]["lines"].append(
+            f"{rnd.choice(TEAMS)} {rnd.randint(0, 5)} - {rnd.randint(0, 4)} {rnd.choice(TEAMS)}")
+    return out
+
+
+def synthetic_bank(lines_per_category: int) -> dict:
+    return {cat: [f"{cat} n°{i} : une phrase de longueur moyenne pour le message du jour." for i in range(lines_per_category)]
+            for cat in ("hadith", "coran", "citations", "sante", "citations_fiables")}
+
+
+# ==== Suite ====
+def build_suite(sizes: list) -> list:
+    """[(nom, fonction sans argument, appels par exécution)]"""
+    suite = [
+        ("is_sports_question", lambda: [is_sports_question(m) for m in MESSAGES], len(MESSAGES)),
+        ("extract_team_name", lambda: [extract_team_name(m) for m in MESSAGES], len(MESSAGES)),
+        ("extract_time_period", lambda: [extract_time_period(m) for m in MESSAGES], len(MESSAGES)),
+        ("resolve_period_to_dates", lambda: [resolve_period_to_dates(p, TODAY)
+                                             for p in ("today", "yesterday", "weekend", "unspecified")], 4),
+    ]
+    raw = football_fixtures(1, team_id=85)
+    raw[0]["teams"]["home"].update(id=85, name="Paris Saint Germain")
+    one = parse_football(raw)[0]
+    suite.append(("format_football_answer", lambda: format_football_answer("Paris Saint Germain", one, 85), 1))
+
+    real_bank = bank_subset()
+    if real_bank:
+        rot = Rotation(real_bank)
+        suite.append(("pick_from_bank[json]", lambda: pick_from_bank(), 1))
+        suite.append(("pick_from_bank[rotation]", lambda: pick_from_bank(rot), 1))
+
+    for size in sizes:
+        n = SIZES[size]
+        raw_fx, raw_games = football_fixtures(n), basketball_games(n)
+        fx, games = parse_football(raw_fx), parse_basketball(raw_games)
+        sections = league_sections(n)
+        big_rot = Rotation(synthetic_bank(n))
+        suite += [
+            (f"parse_football[{size}]", lambda r=raw_fx: parse_football(r), 1),
+            (f"parse_basketball[{size}]", lambda r=raw_games: parse_basketball(r), 1),
+            (f"pick_last_finished_football[{size}]", lambda fx=fx: pick_last_finished_football(fx, 85), 1),
+            (f"pick_last_finished_basketball[{size}]", lambda g=games: pick_last_finished_basketball(g, 4), 1),
+            (f"format_section[{size}]", lambda s=sections: format_section("⚽", "Football européen", s), 1),
+            (f"rotation_pick[{size}]", lambda r=big_rot: r.pick(), 1),
+        ]
+    return suite
+
+
+def measure(fn, calls: int, repeat: int, min_time: float) -> dict:
+    """Durée par appel (µs) : min et médiane de `repeat` séries calibrées à ~min_time secondes."""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2 if number < 1000 else 10
+    runs = sorted(t / number / calls * 1e6 for t in timer.repeat(repeat=repeat, number=number))
+    return {"min_us": round(runs[0], 3), "median_us": round(runs[len(runs) // 2], 3),
+            "number": number, "repeat": repeat}
+
+
+def run_suite(suite: list, repeat: int, min_time: float, name_filter: str | None = None) -> dict:
+    results = {}
+    for name, fn, calls in suite:
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = measure(fn, calls, repeat, min_time)
+        print(f"  {name:42s} {results[name]['median_us']:12.3f} µs  (min {results[name]['min_us']:.3f})", flush=True)
+    return results
+
+
+def meta() -> dict:
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "platform": platform.platform(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+
+# ==== Comparaison ====
+def compare(current: dict, baseline: dict) -> list:
+    """[(nom, référence µs, actuel µs, écart)] ; comparaison sur le min (moins sensible au bruit)."""
+    rows = []
+    for name, cur in current.items():
+        ref = baseline.get(name)
+        if not ref or not ref.get("min_us"):
+            continue
+        delta = cur["min_us"] / ref["min_us"] - 1
+        rows.append((name, ref["min_us"], cur["min_us"], delta))
+    return rows
+
+
+def print_comparison(rows: list, threshold: float) -> int:
+    regressions = 0
+    print(f"\nComparaison avec la référence (seuil ±{threshold:.0%}) :")
+    for name, ref, cur, delta in rows:
+        flag = ""
+        if delta > threshold:
+            flag = "  ← RÉGRESSION"
+            regressions += 1
+        elif delta < -threshold:
+            flag = "  (plus rapide)"
+        print(f"  {name:42s} {ref:10.3f} → {cur:10.3f} µs  {delta:+7.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Micro-benchmarks des fonctions du chemin chaud (hors ligne).")
+    p.add_argument("--sizes", default=DEFAULT_SIZES, help=f"tailles des listes de matchs ({', '.join(SIZES)})")
+    p.add_argument("--filter", default=None, help="ne lance que les mesures dont le nom contient ce texte")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--min-time", type=float, default=0.2, help="durée minimale d'une série (s)")
+    p.add_argument("--save", default=None, help="enregistre les résultats (JSON) comme référence")
+    p.add_argument("--compare", default=None, help="référence JSON à comparer")
+    p.add_argument("--threshold", type=float, default=0.25, help="écart toléré avant de signaler une régression")
+    args = p.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        sys.exit(f"❌ Taille inconnue : {', '.join(unknown)} (choix : {', '.join(SIZES)})")
+
+    info = meta()
+    print(f"Python {info['python']} ({info['implementation']}, {info['machine']})")
+    results = run_suite(build_suite(sizes), args.repeat, args.min_time, args.filter)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"meta": info, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"✅ Référence enregistrée : {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        ref_meta = baseline.get("meta", {})
+        if ref_meta.get("python") != info["python"] or ref_meta.get("machine") != info["machine"]:
+            print(f"⚠️ Référence prise sur Python {ref_meta.get('python')} / {ref_meta.get('machine')} : "
+                  "écarts à interpréter avec prudence")
+        regressions = print_comparison(compare(results, baseline.get("results", {})), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
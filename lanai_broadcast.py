@@ -0,0 +1,159 @@
+# lanai_broadcast.py — diffusion des digests (résultats, météo, contenu) à plusieurs abonnés
+# Chaque digest est calculé une fois par variante (villes, ligues...), puis envoyé en parallèle
+# (débit limité) à tous les abonnés de cette variante ; les envois sont consignés en DB en un lot.
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from memory_store import _get_conn, add_messages
+from lanai_clients import get_twilio
+import lanai_log
+
+SEND_WORKERS = int(os.environ.get("LANAI_BROADCAST_WORKERS", "8"))
+SEND_RATE = float(os.environ.get("LANAI_BROADCAST_RATE", "10"))  # messages / seconde max
+log = lanai_log.get_logger("broadcast")
+
+
+# ==== Abonnés ====
+def init_subscriptions_schema():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.subscriptions (
+            user_phone TEXT NOT NULL,
+            job TEXT NOT NULL,
+            prenom TEXT,
+            variant JSONB NOT NULL DEFAULT '{}'::jsonb,
+            active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_phone, job)
+        );
+        """)
+        conn.commit()
+
+
+def subscribe(user_phone: str, job: str, prenom: str | None = None, variant: dict | None = None):
+    """Abonne (ou met à jour) un numéro à un job : 'results' | 'weather' | 'content'."""
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO public.subscriptions (user_phone, job, prenom, variant, active)
+            VALUES (%s, %s, %s, %s::jsonb, TRUE)
+            ON CONFLICT (user_phone, job) DO UPDATE
+              SET prenom = EXCLUDED.prenom, variant = EXCLUDED.variant, active = TRUE;
+        """, (user_phone, job, prenom, json.dumps(variant or {}, ensure_ascii=False)))
+        conn.commit()
+
+
+def load_subscribers(job: str) -> list:
+    """
+    Abonnés actifs du job : [{'user_phone', 'prenom', 'variant'}, ...].
+    Table absente ou vide → le destinataire historique MY_WHATSAPP_NUMBER (Mohamed).
+    """
+    subs = []
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT user_phone, prenom, variant FROM public.subscriptions
+                WHERE job = %s AND active
+                ORDER BY user_phone
+            """, (job,))
+            subs = [{"user_phone": p, "prenom": n, "variant": v or {}} for p, n, v in cur.fetchall()]
+    except Exception as e:
+        log.warning("abonnés illisibles (%s), envoi au destinataire par défaut", e)
+    if not subs:
+        default = os.environ.get("MY_WHATSAPP_NUMBER")
+        if default:
+            subs = [{"user_phone": default, "prenom": "Mohamed", "variant": {}}]
+    return subs
+
+
+def group_by_variant(subs: list, variant_of=None) -> dict:
+    """{clé JSON stable: (variant, [abonnés])} → un seul calcul de digest par variante."""
+    groups = {}
+    for sub in subs:
+        variant = variant_of(sub) if variant_of else sub["variant"]
+        key = json.dumps(variant, sort_keys=True, ensure_ascii=False)
+        groups.setdefault(key, (variant, []))[1].append(sub)
+    return groups
+
+
+# ==== Envoi parallèle à débit limité ====
+class RateLimiter:
+    """Espacement minimal entre deux envois, partagé par tous les threads."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def send_all(outgoing: list) -> list:
+    """
+    outgoing = [(user_phone, body), ...] → [(user_phone, body, sid | None), ...]
+    Envois concurrents (LANAI_BROADCAST_WORKERS) limités à LANAI_BROADCAST_RATE msg/s.
+    """
+    sender = os.environ.get("TWILIO_WHATSAPP_NUMBER")
+    if not sender:
+        raise ValueError("❌ TWILIO_WHATSAPP_NUMBER manquant.")
+    client = get_twilio()
+    limiter = RateLimiter(SEND_RATE)
+
+    def _send(item):
+        to, body = item
+        limiter.wait()
+        try:
+            msg = client.messages.create(from_=sender, body=body, to=to)
+            return to, body, msg.sid
+        except Exception as e:
+            log.error("envoi Twilio: %s", e, extra={"to": to})
+            return to, body, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(SEND_WORKERS, len(outgoing)))) as pool:
+        return list(pool.map(lanai_log.bind(_send), outgoing))
+
+
+def fan_out(job: str, source: str, build_variant, render, variant_of=None) -> dict:
+    """
+    - build_variant(variant) -> contenu commun (calculé une fois par variante)
+    - render(contenu, abonné) -> texte final du destinataire (ex: salutation avec le prénom)
+    - variant_of(abonné)      -> variante effective (défaut : colonne 'variant')
+    Les envois réussis sont consignés en DB en un seul lot (role assistant, direction out).
+    """
+    subs = load_subscribers(job)
+    if not subs:
+        log.info("aucun abonné", extra={"job": job})
+        return {"subscribers": 0, "variants": 0, "sent": 0}
+
+    groups = group_by_variant(subs, variant_of)
+    outgoing = []
+    for variant, members in groups.values():
+        content = build_variant(variant)
+        for sub in members:
+            outgoing.append((sub["user_phone"], render(content, sub)))
+
+    t0 = time.monotonic()
+    results = send_all(outgoing)
+    sent = [r for r in results if r[2]]
+    try:
+        add_messages([
+            {"user_phone": to, "role": "assistant", "content": body,
+             "msg_sid": sid, "direction": "out", "source": source}
+            for to, body, sid in sent
+        ])
+    except Exception as e:
+        log.error("messages envoyés non enregistrés: %s", e, extra={"job": job})
+
+    log.info("diffusion terminée", extra={"job": job, "sent": len(sent), "total": len(outgoing),
+                                          "variants": len(groups), "elapsed_s": round(time.monotonic() - t0, 1)})
+    return {"subscribers": len(subs), "variants": len(groups), "sent": len(sent)}
@@ -0,0 +1,50 @@
+# lanai_clients.py — clients partagés (créés à la demande, réutilisés par tous les jobs du process)
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_lock = threading.Lock()
+_twilio = None
+_session = None
+
+
+def get_twilio():
+    """Client Twilio unique par process (identifiants lus dans l'environnement)."""
+    global _twilio
+    if _twilio is None:
+        with _lock:
+            if _twilio is None:
+                from twilio.rest import Client
+                sid = os.environ.get("TWILIO_ACCOUNT_SID")
+                token = os.environ.get("TWILIO_AUTH_TOKEN")
+                if not sid or not token:
+                    raise ValueError("❌ Identifiants Twilio manquants.")
+                _twilio = Client(sid, token)
+                base = os.environ.get("TWILIO_API_BASE")  # test de charge : faux Twilio local
+                if base:
+                    _twilio.api.base_url = base.rstrip("/")
+    return _twilio
+
+
+def get_session() -> requests.Session:
+    """Session HTTP avec pool keep-alive (RapidAPI, OpenWeather...) partagée entre les jobs."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+                s.mount("https://", adapter)
+                s.mount("http://", adapter)
+                _session = s
+    return _session
+
+
+def reset_after_fork():
+    """Process enfant (fork) : on oublie les clients du parent (sockets partagées), recréés au prochain appel."""
+    global _lock, _twilio, _session
+    _lock = threading.Lock()
+    _twilio = None
+    _session = None
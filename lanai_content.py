@@ -2,20 +2,22 @@
 import os
 import json
 import random
-import hashlib
 from datetime import datetime, timedelta
-from twilio.rest import Client
-from memory_store import init_schema, add_message  # mémoire partagée DB
+from memory_store import init_schema, recent_hashes, compute_content_hash  # mémoire partagée DB
+import model_router
+import profile_store
+from lanai_broadcast import fan_out, init_subscriptions_schema
+from content_rotation import init_rotation_schema, load_rotation, save_rotation
+from snippet_pool import SYSTEM_PROMPT, THEMES, init_snippets_schema, pop_snippet, refill
+import lanai_log
 
 # ======== Config via ENV ========
 MODE = os.environ.get("LANAI_MODE", "hybrid").lower()  # hybrid | json | gpt
 HISTORY_DAYS = int(os.environ.get("LANAI_HISTORY_DAYS", "60"))
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")  # optionnel ici
+log = lanai_log.get_logger("content")
 # ================================
 
-# ======== Init DB (table si besoin) ========
-init_schema()
-
 # ======== Chemins robustes (banque JSON facultative) ========
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CANDIDATE_JSON = [
@@ -31,115 +33,116 @@ def load_bank():
         return json.load(f)
 BANK = load_bank()
 
-# ======== Anti-répétition (locale) via hash ========
-HISTORY_FILE = os.path.join(BASE_DIR, "history.json")
-def load_history():
+# ======== Anti-répétition via hash (colonne content_hash de public.messages) ========
+# Les messages envoyés sont déjà consignés (source cron_content) : ce journal en ajout seul sert
+# de mémoire. On charge une fois par run l'ensemble des hashes des LANAI_HISTORY_DAYS derniers
+# jours (index idx_messages_source_time_hash) → test d'appartenance en O(1).
+CONTENT_SOURCE = "cron_content"
+LEGACY_HISTORY_FILE = os.path.join(BASE_DIR, "history.json")  # ancien stockage, lu s'il existe encore
+
+def _legacy_hashes() -> set:
     try:
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(LEGACY_HISTORY_FILE, "r", encoding="utf-8") as f:
+            entries = json.load(f).get("messages", [])
     except Exception:
-        return {"messages": []}
+        return set()
+    cutoff = datetime.utcnow() - timedelta(days=HISTORY_DAYS)
+    return {m["hash"] for m in entries if datetime.fromisoformat(m["ts"]) >= cutoff}
 
-def save_history(hist):
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(hist, f, ensure_ascii=False, indent=2)
+def load_sent_hashes() -> set:
+    sent = _legacy_hashes()
+    try:
+        sent |= recent_hashes(CONTENT_SOURCE, HISTORY_DAYS)
+    except Exception as e:
+        log.warning("anti-répétition indisponible: %s", e)
+    return sent
 
-def prune_history(hist):
-    cutoff = datetime.utcnow() - timedelta(days=HISTORY_DAYS)
-    pruned = [m for m in hist.get("messages", []) if datetime.fromisoformat(m["ts"]) >= cutoff]
-    hist["messages"] = pruned
-    return hist
+def already_sent(text, sent: set) -> bool:
+    return compute_content_hash(text.strip()) in sent
 
-def already_sent(text, hist):
-    h = hashlib.md5(text.strip().encode("utf-8")).hexdigest()
-    return any(m["hash"] == h for m in hist.get("messages", []))
+def remember(text, sent: set):
+    # La persistance est faite par le log DB de l'envoi (fan_out) ; ici on couvre le run en cours
+    sent.add(compute_content_hash(text.strip()))
 
-def remember(text, hist):
-    h = hashlib.md5(text.strip().encode("utf-8")).hexdigest()
-    hist["messages"].append({"ts": datetime.utcnow().isoformat(), "hash": h, "preview": text[:120]})
-    save_history(hist)
+# ======== Touches personnelles (profil du destinataire, ajoutées à l'envoi) ========
+def recipient_profile(user_phone: str | None) -> dict:
+    """Profil du destinataire (profile_store) ; {} si inconnu / indisponible."""
+    if not user_phone:
+        return {}
+    try:
+        return profile_store.get_compiled(user_phone)["profile"]
+    except Exception as e:
+        log.warning("profil indisponible: %s", e, extra={"user_phone": user_phone})
+        return {}
 
-HISTORY = prune_history(load_history())
+# ======== GPT helper (via model_router) ========
+def pooled_snippet(prenom: str = "Mohamed"):
+    """Snippet pré-généré (snippet_pool) avec la salutation ; None si la réserve est vide / DB HS."""
+    try:
+        text = pop_snippet()
+    except Exception as e:
+        log.warning("réserve de snippets indisponible: %s", e)
+        return None
+    return f"Salam aleykum {prenom},\n{text}" if text else None
 
-# ======== GPT helper (v1 + fallback v0.28) ========
-def generate_gpt_snippet():
+def generate_gpt_snippet(prenom: str = "Mohamed", profile: dict | None = None):
+    """
+    Génération immédiate (secours quand la réserve est vide) : écrite pour un seul destinataire,
+    donc avec ses consignes personnelles (prénom, clins d'œil du profil) quand on a son profil.
+    """
     if not OPENAI_API_KEY:
         return None
 
-    system = (
-        "Tu es Lanai, compagnon WhatsApp de Mohamed Djeziri. "
-        "Langage simple, phrases courtes, ton chaleureux, bienveillant. "
-        "Fais parfois un clin d'œil à sa femme Milouda et à leur chat Lana. "
-        "2 à 3 phrases max."
-    )
-    themes = [
-        "encouragement doux + mini question",
-        "prise de nouvelles + clin d’œil à Lana le chat",
-        "mot positif + petite suggestion (respiration, marche)",
-        "check-in basket (as-tu regardé les scores?) + phrase motivante",
-    ]
+    system_prompt = profile_store.build_persona_rules(profile) if profile else SYSTEM_PROMPT
     user_prompt = (
-        "Commence par « Salam aleykum Mohamed, » sur la première ligne. "
-        f"Thème: {random.choice(themes)}. "
-        "Évite le jargon. Pas d'emojis dans cette partie."
+        f"Commence par « Salam aleykum {prenom}, » sur la première ligne. "
+        f"Thème: {random.choice(THEMES)}. "
+        "2 à 3 phrases max. Évite le jargon. Pas d'emojis dans cette partie."
     )
 
-    # v1
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.7,
-            max_tokens=150
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception as e1:
-        print(f"⚠️ OpenAI v1 indisponible, essai v0.28: {e1}")
-
-    # v0.28
-    try:
-        import openai
-        openai.api_key = OPENAI_API_KEY
-        resp = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0.7,
-            max_tokens=150
-        )
-        return resp["choices"][0]["message"]["content"].strip()
-    except Exception as e2:
-        print(f"⚠️ GPT fallback (v0.28) échec : {e2}")
-        return None
+    # Route "content" de model_router (modèle, max_tokens, timeout et fallbacks configurables)
+    text = model_router.complete(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        route="content",
+    )
+    if not text:
+        log.warning("GPT indisponible pour le snippet du jour")
+    return text
 
 # ======== Sélection banque JSON (toujours incluse en mode hybrid/json) ========
-def pick_from_bank():
-    categories = []
-    for key in ("hadith", "coran", "citations", "sante", "citations_fiables"):
-        if key in BANK and isinstance(BANK[key], list) and BANK[key]:
-            categories.append(key)
+BANK_CATEGORIES = ("hadith", "coran", "citations", "sante", "citations_fiables")
+PREFIX_MAP = {
+    "hadith": "🤲 Hadith : ",
+    "coran": "📖 Coran : ",
+    "citations": "✨ Citation : ",
+    "citations_fiables": "✨ Citation : ",
+    "sante": "💊 Santé : ",
+}
+
+def bank_subset():
+    return {k: BANK[k] for k in BANK_CATEGORIES if isinstance(BANK.get(k), list) and BANK[k]}
+
+def pick_from_bank(rotation=None):
+    """Ligne préfixée ; avec une Rotation (content_rotation) : sans répétition dans le cycle."""
+    if rotation is not None:
+        picked = rotation.pick()
+        if not picked:
+            return None
+        cat, txt = picked
+        return f"{PREFIX_MAP.get(cat, '')}{txt}"
+
+    categories = list(bank_subset())
     if not categories:
         return None
     cat = random.choice(categories)
     txt = random.choice(BANK[cat]).strip()
-    prefix_map = {
-        "hadith": "🤲 Hadith : ",
-        "coran": "📖 Coran : ",
-        "citations": "✨ Citation : ",
-        "citations_fiables": "✨ Citation : ",
-        "sante": "💊 Santé : ",
-    }
-    return f"{prefix_map.get(cat, '')}{txt}"
+    return f"{PREFIX_MAP.get(cat, '')}{txt}"
 
 # ======== Composer message final ========
-def build_message():
+def build_message(prenom: str = "Mohamed", rotation=None, profile: dict | None = None):
     effective_mode = MODE
     if not OPENAI_API_KEY and MODE in ("gpt", "hybrid"):
         effective_mode = "json"
@@ -148,61 +151,69 @@ def build_message():
     bank_line = None
 
     if effective_mode in ("gpt", "hybrid"):
-        gpt_text = generate_gpt_snippet()
+        gpt_text = pooled_snippet(prenom) or generate_gpt_snippet(prenom, profile)
 
     if effective_mode in ("json", "hybrid"):
-        bank_line = pick_from_bank()  # toujours inclure une ligne JSON
+        bank_line = pick_from_bank(rotation)  # toujours inclure une ligne JSON
 
     if effective_mode in ("gpt", "hybrid") and not gpt_text and bank_line:
-        gpt_text = "Salam aleykum Mohamed,"  # mini intro si GPT HS
+        gpt_text = f"Salam aleykum {prenom},"  # mini intro si GPT HS
 
     if gpt_text and bank_line:
         return f"{gpt_text}\n\n{bank_line}".strip()
     if gpt_text:
         return gpt_text.strip()
     if bank_line:
-        return f"Salam aleykum Mohamed,\n\n{bank_line}".strip()
+        return f"Salam aleykum {prenom},\n\n{bank_line}".strip()
 
     raise ValueError("❌ Aucun contenu disponible (ni GPT, ni JSON).")
 
-# ======== Envoi WhatsApp via Twilio ========
-def send_whatsapp(text):
-    twilio_sid = os.environ.get("TWILIO_ACCOUNT_SID")
-    twilio_token = os.environ.get("TWILIO_AUTH_TOKEN")
-    twilio_whatsapp = os.environ.get("TWILIO_WHATSAPP_NUMBER")  # ex: whatsapp:+14155238886
-    receiver_whatsapp = os.environ.get("MY_WHATSAPP_NUMBER")    # ex: whatsapp:+33XXXXXXXXX
-
-    if not twilio_sid or not twilio_token:
-        raise ValueError("❌ Identifiants Twilio manquants.")
-    if not twilio_whatsapp or not receiver_whatsapp:
-        raise ValueError("❌ Numéros WhatsApp manquants (TWILIO_WHATSAPP_NUMBER / MY_WHATSAPP_NUMBER).")
-
-    client = Client(twilio_sid, twilio_token)
-    message = client.messages.create(
-        from_=twilio_whatsapp,
-        body=text,
-        to=receiver_whatsapp
-    )
-    return message.sid, receiver_whatsapp
+# ======== Job (cron ou scheduler) ========
+def run():
+    """
+    Message du jour diffusé aux abonnés du job 'content' : un message par destinataire
+    (réserve commune et neutre, prénom et clins d'œil du profil ajoutés à l'envoi),
+    anti-répétition commune, envoi + log DB en lot.
+    """
+    sent = load_sent_hashes()
+    rotation = load_rotation(bank_subset())
+
+    def build_variant(variant):
+        profile = recipient_profile(variant.get("user_phone"))
+        prenom = variant.get("prenom") or profile.get("Identité", {}).get("Prénom") or "Mohamed"
+        final = build_message(prenom, rotation, profile)
+        # Anti-répétition (hashes des derniers jours)
+        if already_sent(final, sent):
+            alt = build_message(prenom, rotation, profile)
+            if not already_sent(alt, sent):
+                final = alt
+        remember(final, sent)
+        return final
 
-# ======== Main (cron) ========
-if __name__ == "__main__":
-    final = build_message()
-
-    # Anti-répétition locale
-    if already_sent(final, HISTORY):
-        alt = build_message()
-        if not already_sent(alt, HISTORY):
-            final = alt
-
-    sid, user_phone = send_whatsapp(final)
-    remember(final, HISTORY)
-
-    # ÉCRITURE EN DB PARTAGÉE : consigner le message du cron comme 'assistant'
     try:
-        add_message(user_phone, "assistant", final)
-    except Exception as e:
-        print(f"⚠️ Erreur DB (save cron): {e}")
+        stats = fan_out(
+            "content", CONTENT_SOURCE,
+            build_variant=build_variant,
+            render=lambda text, sub: text,
+            variant_of=lambda sub: {**sub["variant"], "prenom": sub.get("prenom"), "user_phone": sub["user_phone"]},
+        )
+    finally:
+        save_rotation(rotation)  # lignes tirées = consommées, même si l'envoi a échoué
+    log.info("contenu envoyé", extra={"mode": MODE, "content_file": CONTENT_FILE})
+
+    # Réserve basse → on la regarnit maintenant (après l'envoi, hors chemin critique)
+    if OPENAI_API_KEY and MODE in ("gpt", "hybrid"):
+        try:
+            refill()
+        except Exception as e:
+            log.error("recharge des snippets: %s", e)
+    return stats
 
-    print(f"ℹ️ Mode: {MODE} | JSON: {CONTENT_FILE if CONTENT_FILE else 'non'}")
-    print(f"✅ WhatsApp envoyé. SID: {sid}")
+# ======== Main (cron) ========
+if __name__ == "__main__":
+    # ======== Init DB (table si besoin) ========
+    init_schema()
+    init_subscriptions_schema()
+    init_rotation_schema()
+    init_snippets_schema()
+    run()
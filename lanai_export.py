@@ -0,0 +1,73 @@
+# lanai_export.py — export des conversations (JSONL ou CSV), écrit au fil de l'eau
+#   python lanai_export.py --user "whatsapp:+33..." --since 2025-01-01 --format csv --out mohamed.csv
+#   python lanai_export.py --format jsonl > tout.jsonl
+import sys
+import csv
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from memory_store import export_messages, EXPORT_COLUMNS
+
+
+def _parse_day(value: str | None):
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def _serialize(row: dict) -> dict:
+    out = dict(row)
+    if out.get("created_at") is not None:
+        out["created_at"] = out["created_at"].isoformat()
+    return out
+
+
+def write_jsonl(rows, f) -> int:
+    n = 0
+    for row in rows:
+        f.write(json.dumps(_serialize(row), ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+
+def write_csv(rows, f) -> int:
+    writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    n = 0
+    for row in rows:
+        writer.writerow(_serialize(row))
+        n += 1
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export des messages Lanai (mémoire constante).")
+    parser.add_argument("--user", help="numéro 'whatsapp:+33...' (tous si absent)")
+    parser.add_argument("--since", help="YYYY-MM-DD inclus (UTC)")
+    parser.add_argument("--until", help="YYYY-MM-DD exclu (UTC)")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--out", help="fichier de sortie (stdout si absent)")
+    parser.add_argument("--page-size", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rows = export_messages(
+        user_phone=args.user,
+        since=_parse_day(args.since),
+        until=_parse_day(args.until),
+        page_size=args.page_size,
+    )
+    writer = write_csv if args.format == "csv" else write_jsonl
+
+    t0 = time.monotonic()
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            n = writer(rows, f)
+    else:
+        n = writer(rows, sys.stdout)
+    elapsed = time.monotonic() - t0
+    print(f"✅ {n} messages exportés en {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
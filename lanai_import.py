@@ -0,0 +1,109 @@
+# lanai_import.py — rejoue un export de discussion WhatsApp dans public.messages (COPY en masse)
+#   python lanai_import.py "Discussion WhatsApp avec Papa.txt" --user "whatsapp:+33..." --bot-name "Lanai"
+import re
+import sys
+import hashlib
+import argparse
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from memory_store import init_schema, bulk_import_messages, compute_content_hash
+
+PARIS = ZoneInfo("Europe/Paris")
+SOURCE = "import_whatsapp"
+
+# Android : "12/03/2024 14:05 - Nom: texte"  (parfois "12/03/2024, 14:05 - ")
+# iOS     : "[12/03/2024 14:05:32] Nom: texte" (parfois préfixé d'un caractère invisible U+200E)
+LINE_RE = re.compile(
+    r"^‎?\[?(?P<date>\d{1,2}/\d{1,2}/\d{2,4}),?\s+(?P<time>\d{1,2}:\d{2}(?::\d{2})?)\]?"
+    r"(?:\s+-)?\s+(?P<author>[^:]+?):\s(?P<text>.*)$"
+)
+# Ligne d'en-tête sans auteur (messages système : chiffrement, ajout au groupe...)
+SYSTEM_RE = re.compile(r"^‎?\[?\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}")
+SKIP_TEXTS = ("<Médias omis>", "<Media omitted>", "image absente", "Ce message a été supprimé")
+
+
+def _parse_ts(day: str, hm: str) -> datetime:
+    d, m, y = day.split("/")
+    if len(y) == 2:
+        y = "20" + y
+    fmt = "%d/%m/%Y %H:%M:%S" if hm.count(":") == 2 else "%d/%m/%Y %H:%M"
+    return datetime.strptime(f"{int(d):02d}/{int(m):02d}/{y} {hm}", fmt).replace(tzinfo=PARIS)
+
+
+def parse_whatsapp_export(lines, user_phone: str, bot_names=("Lanai",)):
+    """
+    Générateur de lignes prêtes pour bulk_import_messages.
+    - auteur dans bot_names → role 'assistant' / direction 'out', sinon 'user' / 'in'
+    - lignes de continuation rattachées au message précédent
+    - msg_sid synthétique stable → réimporter le même fichier ne crée pas de doublons
+    """
+    bots = {b.strip().lower() for b in bot_names}
+    current = None
+
+    def finish(msg):
+        text = msg["content"].strip()
+        if not text or any(s in text for s in SKIP_TEXTS):
+            return None
+        role = "assistant" if msg["author"].lower() in bots else "user"
+        sid_src = f"{user_phone}|{msg['created_at'].isoformat()}|{msg['author']}|{text}"
+        return {
+            "user_phone": user_phone,
+            "role": role,
+            "content": text,
+            "created_at": msg["created_at"],
+            "msg_sid": "import:" + hashlib.sha1(sid_src.encode("utf-8")).hexdigest()[:24],
+            "direction": "out" if role == "assistant" else "in",
+            "source": SOURCE,
+            "content_hash": compute_content_hash(text),
+        }
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        m = LINE_RE.match(line)
+        if m:
+            if current:
+                row = finish(current)
+                if row:
+                    yield row
+            current = {
+                "created_at": _parse_ts(m.group("date"), m.group("time")),
+                "author": m.group("author").strip().lstrip("‎"),
+                "content": m.group("text"),
+            }
+        elif SYSTEM_RE.match(line):
+            # Message système : on clôt le message en cours sans rien rattacher
+            if current:
+                row = finish(current)
+                if row:
+                    yield row
+            current = None
+        elif current is not None:
+            current["content"] += "\n" + line
+
+    if current:
+        row = finish(current)
+        if row:
+            yield row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import d'un export WhatsApp dans la mémoire Lanai.")
+    parser.add_argument("path", help="fichier .txt exporté depuis WhatsApp")
+    parser.add_argument("--user", required=True, help="numéro de la personne, ex 'whatsapp:+33...'")
+    parser.add_argument("--bot-name", action="append", default=None,
+                        help="nom(s) d'auteur à considérer comme Lanai (répétable, défaut: Lanai)")
+    args = parser.parse_args(argv)
+
+    init_schema()
+    with open(args.path, "r", encoding="utf-8-sig") as f:
+        rows = parse_whatsapp_export(f, args.user, tuple(args.bot_name or ("Lanai",)))
+        stats = bulk_import_messages(rows)
+
+    print(
+        f"✅ Import {args.path} : {stats['parsed']} messages lus, {stats['inserted']} insérés, "
+        f"{stats['duplicates']} doublons ignorés, {stats['seconds']}s ({stats['rows_per_sec']} lignes/s)"
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
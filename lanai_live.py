@@ -0,0 +1,265 @@
+# lanai_live.py — scores en direct pour les équipes / ligues suivies (process long, comme le scheduler)
+#   python lanai_live.py
+# Abonnés : public.subscriptions, job 'live', variant =
+#   {"foot": [ids ligues], "foot_teams": [ids équipes], "basket": [noms ligues], "basket_teams": [ids]}
+# Un message WhatsApp n'est envoyé que si le score ou le statut d'un match suivi change
+# (basket : changement de période / fin de match seulement, pas à chaque panier).
+import os
+import signal
+import threading
+from datetime import datetime, timedelta
+
+import rapidapi_quota
+from memory_store import init_schema, add_messages
+from lanai_broadcast import load_subscribers, send_all, init_subscriptions_schema
+from lanai_results import PARIS
+from sports_providers import registry
+from fixtures import Match, Status
+import lanai_log
+
+# ======== Config via ENV ========
+FAST_SECONDS = float(os.environ.get("LANAI_LIVE_FAST", "60"))     # un match suivi est en cours
+IDLE_SECONDS = float(os.environ.get("LANAI_LIVE_IDLE", "900"))    # rien en cours
+DAILY_BUDGET = int(os.environ.get("LANAI_LIVE_BUDGET", "300"))    # requêtes RapidAPI / jour (Paris)
+QUIET_HOURS = os.environ.get("LANAI_LIVE_QUIET", "23-8")          # pas d'envoi la nuit ("" = jamais)
+log = lanai_log.get_logger("live")
+
+FOOT = registry.get("football")
+BASKET = registry.get("basketball")
+# Statuts (en cours / terminé) : fixtures.Status, mêmes codes que le récap et les questions du webhook
+STATUS_LABELS = {
+    "1H": "Coup d'envoi", "HT": "Mi-temps", "2H": "Reprise", "ET": "Prolongations",
+    "P": "Tirs au but", "FT": "Fin du match", "AET": "Fin après prolongations", "PEN": "Fin aux tirs au but",
+    "Q1": "Début du match", "Q2": "2e quart-temps", "Q3": "3e quart-temps", "Q4": "4e quart-temps",
+    "OT": "Prolongation", "AOT": "Fin après prolongation",
+}
+
+
+# ==== Budget de requêtes (remis à zéro à minuit, heure de Paris) ====
+class LiveBudget:
+    def __init__(self, per_day: int):
+        self.per_day = per_day
+        self.day = None
+        self.used = 0
+
+    def _roll(self):
+        today = datetime.now(PARIS).date()
+        if today != self.day:
+            self.day, self.used = today, 0
+
+    def remaining(self) -> int:
+        self._roll()
+        return max(0, self.per_day - self.used)
+
+    def spend(self, n: int = 1):
+        self._roll()
+        self.used += n
+
+    def min_interval(self, cost: int) -> float:
+        """Intervalle minimal pour tenir jusqu'à minuit avec le budget restant (cost = requêtes par tour)."""
+        now = datetime.now(PARIS)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), PARIS)
+        left = (midnight - now).total_seconds()
+        polls_left = self.remaining() // max(1, cost)
+        return left if polls_left == 0 else left / polls_left
+
+
+# ==== Suivis ====
+def follows_of(sub: dict) -> dict:
+    v = sub.get("variant") or {}
+    return {
+        "foot": set(v.get("foot") or []), "foot_teams": set(v.get("foot_teams") or []),
+        "basket": set(v.get("basket") or []), "basket_teams": set(v.get("basket_teams") or []),
+    }
+
+
+def is_followed(m: Match, follows: dict) -> bool:
+    if m.sport == "football":
+        return m.league_id in follows["foot"] or bool({m.home_id, m.away_id} & follows["foot_teams"])
+    return m.league_name in follows["basket"] or bool({m.home_id, m.away_id} & follows["basket_teams"])
+
+
+def key_of(m: Match) -> tuple:
+    return m.sport, m.fixture_id
+
+
+# ==== Appels API (fournisseurs de sports_providers, matchs normalisés en fixtures.Match) ====
+def poll_football(budget: LiveBudget) -> list:
+    """Tous les matchs de foot en cours, toutes ligues : une seule requête (live=all)."""
+    budget.spend()
+    data = FOOT.get(FOOT.fixtures_path, {"live": "all", "timezone": "Europe/Paris"}, "live")
+    if data is None:
+        log.error("foot live indisponible")
+        return []
+    return [m for m in FOOT.parse(data.get("response")) if m.fixture_id is not None]
+
+
+def fetch_football_fixture(fixture_id: int, budget: LiveBudget) -> Match | None:
+    """Match sorti de la liste live → son état final."""
+    budget.spend()
+    data = FOOT.get(FOOT.fixtures_path, {"id": fixture_id, "timezone": "Europe/Paris"}, "live")
+    matches = FOOT.parse(data.get("response")) if data else []
+    return matches[0] if matches else None
+
+
+def poll_basketball(league_names: set, budget: LiveBudget) -> list:
+    """Matchs du jour des ligues basket suivies (une requête par ligue)."""
+    out = []
+    today = datetime.now(PARIS).strftime("%Y-%m-%d")
+    for lg in BASKET.leagues():
+        if lg["nom"] not in league_names:
+            continue
+        budget.spend()
+        data = BASKET.get(BASKET.fixtures_path, {**BASKET.league_params(lg, today), "timezone": "Europe/Paris"}, "live")
+        if data is None:
+            continue
+        for m in BASKET.parse(data.get("response")):
+            if m.status not in (Status.LIVE, Status.FINISHED):
+                continue
+            # ligue suivie = nom affiché de la ligue résolue (variante 'basket' des abonnés)
+            m.league_id, m.league_name = lg["id"], lg["nom"]
+            out.append(m)
+    return out
+
+
+# ==== Détection des changements ====
+def diff(prev: dict, matches: list) -> list:
+    """
+    prev : {key: (home, away, code court, Status)} mis à jour sur place → événements [(match, 'goal'|'status')].
+    Premier passage d'un match : pas d'événement, sauf coup d'envoi (1H / Q1).
+    """
+    events = []
+    for m in matches:
+        state = (m.home_score, m.away_score, m.short, m.status)
+        key = key_of(m)
+        old = prev.get(key)
+        prev[key] = state
+        if old is None:
+            if m.short in ("1H", "Q1"):
+                events.append((m, "status"))
+            continue
+        if old == state:
+            continue
+        if old[2] != m.short and m.finished:
+            events.append((m, "status"))  # fin du match : le score final suffit
+        elif m.sport == "football" and (old[0], old[1]) != (m.home_score, m.away_score):
+            events.append((m, "goal"))
+        elif old[2] != m.short:
+            events.append((m, "status"))
+    return events
+
+
+def format_event(m: Match, kind: str) -> str:
+    score = f"{m.home_name} {m.home_score or 0} - {m.away_score or 0} {m.away_name}"
+    if kind == "goal":
+        minute = f" ({m.elapsed}')" if m.elapsed else ""
+        return f"⚽ But !{minute} {score}"
+    emoji = "⚽" if m.sport == "football" else "🏀"
+    return f"{emoji} {STATUS_LABELS.get(m.short, m.status_code or m.short)} : {score}"
+
+
+def in_quiet_hours(now: datetime | None = None) -> bool:
+    if not QUIET_HOURS:
+        return False
+    start, end = (int(x) for x in QUIET_HOURS.split("-"))
+    h = (now or datetime.now(PARIS)).hour
+    return (start <= h or h < end) if start > end else (start <= h < end)
+
+
+def push(events: list, subs: list) -> int:
+    """Un message par abonné regroupant les événements des matchs qu'il suit."""
+    outgoing = []
+    for sub in subs:
+        follows = follows_of(sub)
+        lines = [format_event(m, kind) for m, kind in events if is_followed(m, follows)]
+        if lines:
+            outgoing.append((sub["user_phone"], "\n".join(lines)))
+    if not outgoing:
+        return 0
+    sent = [r for r in send_all(outgoing) if r[2]]
+    try:
+        add_messages([{"user_phone": to, "role": "assistant", "content": body,
+                       "msg_sid": sid, "direction": "out", "source": "live"} for to, body, sid in sent])
+    except Exception as e:
+        log.error("messages live non enregistrés: %s", e)
+    return len(sent)
+
+
+# ==== Boucle ====
+_stop = threading.Event()
+
+
+def poll_once(state: dict, subs: list, budget: LiveBudget) -> tuple:
+    """Un tour de polling → (nb de matchs suivis en cours, nb de requêtes du tour)."""
+    before = budget.used
+    follows = [follows_of(s) for s in subs]
+    want_foot = any(f["foot"] or f["foot_teams"] for f in follows)
+    basket_leagues = set().union(*(f["basket"] for f in follows)) if follows else set()
+    if any(f["basket_teams"] for f in follows):
+        basket_leagues |= {lg["nom"] for lg in BASKET.leagues()}
+
+    fixtures = []
+    if want_foot:
+        live = poll_football(budget)
+        fixtures += live
+        # Matchs suivis qui ont quitté la liste live → état final (coup de sifflet)
+        live_keys = {key_of(m) for m in live}
+        for key, (_, _, _, status) in list(state.items()):
+            if key[0] != "football" or key in live_keys:
+                continue
+            if status is Status.FINISHED or budget.remaining() <= 0:
+                state.pop(key)  # fin déjà signalée (ou plus de budget) : on oublie le match
+                continue
+            final = fetch_football_fixture(key[1], budget)
+            if final:
+                fixtures.append(final)
+            else:
+                state.pop(key)
+    if basket_leagues:
+        fixtures += poll_basketball(basket_leagues, budget)
+
+    followed = [m for m in fixtures if any(is_followed(m, f) for f in follows)]
+    events = diff(state, followed)
+    if events:
+        if in_quiet_hours():
+            log.info("événements pendant les heures calmes, non envoyés", extra={"events": len(events)})
+        else:
+            log.info("événements envoyés", extra={"events": len(events), "messages": push(events, subs)})
+
+    in_progress = sum(1 for m in followed if m.status is Status.LIVE)
+    return in_progress, budget.used - before
+
+
+def run_forever():
+    init_schema()
+    init_subscriptions_schema()
+    rapidapi_quota.init_quota_schema()
+    budget = LiveBudget(DAILY_BUDGET)
+    state = {}
+    cost = 1
+    while not _stop.is_set():
+        subs = load_subscribers("live")
+        if budget.remaining() <= 0:
+            wait = budget.min_interval(1)
+            log.warning("budget du jour épuisé", extra={"budget": budget.per_day, "resume_in_min": round(wait / 60)})
+            _stop.wait(wait)
+            continue
+        try:
+            in_progress, spent = poll_once(state, subs, budget)
+            cost = max(1, spent)
+        except Exception:
+            log.exception("tour de polling en échec")
+            in_progress = 0
+        base = FAST_SECONDS if in_progress else IDLE_SECONDS
+        _stop.wait(max(base, budget.min_interval(cost)))
+
+
+def _handle_stop(signum, frame):
+    log.info("arrêt demandé (signal %s)", signum)
+    _stop.set()
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+    run_forever()
@@ -0,0 +1,462 @@
+# lanai_loadtest.py — test de charge du webhook, sans aucun service externe réel
+#   DATABASE_URL=postgresql://localhost/lanai_load python lanai_loadtest.py --rate 20 --duration 60
+#   python lanai_loadtest.py --rate 50 --latency openai=1200,twilio=200 --errors openai=0.05 --json rapport.json
+# - faux OpenAI / Twilio / RapidAPI / OpenWeather locaux (latence et taux d'erreur réglables)
+# - app.py servi en local (werkzeug, multi-thread), Postgres local obligatoire (DATABASE_URL)
+# - rejoue un corpus de messages (sport, météo, discussion, doublons, renvois Twilio) à débit fixe
+# - rapport : débit, latence de réponse p50/p95/p99 (webhook → envoi Twilio), détail par étape
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==== Corpus ====
+CORPUS = {
+    "chat": [
+        "Salam aleykum Lanai, ça va ?",
+        "Je suis un peu fatigué aujourd'hui, tu as un conseil ?",
+        "Tu peux me donner une idée de repas léger pour ce soir ?",
+        "Merci pour ton message de ce matin, ça m'a fait du bien",
+        "Explique-moi pourquoi il faut boire de l'eau même en hiver",
+        "Tu te souviens de ce que je t'ai dit sur mon genou la dernière fois ?",
+        "Raconte-moi une histoire courte avant de dormir",
+        "Ok merci",
+        "Comment je peux mieux dormir la nuit ?",
+        "Rappelle-moi pourquoi la marche c'est bon pour le cœur",
+    ],
+    "sports": [
+        "Qu'a fait le PSG hier ?",
+        "Qu'a fait l'OM ce week-end ?",
+        "C'était quoi le score du Real Madrid hier ?",
+        "Qu'a fait Lille hier ?",
+        "C'était quoi le score du Paris Basketball hier ?",
+        "Qu'a fait Monaco ce week-end ?",
+    ],
+    "weather": [
+        "Quel temps demain à Loffre ?",
+        "Il va faire beau au Cannet après-demain ?",
+        "Météo demain ?",
+        "Il va pleuvoir demain à Loffre ?",
+    ],
+}
+DEFAULT_MIX = "chat=0.6,sports=0.25,weather=0.15"
+DEFAULT_LATENCY = "openai=900,twilio=150,rapidapi=250,weather=120"   # ms (moyenne, ±20 %)
+
+log = logging.getLogger("loadtest")
+
+
+def parse_pairs(spec: str) -> dict:
+    """'openai=900,twilio=150' → {'openai': 900.0, 'twilio': 150.0}"""
+    out = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = float(v)
+    return out
+
+
+def percentile(values: list, p: float) -> float | None:
+    if not values:
+        return None
+    s = sorted(values)
+    i = min(len(s) - 1, max(0, round(p / 100 * (len(s) - 1))))
+    return round(s[i], 1)
+
+
+# ==== Faux services ====
+class FakeService:
+    """Serveur HTTP local : handler(method, path, query, headers, body) -> (status, json, en-têtes)."""
+
+    def __init__(self, name: str, handler, latency_ms: float = 0.0, error_rate: float = 0.0):
+        self.name = name
+        self.handler = handler
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        service = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload, headers = service.respond(method, self.path, self.headers, body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, str(v))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def respond(self, method, raw_path, headers, body):
+        if self.latency_ms:
+            time.sleep(max(0.0, random.gauss(self.latency_ms, self.latency_ms * 0.2)) / 1000)
+        with self._lock:
+            self.calls += 1
+            failed = random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            return 500, {"error": {"message": f"erreur injectée ({self.name})"}}, None
+        parts = urllib.parse.urlsplit(raw_path)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        return self.handler(method, parts.path, query, headers, body)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "errors_injected": self.errors,
+                "latency_ms": self.latency_ms, "error_rate": self.error_rate}
+
+
+_REPLIES = [
+    "Wa aleykum salam ! Je vais bien, et toi ? Pense à bien t'hydrater aujourd'hui.",
+    "Bonne idée : une soupe de légumes et un peu de pain complet, léger et rassasiant.",
+    "Je comprends, prends le temps de te reposer un peu cet après-midi.",
+    "Avec plaisir ! N'hésite pas si tu as besoin d'autre chose.",
+]
+
+
+def openai_handler(method, path, query, headers, body):
+    req = json.loads(body or b"{}")
+    text = random.choice(_REPLIES)
+    return 200, {
+        "id": f"chatcmpl-{random.getrandbits(48):x}", "object": "chat.completion",
+        "created": int(time.time()), "model": req.get("model", "fake"),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": sum(len(m.get("content", "")) // 4 for m in req.get("messages", [])),
+                  "completion_tokens": len(text) // 4, "total_tokens": 0},
+    }, None
+
+
+def twilio_handler(method, path, query, headers, body):
+    form = dict(urllib.parse.parse_qsl(body.decode("utf-8")))
+    return 201, {
+        "sid": f"SM{random.getrandbits(128):032x}", "status": "queued",
+        "to": form.get("To"), "from": form.get("From"), "body": form.get("Body"),
+        "date_created": datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000"),
+    }, None
+
+
+_quota = {"remaining": 1_000_000}
+
+
+def _team_id(name: str) -> int:
+    return int(hashlib.md5(name.lower().encode("utf-8")).hexdigest()[:6], 16)
+
+
+def rapidapi_handler(method, path, query, headers, body):
+    _quota["remaining"] -= 1
+    rl = {"x-ratelimit-requests-limit": 1_000_000, "x-ratelimit-requests-remaining": _quota["remaining"],
+          "x-ratelimit-requests-reset": 86400}
+    yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).replace(hour=19, minute=0, second=0, microsecond=0)
+    if path.endswith("/teams"):
+        name = query.get("search", "Équipe")
+        return 200, {"response": [{"team": {"id": _team_id(name), "name": name.title()}}]}, rl
+    if path == "/v3/fixtures":
+        tid = int(query.get("team", 1))
+        return 200, {"response": [{
+            "fixture": {"id": random.getrandbits(31), "date": yesterday.isoformat(), "status": {"short": "FT"}},
+            "league": {"id": 61, "name": "Ligue 1"},
+            "teams": {"home": {"id": tid, "name": "Domicile"}, "away": {"id": tid + 1, "name": "Extérieur"}},
+            "goals": {"home": random.randint(0, 4), "away": random.randint(0, 3)},
+        }]}, rl
+    if path == "/games":
+        tid = int(query.get("team", 1))
+        return 200, {"response": [{
+            "id": random.getrandbits(31), "date": yesterday.isoformat(), "status": {"short": "FT"},
+            "league": {"id": 2, "name": "LNB"},
+            "teams": {"home": {"id": tid, "name": "Domicile"}, "visitors": {"id": tid + 1, "name": "Extérieur"}},
+            "scores": {"home": {"total": random.randint(60, 110)}, "visitors": {"total": random.randint(60, 110)}},
+        }]}, rl
+    return 200, {"response": []}, rl
+
+
+def weather_handler(method, path, query, headers, body):
+    start = int(time.time())
+    return 200, {"daily": [{
+        "dt": start + i * 86400,
+        "temp": {"day": random.uniform(4, 24)},
+        "humidity": random.randint(40, 95),
+        "weather": [{"description": random.choice(["ciel dégagé", "pluie légère", "nuageux", "averses"])}],
+    } for i in range(8)]}, None
+
+
+def start_fakes(latency: dict, errors: dict) -> dict:
+    handlers = {"openai": openai_handler, "twilio": twilio_handler,
+                "rapidapi": rapidapi_handler, "weather": weather_handler}
+    return {name: FakeService(name, h, latency.get(name, 0.0), errors.get(name, 0.0)).start()
+            for name, h in handlers.items()}
+
+
+def point_env_to_fakes(fakes: dict):
+    """À faire avant d'importer app : les modules lisent leur configuration à l'import."""
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-loadtest",
+        "OPENAI_BASE_URL": fakes["openai"].base_url + "/v1",
+        "TWILIO_ACCOUNT_SID": "AC" + "0" * 32,
+        "TWILIO_AUTH_TOKEN": "loadtest",
+        "TWILIO_WHATSAPP_NUMBER": "whatsapp:+14155238886",
+        "TWILIO_API_BASE": fakes["twilio"].base_url,
+        "RAPIDAPI_KEY_FOOT": "loadtest",
+        "RAPIDAPI_KEY_BASKET": "loadtest",
+        "LANAI_RAPIDAPI_BASE": fakes["rapidapi"].base_url,
+        "OPENWEATHER_API_KEY": "loadtest",
+        "LANAI_OPENWEATHER_BASE": fakes["weather"].base_url,
+    })
+    os.environ.setdefault("LANAI_LOG_LEVEL", "WARNING")
+
+
+# ==== Collecte (logs du webhook, dans le thread du worker) ====
+class Collector(logging.Handler):
+    def __init__(self, current_trace):
+        super().__init__(logging.INFO)
+        self.current_trace = current_trace
+        self.lock = threading.Lock()
+        self.replies: dict = {}   # trace -> [horodatages des envois Twilio]
+        self.done: dict = {}      # trace -> {'answered_by', 'stages_ms', 'total_ms'}
+        self.errors: dict = {}    # message → nombre
+
+    def emit(self, record):
+        trace = self.current_trace()
+        with self.lock:
+            if record.levelno >= logging.ERROR:
+                key = record.msg if isinstance(record.msg, str) else str(record.msg)
+                self.errors[key] = self.errors.get(key, 0) + 1
+            elif record.msg == "réponse envoyée":
+                self.replies.setdefault(trace, []).append(record.created)
+            elif record.msg == "message traité":
+                self.done.setdefault(trace, {"answered_by": record.answered_by,
+                                             "stages_ms": record.stages_ms, "total_ms": record.total_ms})
+
+
+# ==== App locale ====
+def start_app(collector_factory):
+    import lanai_log
+    import app as lanai_app
+    from werkzeug.serving import make_server
+
+    collector = collector_factory(lanai_log.current_trace)
+    webhook_log = logging.getLogger("lanai.webhook")
+    webhook_log.setLevel(logging.INFO)
+    webhook_log.propagate = False   # les lignes INFO du webhook ne partent que dans le collecteur
+    webhook_log.addHandler(collector)
+
+    server = make_server("127.0.0.1", 0, lanai_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="app", daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(base + "/ready", timeout=5) as r:
+                boot = json.loads(r.read())
+                log.info("app prête en %s ms %s", boot.get("total_ms"), boot.get("steps"))
+                return base, collector, boot
+        except urllib.error.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("❌ app pas prête après 60 s (voir /ready)")
+
+
+# ==== Rejeu ====
+def build_schedule(rate: float, duration: float, mix: dict, users: int, dup: float, retry: float,
+                   seed: int | None) -> list:
+    """[(t_offset, sender, body, sid)] trié ; doublons = même texte renvoyé, renvois = même MessageSid."""
+    rnd = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    senders = [f"whatsapp:+3370000{i:04d}" for i in range(users)]
+    out, last_by_sender = [], {}
+    n = int(rate * duration)
+    for i in range(n):
+        t = i / rate
+        sender = rnd.choice(senders)
+        if sender in last_by_sender and rnd.random() < dup:
+            body = last_by_sender[sender]
+        else:
+            body = rnd.choice(CORPUS[rnd.choices(kinds, weights)[0]])
+        sid = f"SM{rnd.getrandbits(128):032x}"
+        out.append((t, sender, body, sid))
+        last_by_sender[sender] = body
+        if rnd.random() < retry:
+            out.append((t + rnd.uniform(1.0, 3.0), sender, body, sid))   # Twilio renvoie le même webhook
+    return sorted(out, key=lambda x: x[0])
+
+
+def post_webhook(base: str, sender: str, body: str, sid: str) -> float:
+    data = urllib.parse.urlencode({"From": sender, "Body": body, "MessageSid": sid}).encode("utf-8")
+    t0 = time.monotonic()
+    with urllib.request.urlopen(base + "/webhook", data=data, timeout=30) as r:
+        r.read()
+    return (time.monotonic() - t0) * 1000
+
+
+def replay(base: str, schedule: list, concurrency: int) -> tuple:
+    sent_at, acks, failures = {}, [], []
+    lock = threading.Lock()
+
+    def _one(sender, body, sid):
+        try:
+            ms = post_webhook(base, sender, body, sid)
+            with lock:
+                acks.append(ms)
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for offset, sender, body, sid in schedule:
+            wait = t0 + offset - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            sent_at.setdefault(sid[-12:], time.time())
+            pool.submit(_one, sender, body, sid)
+    return sent_at, acks, failures
+
+
+def wait_drain(collector: Collector, traces: set, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with collector.lock:
+            if traces <= set(collector.done):
+                return
+        time.sleep(0.2)
+
+
+# ==== Rapport ====
+def build_report(args, boot: dict, fakes: dict, schedule: list, sent_at: dict, acks: list, failures: list,
+                 collector: Collector) -> dict:
+    with collector.lock:
+        replies = {t: list(v) for t, v in collector.replies.items()}
+        done = dict(collector.done)
+        errors = dict(collector.errors)
+    reply_ms, by_kind, stages = [], {}, {}
+    for trace, t_sent in sent_at.items():
+        if replies.get(trace):
+            ms = (min(replies[trace]) - t_sent) * 1000
+            reply_ms.append(ms)
+            kind = (done.get(trace) or {}).get("answered_by", "?")
+            by_kind.setdefault(kind, []).append(ms)
+    for d in done.values():
+        for stage, ms in d["stages_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+    first = min(sent_at.values()) if sent_at else time.time()
+    last = max((max(v) for v in replies.values()), default=first)
+
+    def _pcts(values):
+        return {"n": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+                "p99": percentile(values, 99), "max": round(max(values), 1) if values else None}
+
+    return {
+        "params": {"rate": args.rate, "duration": args.duration, "users": args.users, "mix": args.mix,
+                   "dup": args.dup, "retry": args.retry, "concurrency": args.concurrency},
+        "boot": boot,
+        "webhooks_posted": len(schedule),
+        "messages": len(sent_at),
+        "replied": len(reply_ms),
+        "missing": len(sent_at) - len(reply_ms),
+        "duplicate_replies": sum(len(v) - 1 for v in replies.values() if len(v) > 1),
+        "http_failures": len(failures),
+        "throughput_rps": round(len(reply_ms) / max(last - first, 1e-6), 2),
+        "ack_ms": _pcts(acks),
+        "reply_ms": _pcts(reply_ms),
+        "reply_ms_by_kind": {k: _pcts(v) for k, v in sorted(by_kind.items())},
+        "stages_ms": {k: _pcts(v) for k, v in stages.items()},
+        "errors": errors,
+        "fakes": {name: f.stats() for name, f in fakes.items()},
+    }
+
+
+def print_report(r: dict):
+    def _row(label, p):
+        print(f"  {label:14s} n={p['n']:<6d} p50={p['p50']}  p95={p['p95']}  p99={p['p99']}  max={p['max']}")
+
+    print(f"\n=== Test de charge : {r['params']['rate']} msg/s pendant {r['params']['duration']} s ===")
+    print(f"messages {r['messages']} (webhooks {r['webhooks_posted']}), réponses {r['replied']}, "
+          f"manquantes {r['missing']}, en double {r['duplicate_replies']}, échecs HTTP {r['http_failures']}")
+    print(f"débit : {r['throughput_rps']} réponses/s — démarrage worker {r['boot'].get('total_ms')} ms")
+    print("latences (ms)")
+    _row("ack webhook", r["ack_ms"])
+    _row("réponse", r["reply_ms"])
+    for kind, p in r["reply_ms_by_kind"].items():
+        _row(f"  {kind}", p)
+    print("étapes (ms)")
+    for stage, p in r["stages_ms"].items():
+        _row(stage, p)
+    if r["errors"]:
+        print("erreurs :", ", ".join(f"{k} ×{v}" for k, v in r["errors"].items()))
+    print("faux services :", ", ".join(f"{n} {s['calls']} appels ({s['errors_injected']} erreurs)"
+                                      for n, s in r["fakes"].items()))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Test de charge du webhook Lanai (services externes simulés).")
+    p.add_argument("--rate", type=float, default=10.0, help="messages par seconde")
+    p.add_argument("--duration", type=float, default=30.0, help="durée d'envoi (s)")
+    p.add_argument("--users", type=int, default=20, help="nombre d'expéditeurs simulés")
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"répartition du corpus ({DEFAULT_MIX})")
+    p.add_argument("--dup", type=float, default=0.05, help="part de messages renvoyés à l'identique")
+    p.add_argument("--retry", type=float, default=0.02, help="part de webhooks renvoyés par Twilio (même sid)")
+    p.add_argument("--latency", default=DEFAULT_LATENCY, help=f"latence des faux services en ms ({DEFAULT_LATENCY})")
+    p.add_argument("--errors", default="", help="taux d'erreur injecté, ex : openai=0.05,twilio=0.01")
+    p.add_argument("--concurrency", type=int, default=64, help="requêtes webhook simultanées max")
+    p.add_argument("--drain", type=float, default=60.0, help="attente max des réponses après l'envoi (s)")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--json", dest="json_out", default=None, help="écrit aussi le rapport en JSON")
+    args = p.parse_args(argv)
+
+    if not os.environ.get("DATABASE_URL"):
+        sys.exit("❌ DATABASE_URL requis (Postgres local dédié au test, ex : postgresql://localhost/lanai_load)")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    fakes = start_fakes(parse_pairs(args.latency), parse_pairs(args.errors))
+    point_env_to_fakes(fakes)
+    base, collector, boot = start_app(Collector)
+
+    schedule = build_schedule(args.rate, args.duration, parse_pairs(args.mix), args.users,
+                              args.dup, args.retry, args.seed)
+    log.info("envoi de %d webhooks…", len(schedule))
+    sent_at, acks, failures = replay(base, schedule, args.concurrency)
+    wait_drain(collector, set(sent_at), args.drain)
+
+    report = build_report(args, boot, fakes, schedule, sent_at, acks, failures, collector)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# lanai_log.py — logs structurés (JSON, une ligne par événement) écrits par un thread dédié
+# - le thread qui logge ne fait que poser l'enregistrement dans une file (pas de flush, pas d'I/O)
+# - trace id par message WhatsApp (dérivé du MessageSid) ou par run de job, ajouté à chaque ligne
+# - logs verbeux (DEBUG) échantillonnés : LANAI_LOG_SAMPLE=0.1 → 1 sur 10 environ
+import os
+import sys
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get("LANAI_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LANAI_LOG_FORMAT", "json").lower()     # json | text
+DEBUG_SAMPLE = float(os.environ.get("LANAI_LOG_SAMPLE", "1.0"))      # part des DEBUG conservés
+
+_trace = contextvars.ContextVar("lanai_trace", default=None)
+_setup_lock = threading.Lock()
+_listener = None
+
+# Attributs standards d'un LogRecord : le reste (extra=...) part dans le JSON
+_STD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+
+# ==== Trace id ====
+def trace_from_sid(msg_sid: str | None) -> str:
+    """'SM0123...abcdef' → 'abcdef…' (12 derniers caractères) ; id aléatoire sans MessageSid."""
+    if msg_sid:
+        return msg_sid[-12:]
+    return f"{random.getrandbits(48):012x}"
+
+
+def current_trace() -> str | None:
+    return _trace.get()
+
+
+@contextmanager
+def trace(trace_id: str | None):
+    token = _trace.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace.reset(token)
+
+
+def bind(fn):
+    """Fonction exécutée dans un autre thread (executor, pool.map) avec le trace id courant."""
+    trace_id = _trace.get()
+
+    def run(*a, **k):
+        with trace(trace_id):
+            return fn(*a, **k)
+    return run
+
+
+# ==== Handlers ====
+class _ContextFilter(logging.Filter):
+    """Côté appelant : ajoute le trace id et échantillonne les DEBUG (avant la file)."""
+
+    def filter(self, record):
+        if record.levelno < logging.INFO and DEBUG_SAMPLE < 1.0 and random.random() >= DEBUG_SAMPLE:
+            return False
+        record.trace_id = _trace.get()
+        return True
+
+
+class _FastQueueHandler(QueueHandler):
+    """QueueHandler sans formatage dans le thread appelant (fait par le listener)."""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait(record)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "trace_id", None):
+            out["trace"] = record.trace_id
+        for k, v in record.__dict__.items():
+            if k not in _STD_ATTRS and not k.startswith("_"):
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        extra = " ".join(f"{k}={v}" for k, v in record.__dict__.items()
+                         if k not in _STD_ATTRS and not k.startswith("_"))
+        head = f"{record.levelname[0]} [{record.name}]"
+        if getattr(record, "trace_id", None):
+            head += f"[{record.trace_id}]"
+        line = f"{head} {record.getMessage()}" + (f" {extra}" if extra else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def setup():
+    """Idempotent : file + thread d'écriture sur stdout. Appelé automatiquement par get_logger()."""
+    global _listener
+    if _listener is not None:
+        return
+    with _setup_lock:
+        if _listener is not None:
+            return
+        q = queue.SimpleQueue()
+        out = logging.StreamHandler(sys.stdout)
+        out.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        listener = QueueListener(q, out, respect_handler_level=False)
+        handler = _FastQueueHandler(q)
+        handler.addFilter(_ContextFilter())
+        root = logging.getLogger("lanai")
+        root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+        root.addHandler(handler)
+        root.propagate = False
+        listener.start()
+        atexit.register(listener.stop)  # vide la file avant la sortie du process
+        _listener = listener
+
+
+def restart_after_fork():
+    """Le thread d'écriture ne survit pas à fork() : à appeler dans le process enfant."""
+    global _listener
+    with _setup_lock:
+        root = logging.getLogger("lanai")
+        for h in list(root.handlers):
+            if isinstance(h, QueueHandler):
+                root.removeHandler(h)
+        _listener = None
+    setup()
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup()
+    return logging.getLogger(f"lanai.{name}")
@@ -1,25 +1,34 @@
+# lanai_meteo.py — prévisions OpenWeather (cache partagé cron/webhook) + digest météo du soir
 import os
-import requests
-from datetime import datetime, timedelta
-from twilio.rest import Client
-from memory_store import init_schema, add_message
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from memory_store import init_schema, _get_conn
+from lanai_clients import get_session
+from lanai_broadcast import fan_out, init_subscriptions_schema
+from singleflight import group
+import lanai_log
 
-# ======== Init DB ========
-init_schema()  # crée la table si besoin
+PARIS = ZoneInfo("Europe/Paris")
+log = lanai_log.get_logger("meteo")
 
 # ======== Clés API et config depuis .env ========
 api_key = os.environ.get("OPENWEATHER_API_KEY")
-twilio_sid = os.environ.get("TWILIO_ACCOUNT_SID")
-twilio_token = os.environ.get("TWILIO_AUTH_TOKEN")
+OPENWEATHER_BASE = os.environ.get("LANAI_OPENWEATHER_BASE", "https://api.openweathermap.org").rstrip("/")
 twilio_whatsapp = os.environ.get("TWILIO_WHATSAPP_NUMBER")  # ex: whatsapp:+14155238886
-receiver_whatsapp = os.environ.get("MY_WHATSAPP_NUMBER")    # ex: whatsapp:+33XXXXXXXXX
+# Destinataires : abonnés du job 'weather' (lanai_broadcast), MY_WHATSAPP_NUMBER par défaut
 
-if not api_key:
-    raise ValueError("❌ Clé API météo manquante.")
-if not twilio_sid or not twilio_token:
-    raise ValueError("❌ Identifiants Twilio manquants.")
-if not twilio_whatsapp or not receiver_whatsapp:
-    raise ValueError("❌ Numéros WhatsApp manquants (TWILIO_WHATSAPP_NUMBER / MY_WHATSAPP_NUMBER).")
+def check_env():
+    if not api_key:
+        raise ValueError("❌ Clé API météo manquante.")
+    if not os.environ.get("TWILIO_ACCOUNT_SID") or not os.environ.get("TWILIO_AUTH_TOKEN"):
+        raise ValueError("❌ Identifiants Twilio manquants.")
+    if not twilio_whatsapp:
+        raise ValueError("❌ Numéro WhatsApp d'envoi manquant (TWILIO_WHATSAPP_NUMBER).")
 
 # ======== Coordonnées GPS ========
 villes = {
@@ -27,59 +36,283 @@ villes = {
     "Le Cannet (où Yacine vit)": {"lat": 43.5769, "lon": 7.0191},
 }
 
-# ======== Fonction météo ========
-def get_weather_tomorrow(lat, lon):
-    url = (
-        f"https://api.openweathermap.org/data/3.0/onecall"
-        f"?lat={lat}&lon={lon}&appid={api_key}&units=metric&lang=fr"
-    )
+# ======== Cache des prévisions (mémoire du process + table partagée) ========
+# Clé = lat/lon arrondis (~1 km) : le webhook relit ce que le cron a déjà récupéré.
+WEATHER_TTL = int(os.environ.get("LANAI_WEATHER_TTL", str(3 * 3600)))      # secondes
+FETCH_WORKERS = int(os.environ.get("LANAI_WEATHER_WORKERS", "4"))
+_cache_lock = threading.Lock()
+_mem_cache: dict = {}   # loc_key -> (fetched_at epoch, [jours])
+_flight = group("weather")
+
+def loc_key(lat: float, lon: float) -> str:
+    return f"{round(lat, 2):.2f},{round(lon, 2):.2f}"
+
+def init_weather_schema():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.weather_cache (
+            loc_key TEXT PRIMARY KEY,
+            lat DOUBLE PRECISION NOT NULL,
+            lon DOUBLE PRECISION NOT NULL,
+            fetched_at TIMESTAMPTZ NOT NULL,
+            daily JSONB NOT NULL
+        );
+        """)
+        conn.commit()
+
+def _db_read(key: str):
     try:
-        resp = requests.get(url, timeout=10)
+        with _get_conn() as conn, conn.cursor() as cur:
+            cur.execute("SELECT EXTRACT(EPOCH FROM fetched_at), daily FROM public.weather_cache WHERE loc_key = %s",
+                        (key,))
+            row = cur.fetchone()
+        return (float(row[0]), row[1]) if row else None
+    except Exception as e:
+        log.warning("lecture du cache impossible: %s", e)
+        return None
+
+def _upsert(cur, key: str, lat: float, lon: float, fetched_at: float, daily: list):
+    cur.execute("""
+        INSERT INTO public.weather_cache (loc_key, lat, lon, fetched_at, daily)
+        VALUES (%s, %s, %s, to_timestamp(%s), %s::jsonb)
+        ON CONFLICT (loc_key) DO UPDATE
+          SET lat = EXCLUDED.lat, lon = EXCLUDED.lon,
+              fetched_at = EXCLUDED.fetched_at, daily = EXCLUDED.daily;
+    """, (key, lat, lon, fetched_at, json.dumps(daily, ensure_ascii=False)))
+
+def _db_write(key: str, lat: float, lon: float, fetched_at: float, daily: list):
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            _upsert(cur, key, lat, lon, fetched_at, daily)
+            conn.commit()
+    except Exception as e:
+        log.warning("écriture du cache impossible: %s", e)
+
+# ======== Appel One Call ========
+def fetch_daily(lat, lon) -> list | None:
+    """Prévisions journalières (8 jours) : [{'date': 'YYYY-MM-DD' (Paris), 'temp', 'description', 'humidity'}]."""
+    url = f"{OPENWEATHER_BASE}/data/3.0/onecall"
+    params = {"lat": lat, "lon": lon, "appid": api_key, "units": "metric", "lang": "fr",
+              "exclude": "current,minutely,hourly,alerts"}
+
+    try:
+        resp = get_session().get(url, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
     except Exception as e:
-        return f"Impossible de récupérer la météo ({type(e).__name__})"
+        log.error("One Call %s,%s: %s %s", lat, lon, type(e).__name__, e)
+        return None
+
+    days = []
+    for d in data.get("daily", []):
+        try:
+            days.append({
+                "date": datetime.fromtimestamp(d["dt"], PARIS).strftime("%Y-%m-%d"),
+                "temp": round(d["temp"]["day"]),
+                "description": d["weather"][0]["description"].capitalize(),
+                "humidity": d["humidity"],
+            })
+        except (KeyError, IndexError, TypeError):
+            continue
+    return days
+
+def load_daily(lat: float, lon: float) -> list | None:
+    """Prévisions du lieu : cache mémoire → table weather_cache → API (si plus vieux que LANAI_WEATHER_TTL)."""
+    key = loc_key(lat, lon)
+    now = time.time()
+    with _cache_lock:
+        hit = _mem_cache.get(key)
+    if hit and now - hit[0] < WEATHER_TTL:
+        return hit[1]
 
-    daily = data.get("daily", [])
-    if len(daily) < 2:
-        return "Prévision de demain indisponible"
+    row = _db_read(key)
+    if row and now - row[0] < WEATHER_TTL:
+        with _cache_lock:
+            _mem_cache[key] = row
+        return row[1]
+
+    # Threads du process : un seul passe (singleflight) ; process différents : verrou Postgres
+    fetched = _flight.do(key, lambda: _fetch_shared(key, lat, lon))
+    if not fetched:
+        # API HS : une prévision périmée vaut mieux que rien
+        stale = hit or row
+        return stale[1] if stale else None
+    with _cache_lock:
+        _mem_cache[key] = fetched
+    return fetched[1]
+
+def _fetch_shared(key: str, lat: float, lon: float) -> tuple | None:
+    """
+    Appel One Call sous verrou consultatif Postgres (un par lieu) : workers gunicorn et scheduler qui
+    demandent le même lieu au même moment → le premier appelle l'API et écrit weather_cache, les
+    autres attendent le verrou puis relisent sa ligne. (fetched_at, jours) ou None.
+    """
+    days = None
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            # verrou de transaction : libéré au commit (ou à l'erreur)
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"weather:{key}",))
+            cur.execute("SELECT EXTRACT(EPOCH FROM fetched_at), daily FROM public.weather_cache WHERE loc_key = %s",
+                        (key,))
+            row = cur.fetchone()
+            if row and time.time() - float(row[0]) < WEATHER_TTL:
+                conn.commit()
+                return float(row[0]), row[1]
+            days = fetch_daily(lat, lon)
+            if not days:
+                conn.commit()
+                return None
+            now = time.time()
+            _upsert(cur, key, lat, lon, now, days)
+            conn.commit()
+            return now, days
+    except Exception as e:
+        # DB injoignable : appel direct, sans coordination entre process
+        log.warning("verrou météo indisponible: %s", e)
+    if days is None:
+        days = fetch_daily(lat, lon)
+    if not days:
+        return None
+    now = time.time()
+    _db_write(key, lat, lon, now, days)
+    return now, days
 
-    tomorrow = daily[1]
-    temp = round(tomorrow["temp"]["day"])
-    description = tomorrow["weather"][0]["description"].capitalize()
-    humidity = tomorrow["humidity"]
-    return f"{temp}°C, {description}, humidité {humidity}%"
+def prefetch(locations) -> None:
+    """Charge en parallèle les lieux [(lat, lon), ...] absents ou périmés du cache (un appel par clé)."""
+    unique = {loc_key(lat, lon): (lat, lon) for lat, lon in locations}
+    if not unique:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(unique)))) as pool:
+        list(pool.map(lanai_log.bind(lambda ll: load_daily(*ll)), unique.values()))
+
+# ======== API : prévision d'un lieu pour un jour ========
+def _resolve(location) -> tuple | None:
+    """'Loffre' (nom ou début de nom dans villes) ou (lat, lon)."""
+    if isinstance(location, (tuple, list)) and len(location) == 2:
+        return float(location[0]), float(location[1])
+    name = str(location or "").strip().lower()
+    if not name:
+        return None
+    for nom, coords in villes.items():
+        if nom.lower() == name or nom.lower().startswith(name):
+            return coords["lat"], coords["lon"]
+    return None
+
+def _day_str(day) -> str:
+    """0 = aujourd'hui, 1 = demain... ou une date (heure de Paris)."""
+    if isinstance(day, date):
+        return day.strftime("%Y-%m-%d")
+    return (datetime.now(PARIS) + timedelta(days=int(day))).strftime("%Y-%m-%d")
+
+def get_forecast(location, day=1) -> dict | None:
+    """{'date', 'temp', 'description', 'humidity'} pour le lieu et le jour, None si indisponible."""
+    coords = _resolve(location)
+    if not coords or not api_key:
+        return None
+    days = load_daily(*coords)
+    target = _day_str(day)
+    return next((d for d in days or [] if d["date"] == target), None)
+
+def format_forecast(fc: dict | None) -> str:
+    if not fc:
+        return "Prévision indisponible"
+    return f"{fc['temp']}°C, {fc['description']}, humidité {fc['humidity']}%"
+
+def get_weather_tomorrow(lat, lon):
+    return format_forecast(get_forecast((lat, lon), 1))
 
 # ======== Création du message ========
-tomorrow_date = (datetime.now() + timedelta(days=1)).strftime("%d/%m/%Y")
-message_text = f"🤲 Salam aleykum Mohamed, voici la météo de demain ({tomorrow_date}) :\n\n"
-
-for nom, coords in villes.items():
-    meteo = get_weather_tomorrow(coords["lat"], coords["lon"])
-    message_text += f"🌤 {nom} : {meteo}\n"
-
-# ======== Envoi via Twilio WhatsApp (une seule fois) ========
-client = Client(twilio_sid, twilio_token)
-try:
-    message = client.messages.create(
-        from_=twilio_whatsapp,
-        body=message_text,
-        to=receiver_whatsapp,
-    )
-    print(f"✅ Message WhatsApp envoyé : {message.sid}")
-except Exception as e:
-    print(f"[ERR][TWILIO] {e}")
-
-# ======== Log en DB (dédup jour+source+hash) ========
-try:
-    add_message(
-        user_phone=receiver_whatsapp,
-        role="assistant",
-        content=message_text,
-        msg_sid=(message.sid if 'message' in locals() and message else None),
-        direction="out",
-        source="cron_weather",
+def build_weather_body(variant: dict | None = None) -> str:
+    """Lignes météo de demain ; variant = {'villes': {nom: {'lat', 'lon'}}} (villes par défaut sinon)."""
+    cities = (variant or {}).get("villes") or villes
+    prefetch((c["lat"], c["lon"]) for c in cities.values())
+    body = ""
+    for nom, coords in cities.items():
+        body += f"🌤 {nom} : {get_weather_tomorrow(coords['lat'], coords['lon'])}\n"
+    return body
+
+def weather_greeting(prenom: str | None = "Mohamed") -> str:
+    tomorrow_date = (datetime.now(PARIS) + timedelta(days=1)).strftime("%d/%m/%Y")
+    return f"🤲 Salam aleykum{' ' + prenom if prenom else ''}, voici la météo de demain ({tomorrow_date}) :\n\n"
+
+def build_weather_message(prenom: str | None = "Mohamed") -> str:
+    return weather_greeting(prenom) + build_weather_body()
+
+# ======== Question météo (webhook) ========
+# Intention météo = demande de prévision, pas une simple mention (« il fait froid ici », « la neige »…) :
+# - « météo » / « quel temps » seuls suffisent
+# - sinon un verbe au futur propre à la météo + un moment (demain, ce week-end…)
+WEATHER_PATTERN = re.compile(r"\bm[ée]t[ée]o\b|\bquel temps\b", re.IGNORECASE)
+FORECAST_PATTERN = re.compile(
+    r"\b(va|vont)(-t-il)?\s+(faire\s+(beau|chaud|froid|doux|moche|gris|combien)|pleuvoir|neiger)\b"
+    r"|\bfera(-t-il)?\s+(beau|chaud|froid|doux|moche|gris|combien)\b|\bpleuvra\b|\bneigera\b",
+    re.IGNORECASE,
+)
+WHEN_PATTERN = re.compile(
+    r"\b(apr[èe]s[- ]?demain|demain|aujourd['’]?hui|ce soir|cette nuit|ce week-?end|cette semaine)\b",
+    re.IGNORECASE,
+)
+
+def is_weather_question(text: str) -> bool:
+    t = text or ""
+    if WEATHER_PATTERN.search(t):
+        return True
+    return bool(FORECAST_PATTERN.search(t) and WHEN_PATTERN.search(t))
+
+def _asked_day(t: str) -> int:
+    if "après-demain" in t or "apres-demain" in t or "après demain" in t or "apres demain" in t:
+        return 2
+    if "demain" in t:
+        return 1
+    return 0
+
+# Lieu nommé après une préposition (« à Lyon », « au Cannet », « sur Lille ») : majuscule exigée
+PLACE_PATTERN = re.compile(
+    r"\b(?:à|a|au|aux|sur|vers|pour|dans|de|du)\s+(?:l[ae]\s+|l['’])?([A-ZÀ-Ý][\w'’-]+)"
+)
+
+def _named_places(text: str) -> list:
+    return [m.group(1).lower() for m in PLACE_PATTERN.finditer(text or "")]
+
+def handle_weather_question(text: str) -> str | None:
+    """
+    Réponse directe depuis le cache partagé (villes citées, sinon toutes) ;
+    None → GPT prend le relais (pas de prévision, ou lieu cité qui n'est pas une de nos villes).
+    """
+    t = (text or "").lower()
+    day = _asked_day(t)
+    asked = {nom: c for nom, c in villes.items() if nom.split(" (")[0].lower() in t}
+    if not asked:
+        known = " ".join(nom.split(" (")[0].lower() for nom in villes)
+        if any(place not in known for place in _named_places(text)):
+            return None
+        asked = villes
+    prefetch((c["lat"], c["lon"]) for c in asked.values())
+    lines = []
+    for nom, coords in asked.items():
+        fc = get_forecast((coords["lat"], coords["lon"]), day)
+        if fc:
+            lines.append(f"🌤 {nom} : {format_forecast(fc)}")
+    if not lines:
+        return None
+    label = ("aujourd'hui", "demain", "après-demain")[day]
+    when = (datetime.now(PARIS) + timedelta(days=day)).strftime("%d/%m")
+    return f"Météo {label} ({when}) :\n" + "\n".join(lines)
+
+# ======== Job (cron ou scheduler) ========
+def run():
+    """Météo de demain diffusée aux abonnés du job 'weather' (un calcul par ensemble de villes, cache partagé)."""
+    check_env()
+    fan_out(
+        "weather", "cron_weather",
+        build_variant=build_weather_body,
+        render=lambda body, sub: weather_greeting(sub.get("prenom")) + body,
     )
-    print("[DB][METEO] Insert OK")
-except Exception as e:
-    print(f"[ERR][DB][METEO] {e}")
+
+
+if __name__ == "__main__":
+    # ======== Init DB ========
+    init_schema()  # crée la table si besoin
+    init_subscriptions_schema()
+    init_weather_schema()
+    run()
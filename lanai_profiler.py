@@ -0,0 +1,215 @@
+# lanai_profiler.py — profilage à la demande des tours lents du webhook (échantillonnage de pile)
+# - désactivé par défaut : turn() renvoie un contexte vide, aucun thread, aucun coût
+# - LANAI_PROFILE_SLOW_MS=5000 : chaque tour est échantillonné, seuls ceux ≥ 5 s sont gardés
+# - LANAI_PROFILE_SAMPLE=0.01  : 1 % des tours gardés quelle que soit leur durée
+# Un thread unique relève la pile des workers suivis toutes les LANAI_PROFILE_INTERVAL_MS ;
+# profils écrits dans LANAI_PROFILE_DIR (piles « folded » pour flamegraph/speedscope + résumé JSON).
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+import lanai_log
+
+SLOW_MS = float(os.environ.get("LANAI_PROFILE_SLOW_MS", "0"))        # 0 = pas de capture des tours lents
+SAMPLE = float(os.environ.get("LANAI_PROFILE_SAMPLE", "0"))          # part des tours gardés au hasard
+INTERVAL_MS = float(os.environ.get("LANAI_PROFILE_INTERVAL_MS", "10"))
+PROFILE_DIR = os.environ.get("LANAI_PROFILE_DIR", "/tmp/lanai_profiles")
+KEEP = int(os.environ.get("LANAI_PROFILE_KEEP", "50"))               # profils conservés (les plus récents)
+MAX_DEPTH = 64
+TOP = 15
+ENABLED = SLOW_MS > 0 or SAMPLE > 0
+PROFILE_ID = re.compile(r"^[\w.-]+$")
+log = lanai_log.get_logger("profiler")
+
+
+class _Null:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _Null()
+
+
+# ==== Échantillonneur (un thread par process, démarré au premier tour suivi) ====
+class _Sampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.turns: dict = {}          # ident du thread → Counter de piles
+        self.wake = threading.Event()
+        self.pid = os.getpid()
+        threading.Thread(target=self._run, name="profiler", daemon=True).start()
+
+    def add(self, ident: int, stacks: Counter):
+        with self.lock:
+            self.turns[ident] = stacks
+            self.wake.set()
+
+    def remove(self, ident: int) -> Counter:
+        """Arrête le suivi du thread → copie de ses piles (plus modifiée par l'échantillonneur)."""
+        with self.lock:
+            stacks = self.turns.pop(ident, None)
+            if not self.turns:
+                self.wake.clear()
+            return Counter(stacks) if stacks is not None else Counter()
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval)
+            # Relevé sous le verrou : remove() ne rend jamais un Counter en cours de modification
+            with self.lock:
+                if not self.turns:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self.turns.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != me:
+                        stacks[_stack(frame)] += 1
+
+
+def _stack(frame) -> tuple:
+    out = []
+    while frame is not None and len(out) < MAX_DEPTH:
+        code = frame.f_code
+        out.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return tuple(reversed(out))
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def _get_sampler() -> _Sampler:
+    """Recréé après un fork (le thread du parent n'existe pas dans l'enfant)."""
+    global _sampler, _sampler_lock
+    if _sampler is not None and _sampler.pid != os.getpid():
+        _sampler, _sampler_lock = None, threading.Lock()
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = _Sampler(INTERVAL_MS / 1000)
+    return _sampler
+
+
+# ==== Tour profilé ====
+class _Turn:
+    def __init__(self, trace_id: str | None, sampled: bool):
+        self.trace_id = trace_id or "none"
+        self.sampled = sampled
+        self.stacks = Counter()
+
+    def __enter__(self):
+        self.ident = threading.get_ident()
+        self.t0 = time.monotonic()
+        _get_sampler().add(self.ident, self.stacks)
+        return self
+
+    def __exit__(self, *exc):
+        stacks = _get_sampler().remove(self.ident)
+        total_ms = (time.monotonic() - self.t0) * 1000
+        slow = SLOW_MS > 0 and total_ms >= SLOW_MS
+        if slow or self.sampled:
+            try:
+                save(self.trace_id, stacks, total_ms, "slow" if slow else "sample")
+            except Exception as e:
+                log.warning("profil non enregistré: %s", e)
+        return False
+
+
+def turn(trace_id: str | None):
+    """Contexte à placer autour du traitement d'un message ; vide si le profilage est désactivé."""
+    if not ENABLED:
+        return _NULL
+    sampled = SAMPLE > 0 and random.random() < SAMPLE
+    if SLOW_MS <= 0 and not sampled:
+        return _NULL
+    return _Turn(trace_id, sampled)
+
+
+# ==== Stockage ====
+def summarize(stacks: Counter) -> dict:
+    """Top des fonctions : 'self' (sommet de pile) et 'cumulative' (présentes dans la pile)."""
+    self_c, cum_c = Counter(), Counter()
+    for stack, n in stacks.items():
+        if stack:
+            self_c[stack[-1]] += n
+        for fn in set(stack):
+            cum_c[fn] += n
+    return {"top_self": self_c.most_common(TOP), "top_cumulative": cum_c.most_common(TOP)}
+
+
+def save(trace_id: str, stacks: Counter, total_ms: float, reason: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    safe_trace = re.sub(r"[^\w-]", "_", trace_id)
+    profile_id = f"{now:%Y%m%dT%H%M%S}-{safe_trace}-{os.getpid()}-{random.getrandbits(16):04x}"
+    with open(os.path.join(PROFILE_DIR, profile_id + ".folded"), "w", encoding="utf-8") as f:
+        for stack, n in stacks.most_common():
+            f.write(";".join(stack) + f" {n}\n")
+    meta = {
+        "id": profile_id, "trace": trace_id, "pid": os.getpid(), "created": now.isoformat(timespec="seconds"),
+        "reason": reason, "total_ms": round(total_ms, 1), "samples": sum(stacks.values()),
+        "interval_ms": INTERVAL_MS, **summarize(stacks),
+    }
+    with open(os.path.join(PROFILE_DIR, profile_id + ".json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    log.info("profil enregistré", extra={"profile": profile_id, "reason": reason, "total_ms": meta["total_ms"]})
+    _prune()
+    return profile_id
+
+
+def _prune():
+    try:
+        metas = sorted((e for e in os.scandir(PROFILE_DIR) if e.name.endswith(".json")),
+                       key=lambda e: e.stat().st_mtime, reverse=True)
+    except FileNotFoundError:
+        return
+    for e in metas[KEEP:]:
+        base = e.path[:-len(".json")]
+        for path in (base + ".json", base + ".folded"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> list:
+    """Résumés des profils (tous les workers de la machine), du plus récent au plus ancien."""
+    out = []
+    try:
+        entries = list(os.scandir(PROFILE_DIR))
+    except FileNotFoundError:
+        return out
+    for e in entries:
+        if not e.name.endswith(".json"):
+            continue
+        try:
+            with open(e.path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        out.append({k: meta.get(k) for k in ("id", "trace", "pid", "created", "reason", "total_ms", "samples")})
+    return sorted(out, key=lambda m: m.get("created") or "", reverse=True)
+
+
+def load_profile(profile_id: str, kind: str = "folded") -> str | None:
+    """Contenu brut d'un profil ('folded' ou 'json'), None si l'id est inconnu ou invalide."""
+    if not PROFILE_ID.match(profile_id or "") or kind not in ("folded", "json"):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.{kind}"), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,37 @@
+# lanai_retention.py — partitions mensuelles de public.messages + archivage des vieux mois
+#   python lanai_retention.py            → crée les partitions à venir + archive les vieux mois (cron quotidien)
+#   python lanai_retention.py migrate    → conversion unique de la table en table partitionnée
+#   python lanai_retention.py ensure     → crée seulement les partitions à venir
+import os
+import sys
+from memory_store import init_schema, migrate_to_partitioned, ensure_partitions, archive_partitions
+import lanai_log
+
+# ======== Config via ENV ========
+RETENTION_MONTHS = int(os.environ.get("LANAI_RETENTION_MONTHS", "12"))  # mois gardés en base (+ mois courant)
+# Volume persistant où archiver (le disque de l'instance est perdu au redémarrage, alors que les
+# partitions archivées sont supprimées de la base). Sans lui : archivage sauté, rien n'est supprimé.
+ARCHIVE_DIR = os.environ.get("LANAI_ARCHIVE_DIR")
+DROP_LEGACY = os.environ.get("LANAI_DROP_LEGACY", "0") == "1"
+log = lanai_log.get_logger("retention")
+
+
+def run(command: str = "all"):
+    if command == "migrate":
+        init_schema()
+        migrate_to_partitioned(drop_legacy=DROP_LEGACY)
+        return
+    if command in ("ensure", "all"):
+        ensure_partitions()
+        log.info("partitions à venir OK")
+    if command == "all":
+        # Partitions à venir créées quand même : les insertions ne doivent pas dépendre de l'archivage
+        if not ARCHIVE_DIR:
+            log.warning("LANAI_ARCHIVE_DIR manquant : archivage sauté, aucune partition supprimée")
+            return
+        files = archive_partitions(RETENTION_MONTHS, ARCHIVE_DIR)
+        log.info("partitions archivées", extra={"count": len(files), "archive_dir": ARCHIVE_DIR})
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else "all")
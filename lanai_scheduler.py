@@ -0,0 +1,273 @@
+# lanai_scheduler.py — process unique (long-running) qui remplace les 3 crons
+#   python lanai_scheduler.py          → boucle infinie
+#   python lanai_scheduler.py --list   → affiche les jobs et leur prochain passage
+# Les scripts lanai_results.py / lanai_meteo.py / lanai_content.py restent lançables seuls.
+import os
+import sys
+import random
+import signal
+import threading
+import traceback
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor
+
+from memory_store import init_schema, _get_conn
+from lanai_broadcast import init_subscriptions_schema
+from lanai_meteo import init_weather_schema
+from content_rotation import init_rotation_schema
+from snippet_pool import init_snippets_schema
+from results_store import init_results_schema
+from rapidapi_quota import init_quota_schema
+import lanai_log
+
+PARIS = ZoneInfo("Europe/Paris")
+TICK_SECONDS = float(os.environ.get("LANAI_SCHEDULER_TICK", "20"))
+MAX_PARALLEL_JOBS = int(os.environ.get("LANAI_SCHEDULER_WORKERS", "2"))
+log = lanai_log.get_logger("sched")
+
+
+# ==== Expressions cron (5 champs, heure de Paris) ====
+class CronExpr:
+    """
+    'minute heure jour-du-mois mois jour-de-semaine' (0 = dimanche), avec *, a-b, a,b et */n.
+    Comme cron : si jour-du-mois ET jour-de-semaine sont restreints, l'un OU l'autre suffit.
+    """
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"❌ Expression cron invalide : {expr!r}")
+        self.expr = expr
+        parsed = [self._field(f, lo, hi) for f, (lo, hi) in zip(fields, self.RANGES)]
+        self.minutes, self.hours, self.days, self.months, dows = parsed
+        self.dows = {d % 7 for d in dows}  # 7 = dimanche aussi
+        self.dom_any = fields[2] == "*"
+        self.dow_any = fields[4] == "*"
+
+    @staticmethod
+    def _field(field: str, lo: int, hi: int) -> set:
+        out = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_s = part.split("/")
+                step = int(step_s)
+            if part == "*":
+                start, end = lo, hi
+            elif "-" in part:
+                a, b = part.split("-")
+                start, end = int(a), int(b)
+            else:
+                start = end = int(part)
+            if start < lo or end > hi or start > end or step < 1:
+                raise ValueError(f"❌ Champ cron hors limites : {field!r}")
+            out.update(range(start, end + 1, step))
+        return out
+
+    def matches(self, local: datetime) -> bool:
+        if local.minute not in self.minutes or local.hour not in self.hours or local.month not in self.months:
+            return False
+        dom_ok = local.day in self.days
+        dow_ok = (local.weekday() + 1) % 7 in self.dows
+        if self.dom_any or self.dow_any:
+            return dom_ok and dow_ok
+        return dom_ok or dow_ok
+
+    def next_after(self, after: datetime) -> datetime:
+        """Prochaine minute (> after) qui correspond, en heure de Paris (DST géré, pas de double passage)."""
+        t = after.astimezone(timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366)
+        while t < limit:
+            local = t.astimezone(PARIS)
+            # fold=1 : deuxième passage de la même heure murale au changement d'heure d'octobre
+            if not local.fold and self.matches(local):
+                return local
+            t += timedelta(minutes=1)
+        raise ValueError(f"❌ Aucune occurrence dans l'année pour {self.expr!r}")
+
+
+# ==== Registre des jobs ====
+class Job:
+    def __init__(self, name: str, schedule: str, func, jitter: int = 60, misfire_grace: int = 3600):
+        self.name = name
+        self.cron = CronExpr(schedule)
+        self.func = func
+        self.jitter = jitter                  # secondes aléatoires ajoutées à chaque passage
+        self.misfire_grace = misfire_grace    # retard max toléré avant d'abandonner un passage
+        self.next_run = None
+        self.offset = 0.0
+        self.running = False
+
+    def plan(self, after: datetime):
+        self.next_run = self.cron.next_after(after)
+        self.offset = random.uniform(0, self.jitter) if self.jitter else 0.0
+
+    def due_at(self) -> datetime:
+        return self.next_run + timedelta(seconds=self.offset)
+
+
+def _job_results():
+    import lanai_results
+    lanai_results.run()
+
+def _job_weather():
+    import lanai_meteo
+    lanai_meteo.run()
+
+def _job_content():
+    import lanai_content
+    lanai_content.run()
+
+def _job_snippets():
+    import snippet_pool
+    snippet_pool.refill()
+
+def _job_retention():
+    import lanai_retention
+    # Sans LANAI_ARCHIVE_DIR : partitions à venir créées, archivage sauté (avertissement)
+    lanai_retention.run("all")
+
+
+# Horaires par défaut (surcharge : LANAI_CRON_<NOM>="m h dom mon dow", ou "off" pour désactiver)
+DEFAULT_JOBS = (
+    ("results", "0 9 * * *", _job_results),
+    ("content", "30 10 * * *", _job_content),
+    ("weather", "0 19 * * *", _job_weather),
+    ("retention", "30 3 * * *", _job_retention),
+    ("snippets", "0 4 * * *", _job_snippets),     # hors pointe, avant le message du matin
+)
+
+
+def build_registry() -> list:
+    jobs = []
+    for name, schedule, func in DEFAULT_JOBS:
+        schedule = os.environ.get(f"LANAI_CRON_{name.upper()}", schedule).strip()
+        if schedule.lower() == "off":
+            continue
+        if name == "retention" and not os.environ.get("LANAI_ARCHIVE_DIR"):
+            log.warning("LANAI_ARCHIVE_DIR manquant : le job retention ne fera que créer les partitions à venir")
+        jobs.append(Job(
+            name, schedule, func,
+            jitter=int(os.environ.get("LANAI_SCHEDULER_JITTER", "60")),
+            misfire_grace=int(os.environ.get("LANAI_SCHEDULER_MISFIRE_GRACE", "3600")),
+        ))
+    return jobs
+
+
+# ==== Historique des passages en DB ====
+def init_jobs_schema():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.job_runs (
+            id SERIAL PRIMARY KEY,
+            job TEXT NOT NULL,
+            scheduled_for TIMESTAMPTZ NOT NULL,
+            started_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ,
+            status TEXT NOT NULL,
+            error TEXT
+        );
+        """)
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_job_runs_job_time
+          ON public.job_runs (job, scheduled_for);
+        """)
+        conn.commit()
+
+
+def record_run(job: str, scheduled_for: datetime, status: str,
+               started_at: datetime | None = None, finished_at: datetime | None = None,
+               error: str | None = None):
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO public.job_runs (job, scheduled_for, started_at, finished_at, status, error)
+                VALUES (%s, %s, %s, %s, %s, %s);
+            """, (job, scheduled_for, started_at, finished_at, status, error))
+            conn.commit()
+    except Exception as e:
+        log.error("run non enregistré: %s", e, extra={"job": job})
+
+
+def last_scheduled(job: str) -> datetime | None:
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT max(scheduled_for) FROM public.job_runs WHERE job = %s", (job,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+# ==== Boucle ====
+_stop = threading.Event()
+
+
+def _execute(job: Job, scheduled_for: datetime):
+    # un trace id par run : toutes les lignes du job (broadcast, RapidAPI, DB…) le portent
+    with lanai_log.trace(f"{job.name}-{scheduled_for:%Y%m%d%H%M}"):
+        started = datetime.now(timezone.utc)
+        log.info("début du job", extra={"job": job.name, "scheduled_for": scheduled_for.isoformat()})
+        status, error = "ok", None
+        try:
+            job.func()
+        except Exception as e:
+            status, error = "error", f"{e}\n{traceback.format_exc()}"[-4000:]
+            log.exception("échec du job", extra={"job": job.name})
+        finally:
+            job.running = False
+        finished = datetime.now(timezone.utc)
+        record_run(job.name, scheduled_for, status, started, finished, error)
+        log.info("fin du job", extra={"job": job.name, "status": status,
+                                      "elapsed_s": round((finished - started).total_seconds(), 1)})
+
+
+def run_forever(jobs: list):
+    init_schema()
+    init_jobs_schema()
+    init_subscriptions_schema()
+    init_weather_schema()
+    init_rotation_schema()
+    init_snippets_schema()
+    init_results_schema()
+    init_quota_schema()
+    now = datetime.now(PARIS)
+    for job in jobs:
+        # Reprise après redémarrage : on repart du dernier passage connu (le retard éventuel
+        # est traité comme un misfire ci-dessous), sinon de maintenant.
+        prev = last_scheduled(job.name)
+        job.plan(prev if prev else now)
+        log.info("job planifié", extra={"job": job.name, "cron": job.cron.expr, "next_run": job.next_run.isoformat()})
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_JOBS, thread_name_prefix="job") as pool:
+        while not _stop.is_set():
+            now = datetime.now(PARIS)
+            for job in jobs:
+                if job.running or now < job.due_at():
+                    continue
+                scheduled = job.next_run
+                late = (now - job.due_at()).total_seconds()
+                job.plan(now)  # plusieurs passages ratés → un seul rattrapage (coalescence)
+                if late > job.misfire_grace:
+                    log.warning("misfire", extra={"job": job.name, "late_min": round(late / 60)})
+                    record_run(job.name, scheduled, "misfire")
+                    continue
+                job.running = True
+                pool.submit(_execute, job, scheduled)
+            _stop.wait(TICK_SECONDS)
+
+
+def _handle_stop(signum, frame):
+    log.info("arrêt demandé (signal %s), fin des jobs en cours", signum)
+    _stop.set()
+
+
+if __name__ == "__main__":
+    registry = build_registry()
+    if "--list" in sys.argv:
+        now = datetime.now(PARIS)
+        for j in registry:
+            print(f"{j.name:10s} {j.cron.expr:15s} prochain : {j.cron.next_after(now):%Y-%m-%d %H:%M %Z}")
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+    run_forever(registry)
@@ -1,17 +1,142 @@
 # memory_store.py
+import io
 import os
+import csv
+import gzip
+import time
 import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+import lanai_log
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL manquant.")
 
+# Réplica en lecture (optionnel) : get_history / search_history / export_messages
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+REPLICA_MAX_LAG = float(os.environ.get("LANAI_REPLICA_MAX_LAG", "5"))       # secondes
+REPLICA_LAG_CHECK = float(os.environ.get("LANAI_REPLICA_LAG_CHECK", "10"))  # cache de la mesure
+log = lanai_log.get_logger("db")
+
 def _get_conn():
     # Connexion simple ; RealDictCursor utile pour les SELECT (historique)
     return psycopg2.connect(DATABASE_URL)
 
+
+# ==== Latence par endpoint (primary / replica) ====
+_stats_lock = threading.Lock()
+_stats: dict = {}
+
+@contextmanager
+def _timed(endpoint: str, op: str):
+    t0 = time.monotonic()
+    try:
+        yield
+    finally:
+        dt = time.monotonic() - t0
+        with _stats_lock:
+            e = _stats.setdefault(endpoint, {}).setdefault(op, {"count": 0, "total": 0.0, "max": 0.0})
+            e["count"] += 1
+            e["total"] += dt
+            e["max"] = max(e["max"], dt)
+
+def db_stats() -> dict:
+    """{endpoint: {op: {'count', 'avg', 'max'}}} en secondes, depuis le démarrage du process."""
+    with _stats_lock:
+        return {
+            ep: {op: {"count": e["count"],
+                      "avg": round(e["total"] / e["count"], 4) if e["count"] else 0.0,
+                      "max": round(e["max"], 4)}
+                 for op, e in ops.items()}
+            for ep, ops in _stats.items()
+        }
+
+
+# ==== Routage lecture / écriture (staleness bornée) ====
+_last_write: dict = {}      # user_phone -> time.time() de la dernière écriture faite par ce process
+_write_lock = threading.Lock()
+_pruned = {"at": 0.0}
+_lag = {"value": None, "checked": 0.0}
+# Au-delà, une écriture ne compte plus : réplica trop en retard (→ primaire) ou déjà à jour
+WRITE_HORIZON = REPLICA_MAX_LAG + 1.0
+
+def _note_write(user_phone: str | None):
+    if not user_phone:
+        return
+    now = time.time()
+    with _write_lock:
+        _last_write[user_phone] = now
+        # purge au plus une fois par horizon : une entrée par numéro actif, pas par numéro jamais vu
+        if now - _pruned["at"] > WRITE_HORIZON:
+            for phone, at in list(_last_write.items()):
+                if now - at > WRITE_HORIZON:
+                    del _last_write[phone]
+            _pruned["at"] = now
+
+def replica_lag() -> float | None:
+    """
+    Retard du réplica en secondes (mesure mise en cache), None si pas de réplica, injoignable
+    ou retard inconnu (flux WAL coupé, horodatage absent) : None = réplica inutilisable.
+    """
+    if not DATABASE_REPLICA_URL:
+        return None
+    now = time.monotonic()
+    if now - _lag["checked"] < REPLICA_LAG_CHECK:
+        return _lag["value"]
+    value = None
+    try:
+        conn = psycopg2.connect(DATABASE_REPLICA_URL, connect_timeout=3)
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT pg_is_in_recovery(),
+                           (SELECT status FROM pg_stat_wal_receiver),
+                           pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn(),
+                           EXTRACT(EPOCH FROM now() - (SELECT last_msg_receipt_time FROM pg_stat_wal_receiver)),
+                           EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                """)
+                in_recovery, status, caught_up, since_receipt, since_replay = cur.fetchone()
+        finally:
+            conn.close()
+        if not in_recovery:
+            value = 0.0                       # pas en recovery : c'est un primaire
+        elif status != "streaming":
+            log.warning("réplica : flux WAL interrompu", extra={"status": status})
+        elif caught_up:
+            # Tout le WAL reçu est rejoué : à jour à la date du dernier message du primaire
+            # (keepalive sur un primaire calme), pas à celle du dernier commit rejoué
+            value = float(since_receipt) if since_receipt is not None else None
+        else:
+            value = float(since_replay) if since_replay is not None else None
+    except Exception as e:
+        log.warning("réplica : mesure du retard impossible: %s", e)
+    _lag["value"] = value
+    _lag["checked"] = now
+    return value
+
+def _get_read_conn(user_phone: str | None = None):
+    """
+    (connexion, endpoint) pour une lecture :
+    - réplica si configuré, joignable et en retard de moins de REPLICA_MAX_LAG
+    - primaire si la personne a écrit plus récemment que le retard du réplica
+    """
+    lag = replica_lag()
+    if lag is None or lag > REPLICA_MAX_LAG:
+        return _get_conn(), "primary"
+    with _write_lock:
+        last = _last_write.get(user_phone, 0.0) if user_phone else 0.0
+    if user_phone and time.time() - last <= lag + 1.0:
+        return _get_conn(), "primary"
+    try:
+        return psycopg2.connect(DATABASE_REPLICA_URL, connect_timeout=3), "replica"
+    except Exception as e:
+        log.warning("réplica : bascule sur le primaire: %s", e)
+        return _get_conn(), "primary"
+
 def init_schema():
     """
     Idempotent : crée la table si besoin + colonnes utiles + index (si pas déjà faits).
@@ -39,24 +164,269 @@ def init_schema():
           ADD COLUMN IF NOT EXISTS created_day date
           GENERATED ALWAYS AS ((created_at AT TIME ZONE 'UTC')::date) STORED;
         """)
-        # Index non-uniques utiles (lecture)
+        # Index de lecture (remplace idx_messages_user_time et idx_messages_history) :
+        # - get_history : parcours arrière → les N derniers messages sans tri
+        # - export_messages : pagination keyset sur (user_phone, created_at, id)
+        # INCLUDE (role) seulement : 'content' dépasse parfois la taille max d'une entrée btree
+        # (~2,7 ko, digest cron_results).
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_user_time_id
+          ON public.messages (user_phone, created_at, id) INCLUDE (role);
+        """)
+        cur.execute("DROP INDEX IF EXISTS public.idx_messages_user_time;")
+        cur.execute("DROP INDEX IF EXISTS public.idx_messages_history;")
+        # Anti-répétition des crons : hashes envoyés par source sur une fenêtre (index-only scan)
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_source_time_hash
+          ON public.messages (source, created_at) INCLUDE (content_hash)
+          WHERE source IS NOT NULL;
+        """)
+
+        if _is_partitioned(cur):
+            # Table partitionnée : index uniques posés partition par partition (voir ensure_partitions)
+            ensure_partitions(cur)
+        else:
+            _create_unique_indexes(cur, "public.messages", "")
+        conn.commit()
+    init_search_schema()
+
+def _create_unique_indexes(cur, table: str, prefix: str):
+    # Index uniq : webhook (empêche 2 inserts du même MessageSid dans la même direction)
+    cur.execute(f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS {prefix}uniq_messages_msgsid_dir
+      ON {table} (msg_sid, direction)
+      WHERE msg_sid IS NOT NULL AND direction IS NOT NULL;
+    """)
+    # Index uniq : crons (empêche 2 lignes identiques le même jour pour une même source et un même
+    # destinataire ; user_phone inclus depuis la diffusion multi-abonnés)
+    cur.execute(f"""
+    CREATE UNIQUE INDEX IF NOT EXISTS {prefix}uniq_cron_user_source_hash_day
+      ON {table} (user_phone, created_day, source, content_hash)
+      WHERE source IS NOT NULL AND content_hash IS NOT NULL;
+    """)
+    cur.execute(f"DROP INDEX IF EXISTS {table.split('.')[0]}.{prefix}uniq_cron_source_hash_day;")
+
+
+# ==== Partitions mensuelles (created_at, mois UTC) ====
+# Postgres exige que la clé de partition fasse partie de tout index unique posé sur la table mère :
+# les index de dédup sont donc posés sur chaque partition. Les mois étant découpés en UTC,
+# un même created_day tombe toujours dans la même partition (dédup des crons intacte) ;
+# seul un retry Twilio à cheval sur minuit UTC en fin de mois échapperait à la dédup msg_sid.
+PARTITION_MONTHS_AHEAD = int(os.environ.get("LANAI_PARTITION_MONTHS_AHEAD", "3"))
+
+def _is_partitioned(cur) -> bool:
+    cur.execute("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = 'messages'
+    """)
+    row = cur.fetchone()
+    return bool(row) and row[0] == "p"
+
+def _month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def _add_months(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"messages_p{month.year:04d}_{month.month:02d}"
+
+def _create_partition(cur, month: date):
+    name = partition_name(month)
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS public.{name}
+      PARTITION OF public.messages
+      FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00:00+00');
+    """)
+    _create_unique_indexes(cur, f"public.{name}", f"{name}_")
+
+def ensure_partitions(cur=None, months_ahead: int = PARTITION_MONTHS_AHEAD, since: date | None = None):
+    """Crée (idempotent) les partitions du mois courant (ou de 'since') jusqu'à +months_ahead mois."""
+    if cur is None:
+        with _get_conn() as conn, conn.cursor() as c:
+            ensure_partitions(c, months_ahead, since)
+            conn.commit()
+        return
+    if not _is_partitioned(cur):
+        return
+    month = _month_start(since or datetime.now(timezone.utc).date())
+    last = _add_months(_month_start(datetime.now(timezone.utc).date()), months_ahead)
+    while month <= last:
+        _create_partition(cur, month)
+        month = _add_months(month, 1)
+
+def list_partitions(cur) -> list:
+    """[(nom, mois), ...] des partitions mensuelles existantes, du plus ancien au plus récent."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = 'public' AND p.relname = 'messages'
+    """)
+    out = []
+    for (name,) in cur.fetchall():
+        try:
+            y, m = name[len("messages_p"):].split("_")
+            out.append((name, date(int(y), int(m), 1)))
+        except ValueError:
+            continue
+    out.sort(key=lambda x: x[1])
+    return out
+
+def migrate_to_partitioned(drop_legacy: bool = False):
+    """
+    Migration unique : public.messages (table simple) → table partitionnée par mois.
+    - l'ancienne table devient public.messages_legacy (supprimée si drop_legacy)
+    - la séquence des id est conservée, les colonnes générées sont recalculées
+    À lancer hors trafic (verrou exclusif pendant la copie) : python lanai_retention.py migrate
+    """
+    with _get_conn() as conn, conn.cursor() as cur:
+        if _is_partitioned(cur):
+            log.info("messages déjà partitionnée, rien à faire")
+            return
+        cur.execute("LOCK TABLE public.messages IN ACCESS EXCLUSIVE MODE;")
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = 'messages'
+        """)
+        has_tsv = "content_tsv" in {r[0] for r in cur.fetchall()}
+        cur.execute("SELECT min(created_at) FROM public.messages;")
+        oldest = cur.fetchone()[0]
+
+        cur.execute("ALTER TABLE public.messages RENAME TO messages_legacy;")
         cur.execute("""
-        CREATE INDEX IF NOT EXISTS idx_messages_user_time
-          ON public.messages(user_phone, created_at);
+            SELECT indexname FROM pg_indexes
+            WHERE schemaname = 'public' AND tablename = 'messages_legacy'
+        """)
+        for (idx,) in cur.fetchall():
+            cur.execute(f'ALTER INDEX public."{idx}" RENAME TO "{idx}_legacy";')
+        cur.execute("ALTER SEQUENCE public.messages_id_seq OWNED BY NONE;")
+
+        tsv_col = ""
+        if has_tsv:
+            tsv_col = """,
+            content_tsv tsvector
+              GENERATED ALWAYS AS (to_tsvector('public.fr_unaccent'::regconfig, coalesce(content, ''))) STORED"""
+        cur.execute(f"""
+        CREATE TABLE public.messages (
+            id INTEGER NOT NULL DEFAULT nextval('public.messages_id_seq'),
+            user_phone TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            msg_sid TEXT,
+            direction TEXT,
+            source TEXT,
+            content_hash TEXT,
+            created_day date GENERATED ALWAYS AS ((created_at AT TIME ZONE 'UTC')::date) STORED{tsv_col},
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at);
         """)
-        # Index uniq : webhook (empêche 2 inserts du même MessageSid dans la même direction)
+        cur.execute("ALTER SEQUENCE public.messages_id_seq OWNED BY public.messages.id;")
+        ensure_partitions(cur, since=oldest.astimezone(timezone.utc).date() if oldest else None)
         cur.execute("""
-        CREATE UNIQUE INDEX IF NOT EXISTS uniq_messages_msgsid_dir
-          ON public.messages (msg_sid, direction)
-          WHERE msg_sid IS NOT NULL AND direction IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_messages_user_time_id
+          ON public.messages (user_phone, created_at, id) INCLUDE (role);
         """)
-        # Index uniq : crons (empêche 2 lignes identiques le même jour pour une même source)
+        if has_tsv:
+            cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_messages_content_tsv
+              ON public.messages USING GIN (content_tsv);
+            """)
         cur.execute("""
-        CREATE UNIQUE INDEX IF NOT EXISTS uniq_cron_source_hash_day
-          ON public.messages (created_day, source, content_hash)
-          WHERE source IS NOT NULL AND content_hash IS NOT NULL;
+            INSERT INTO public.messages
+              (id, user_phone, role, content, created_at, msg_sid, direction, source, content_hash)
+            SELECT id, user_phone, role, content, created_at, msg_sid, direction, source, content_hash
+            FROM public.messages_legacy
+            ON CONFLICT DO NOTHING;
         """)
+        copied = cur.rowcount
+        if drop_legacy:
+            cur.execute("DROP TABLE public.messages_legacy;")
         conn.commit()
+    log.info("migration en table partitionnée OK", extra={"copied": copied, "drop_legacy": drop_legacy})
+
+def archive_partitions(keep_months: int, archive_dir: str) -> list:
+    """
+    Archive puis supprime les partitions plus vieilles que keep_months (mois courant exclu) :
+    COPY → <archive_dir>/messages_pYYYY_MM.csv.gz, contrôle du nombre de lignes, DETACH + DROP.
+    Retourne la liste des fichiers écrits. archive_dir doit être un stockage durable (pas le disque de l'instance).
+    """
+    if not archive_dir:
+        raise ValueError("❌ Dossier d'archive manquant : partitions gardées en base.")
+    os.makedirs(archive_dir, exist_ok=True)
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc).date()), -keep_months)
+    written = []
+    with _get_conn() as conn, conn.cursor() as cur:
+        if not _is_partitioned(cur):
+            log.warning("archivage impossible : table non partitionnée, lancer d'abord la migration")
+            return written
+        for name, month in list_partitions(cur):
+            if month >= cutoff:
+                continue
+            path = os.path.join(archive_dir, f"{name}.csv.gz")
+            tmp = path + ".tmp"
+            with gzip.open(tmp, "wb") as f:
+                cur.copy_expert(f"COPY public.{name} TO STDOUT WITH (FORMAT csv, HEADER true)", f)
+            cur.execute(f"SELECT count(*) FROM public.{name};")
+            expected = cur.fetchone()[0]
+            with gzip.open(tmp, "rt", encoding="utf-8", newline="") as f:
+                archived = sum(1 for _ in csv.reader(f)) - 1
+            if archived != expected:
+                os.remove(tmp)
+                raise RuntimeError(f"❌ Archive {name} incomplète ({archived}/{expected} lignes)")
+            # sur disque avant le DROP : l'archive est alors la seule copie
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            cur.execute(f"ALTER TABLE public.messages DETACH PARTITION public.{name};")
+            cur.execute(f"DROP TABLE public.{name};")
+            conn.commit()
+            written.append(path)
+            log.info("partition archivée", extra={"partition": name, "path": path, "rows": expected})
+    return written
+
+def init_search_schema():
+    """
+    Recherche plein texte sur l'historique (idempotent) :
+    - config 'public.fr_unaccent' = french + unaccent (« médecin » == « medecin »)
+    - colonne générée content_tsv + index GIN
+    Séparé de init_schema : si l'extension unaccent n'est pas autorisée, le reste fonctionne.
+    NB : le premier ajout de la colonne réécrit la table (une seule fois).
+    """
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
+            cur.execute("""
+            DO $$
+            BEGIN
+              IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'fr_unaccent') THEN
+                CREATE TEXT SEARCH CONFIGURATION public.fr_unaccent (COPY = pg_catalog.french);
+                ALTER TEXT SEARCH CONFIGURATION public.fr_unaccent
+                  ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;
+              END IF;
+            END
+            $$;
+            """)
+            cur.execute("""
+            ALTER TABLE public.messages
+              ADD COLUMN IF NOT EXISTS content_tsv tsvector
+              GENERATED ALWAYS AS (to_tsvector('public.fr_unaccent'::regconfig, coalesce(content, ''))) STORED;
+            """)
+            cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_messages_content_tsv
+              ON public.messages USING GIN (content_tsv);
+            """)
+            conn.commit()
+    except Exception as e:
+        log.warning("recherche plein texte indisponible: %s", e)
+
+def compute_content_hash(content: str) -> str:
+    """Hash utilisé par les index de dédup (identique pour add_message et l'import en masse)."""
+    return hashlib.md5((content or "").encode("utf-8")).hexdigest()
 
 def add_message(user_phone: str, role: str, content: str,
                 msg_sid: str | None = None,
@@ -74,27 +444,265 @@ def add_message(user_phone: str, role: str, content: str,
     """
     if content is None:
         content = ""
-    content_hash = hashlib.md5(content.encode("utf-8")).hexdigest()
+    content_hash = compute_content_hash(content)
 
-    with _get_conn() as conn, conn.cursor() as cur:
+    with _timed("primary", "add_message"), _get_conn() as conn, conn.cursor() as cur:
         cur.execute("""
             INSERT INTO public.messages (user_phone, role, content, msg_sid, direction, source, content_hash)
             VALUES (%s, %s, %s, %s, %s, %s, %s)
             ON CONFLICT DO NOTHING;
         """, (user_phone, role, content, msg_sid, direction, source, content_hash))
         conn.commit()
+    _note_write(user_phone)
+
+def add_messages(rows: list):
+    """
+    Version lot d'add_message (un seul aller-retour) : rows = [{user_phone, role, content,
+    msg_sid, direction, source}, ...]. Même dédup (ON CONFLICT DO NOTHING). Retourne le nb inséré.
+    """
+    if not rows:
+        return 0
+    values = [
+        (r["user_phone"], r["role"], r.get("content") or "", r.get("msg_sid"), r.get("direction"),
+         r.get("source"), compute_content_hash(r.get("content") or ""))
+        for r in rows
+    ]
+    with _timed("primary", "add_messages"), _get_conn() as conn, conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO public.messages (user_phone, role, content, msg_sid, direction, source, content_hash)
+            VALUES %s
+            ON CONFLICT DO NOTHING;
+        """, values, page_size=len(values))  # une seule requête → rowcount exact
+        inserted = cur.rowcount
+        conn.commit()
+    for r in rows:
+        _note_write(r["user_phone"])
+    return inserted
+
+def recent_hashes(source: str, days: int) -> set:
+    """content_hash des messages d'une source sur les `days` derniers jours (lu sur le primaire)."""
+    with _timed("primary", "recent_hashes"), _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT content_hash
+            FROM public.messages
+            WHERE source = %s
+              AND created_at >= NOW() - make_interval(days => %s)
+              AND content_hash IS NOT NULL
+        """, (source, days))
+        return {row[0] for row in cur.fetchall()}
 
 def get_history(user_phone: str, limit: int = 20):
+    """
+    Les `limit` derniers messages de la personne, du plus ancien au plus récent.
+    1er passage borné au mois courant + mois précédent (2 partitions au plus) ;
+    le reste, s'il en manque, est lu dans les mois plus anciens.
+    """
+    since = _add_months(_month_start(datetime.now(timezone.utc).date()), -1)
     sql = """
     SELECT role, content
     FROM public.messages
     WHERE user_phone = %s
+      AND created_at {op} %s
     ORDER BY created_at DESC
     LIMIT %s
     """
-    with _get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute(sql, (user_phone, limit))
+    conn, endpoint = _get_read_conn(user_phone)
+    with _timed(endpoint, "get_history"), conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(sql.format(op=">="), (user_phone, since, limit))
         rows = cur.fetchall()
+        if len(rows) < limit:
+            # Personne peu active ces deux derniers mois : on complète avec l'historique plus ancien
+            cur.execute(sql.format(op="<"), (user_phone, since, limit - len(rows)))
+            rows += cur.fetchall()
     # Inverse pour donner du plus ancien au plus récent à GPT
     rows.reverse()
     return [{"role": r["role"], "content": r["content"]} for r in rows]
+
+
+def search_history(user_phone: str, terms: list, limit: int = 5, skip_recent: int = 0):
+    """
+    Top-k des anciens messages de la personne qui contiennent au moins un des termes
+    (OU logique, classés par ts_rank_cd puis récence). Utilise l'index GIN sur content_tsv.
+    - terms       : mots simples ; stemming + accents gérés par Postgres (fr_unaccent)
+    - skip_recent : ignore les N derniers messages (déjà envoyés à GPT via get_history)
+    Retourne [{'role', 'content', 'created_at', 'rank'}, ...] du plus pertinent au moins pertinent.
+    """
+    words = [w for w in terms if w and w.replace("_", "").isalnum()]
+    if not words:
+        return []
+    tsquery = " | ".join(words)
+    recent_filter = ""
+    params = [tsquery, user_phone]
+    if skip_recent > 0:
+        recent_filter = """
+      AND created_at < (
+        SELECT min(created_at) FROM (
+          SELECT created_at FROM public.messages
+          WHERE user_phone = %s
+          ORDER BY created_at DESC
+          LIMIT %s
+        ) recent
+      )"""
+        params += [user_phone, skip_recent]
+    sql = f"""
+    SELECT role, content, created_at, ts_rank_cd(content_tsv, q) AS rank
+    FROM public.messages, to_tsquery('public.fr_unaccent', %s) AS q
+    WHERE user_phone = %s
+      AND content_tsv @@ q{recent_filter}
+    ORDER BY rank DESC, created_at DESC
+    LIMIT %s
+    """
+    params.append(limit)
+    conn, endpoint = _get_read_conn(user_phone)
+    with _timed(endpoint, "search_history"), conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    return [dict(r) for r in rows]
+
+
+# ==== Export en flux (curseur serveur + pagination keyset) ====
+EXPORT_COLUMNS = ("id", "user_phone", "role", "content", "created_at", "direction", "source", "msg_sid")
+
+def export_messages(user_phone: str | None = None,
+                    since: datetime | None = None,
+                    until: datetime | None = None,
+                    page_size: int = 2000):
+    """
+    Générateur de lignes (dict) triées par (user_phone, created_at, id), mémoire constante :
+    - une page = un curseur serveur nommé (itersize = page_size) dans une transaction courte
+    - la page suivante reprend après la dernière clé vue (keyset, pas d'OFFSET)
+    """
+    filters = []
+    base_params = []
+    if user_phone:
+        filters.append("user_phone = %s")
+        base_params.append(user_phone)
+    if since:
+        filters.append("created_at >= %s")
+        base_params.append(since)
+    if until:
+        filters.append("created_at < %s")
+        base_params.append(until)
+
+    cols = ", ".join(EXPORT_COLUMNS)
+    last_key = None
+    page = 0
+    conn, _endpoint = _get_read_conn(user_phone)
+    with conn:
+        while True:
+            where = list(filters)
+            params = list(base_params)
+            if last_key is not None:
+                where.append("(user_phone, created_at, id) > (%s, %s, %s)")
+                params.extend(last_key)
+            sql = f"SELECT {cols} FROM public.messages"
+            if where:
+                sql += " WHERE " + " AND ".join(where)
+            sql += " ORDER BY user_phone, created_at, id LIMIT %s"
+            params.append(page_size)
+
+            page += 1
+            count = 0
+            with conn.cursor(name=f"lanai_export_{page}", cursor_factory=RealDictCursor) as cur:
+                cur.itersize = page_size
+                cur.execute(sql, params)
+                for row in cur:
+                    count += 1
+                    last_key = (row["user_phone"], row["created_at"], row["id"])
+                    yield dict(row)
+            conn.commit()  # fin de la transaction de la page (pas de snapshot long)
+            if count < page_size:
+                break
+
+
+# ==== Import en masse (COPY → table de staging → fusion ON CONFLICT DO NOTHING) ====
+IMPORT_COLUMNS = ("user_phone", "role", "content", "created_at", "msg_sid", "direction", "source", "content_hash")
+
+class _CsvRowStream:
+    """Objet « fichier » lu par COPY : génère le CSV ligne à ligne (mémoire bornée)."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf)
+        self._pending = ""
+        self.count = 0
+        self.oldest = None
+
+    def _next_chunk(self) -> str:
+        try:
+            row = next(self._rows)
+        except StopIteration:
+            return ""
+        self.count += 1
+        created_at = row["created_at"]
+        if self.oldest is None or created_at < self.oldest:
+            self.oldest = created_at
+        content = row.get("content") or ""
+        self._writer.writerow([
+            row["user_phone"], row["role"], content, created_at.isoformat(),
+            row.get("msg_sid"), row.get("direction"), row.get("source"),
+            row.get("content_hash") or compute_content_hash(content),
+        ])
+        chunk = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate(0)
+        return chunk
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._pending) < size:
+            chunk = self._next_chunk()
+            if not chunk:
+                break
+            self._pending += chunk
+        if size < 0:
+            out, self._pending = self._pending, ""
+        else:
+            out, self._pending = self._pending[:size], self._pending[size:]
+        return out
+
+    readline = read
+
+def bulk_import_messages(rows) -> dict:
+    """
+    Charge un itérable de dicts (colonnes IMPORT_COLUMNS, content_hash calculé si absent) :
+    1) COPY dans une table temporaire (une seule requête, flux CSV)
+    2) INSERT ... SELECT ... ON CONFLICT DO NOTHING → mêmes index de dédup qu'add_message
+    Retourne {'parsed', 'inserted', 'duplicates', 'seconds', 'rows_per_sec'}.
+    """
+    t0 = time.monotonic()
+    stream = _CsvRowStream(rows)
+    cols = ", ".join(IMPORT_COLUMNS)
+    with _timed("primary", "bulk_import"), _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TEMP TABLE messages_import (
+            user_phone TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL,
+            msg_sid TEXT,
+            direction TEXT,
+            source TEXT,
+            content_hash TEXT
+        ) ON COMMIT DROP;
+        """)
+        cur.copy_expert(f"COPY messages_import ({cols}) FROM STDIN WITH (FORMAT csv)", stream)
+        if stream.oldest is not None:
+            # Table partitionnée : il faut les partitions des vieux mois importés
+            ensure_partitions(cur, since=stream.oldest.astimezone(timezone.utc).date())
+        cur.execute(f"""
+            INSERT INTO public.messages ({cols})
+            SELECT {cols} FROM messages_import
+            ORDER BY created_at
+            ON CONFLICT DO NOTHING;
+        """)
+        inserted = cur.rowcount
+        conn.commit()
+    seconds = time.monotonic() - t0
+    return {
+        "parsed": stream.count,
+        "inserted": inserted,
+        "duplicates": stream.count - inserted,
+        "seconds": round(seconds, 2),
+        "rows_per_sec": round(stream.count / seconds, 1) if seconds > 0 else None,
+    }
@@ -0,0 +1,251 @@
+# model_router.py — choix du modèle / max_tokens / timeout par requête LLM
+import os
+import json
+import time
+import threading
+
+import lanai_log
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+log = lanai_log.get_logger("llm")
+
+# ==== Table de routage (surchargée par LANAI_ROUTES ou LANAI_ROUTES_FILE) ====
+# Chaque route = une suite d'essais (modèle principal puis fallbacks).
+# On s'arrête au premier essai qui répond, ou quand la deadline est dépassée.
+DEFAULT_ROUTES = {
+    # Petits messages (salam, merci, ok...) : réponse courte et rapide
+    "short": [
+        {"model": "gpt-4o-mini", "max_tokens": 120, "timeout": 8},
+        {"model": "gpt-3.5-turbo", "max_tokens": 120, "timeout": 6},
+    ],
+    # Conversation normale (1 à 3 phrases)
+    "chat": [
+        {"model": "gpt-4o-mini", "max_tokens": 300, "timeout": 15},
+        {"model": "gpt-3.5-turbo", "max_tokens": 300, "timeout": 8},
+    ],
+    # Mohamed demande clairement plus de détails
+    "long": [
+        {"model": "gpt-4o-mini", "max_tokens": 600, "timeout": 20},
+        {"model": "gpt-3.5-turbo", "max_tokens": 400, "timeout": 10},
+    ],
+    # Snippet du cron contenu (lanai_content)
+    "content": [
+        {"model": "gpt-4o-mini", "max_tokens": 150, "timeout": 20},
+        {"model": "gpt-3.5-turbo", "max_tokens": 150, "timeout": 15},
+    ],
+    # Lot de snippets pré-générés (snippet_pool, hors heures de pointe) : pas pressé, réponse longue
+    "content_batch": [
+        {"model": "gpt-4o-mini", "max_tokens": 900, "timeout": 60},
+        {"model": "gpt-3.5-turbo", "max_tokens": 900, "timeout": 45},
+    ],
+}
+
+# Un essai n'est lancé que s'il reste au moins ce temps avant la deadline
+MIN_ATTEMPT_SECONDS = float(os.environ.get("LANAI_LLM_MIN_ATTEMPT", "1.5"))
+# Au-delà de N messages d'historique, on garde de la marge sur la route courte
+LONG_HISTORY = int(os.environ.get("LANAI_LLM_LONG_HISTORY", "30"))
+
+
+def load_routes() -> dict:
+    """Routes par défaut + surcharge JSON (env LANAI_ROUTES ou fichier LANAI_ROUTES_FILE)."""
+    routes = {k: [dict(step) for step in v] for k, v in DEFAULT_ROUTES.items()}
+    raw = os.environ.get("LANAI_ROUTES")
+    path = os.environ.get("LANAI_ROUTES_FILE")
+    try:
+        if not raw and path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                raw = f.read()
+        if raw:
+            for name, steps in json.loads(raw).items():
+                if isinstance(steps, dict):
+                    steps = [steps]
+                routes[name] = [dict(s) for s in steps if s.get("model")]
+    except Exception as e:
+        log.warning("LANAI_ROUTES invalide, routes par défaut utilisées: %s", e)
+    return routes
+
+
+ROUTES = load_routes()
+
+
+# ==== Features locales (aucun appel réseau) ====
+DETAIL_HINTS = ("explique", "raconte", "détail", "detail", "pourquoi", "comment ça marche",
+                "dis m'en plus", "dis-m'en plus", "en savoir plus", "histoire")
+SHORT_HINTS = ("salam", "bonjour", "bonsoir", "merci", "ok", "d'accord", "dac",
+               "bonne nuit", "coucou", "hamdoulilah", "inchallah")
+
+
+def detect_intent(text: str) -> str:
+    """'details' | 'smalltalk' | 'chat' à partir de mots-clés simples."""
+    t = (text or "").lower().strip()
+    if any(h in t for h in DETAIL_HINTS):
+        return "details"
+    if len(t) <= 40 and any(t.startswith(h) or t == h for h in SHORT_HINTS):
+        return "smalltalk"
+    return "chat"
+
+
+def extract_features(messages: list, deadline: float | None = None) -> dict:
+    last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    return {
+        "msg_len": len(last_user),
+        "intent": detect_intent(last_user),
+        "history": sum(1 for m in messages if m.get("role") != "system"),
+        "budget": (deadline - time.monotonic()) if deadline else None,
+    }
+
+
+def choose_route(features: dict) -> str:
+    """Règles simples : intention d'abord, puis taille du message et budget restant."""
+    if features["intent"] == "details":
+        name = "long"
+    elif features["intent"] == "smalltalk" and features["history"] < LONG_HISTORY:
+        name = "short"
+    elif features["msg_len"] < 25:
+        name = "short"
+    else:
+        name = "chat"
+
+    # Budget serré : on descend d'un cran tant que le premier essai ne tient pas dans le temps restant
+    budget = features.get("budget")
+    if budget is not None:
+        for downgrade in (("long", "chat"), ("chat", "short")):
+            first = (ROUTES.get(name) or ROUTES["chat"])[0]
+            if name == downgrade[0] and budget < float(first.get("timeout", 15)):
+                name = downgrade[1]
+    return name
+
+
+# ==== Ledger par route (latence + tokens) ====
+_ledger_lock = threading.Lock()
+_ledger: dict = {}
+
+
+def _record(route: str, model: str, ok: bool, latency: float, usage=None):
+    key = f"{route}:{model}"
+    with _ledger_lock:
+        e = _ledger.setdefault(key, {
+            "calls": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+        })
+        e["calls"] += 1
+        if not ok:
+            e["errors"] += 1
+        e["latency_total"] += latency
+        e["latency_max"] = max(e["latency_max"], latency)
+        if usage:
+            e["prompt_tokens"] += _usage_field(usage, "prompt_tokens")
+            e["completion_tokens"] += _usage_field(usage, "completion_tokens")
+
+
+def _usage_field(usage, name: str) -> int:
+    # v1 : objet pydantic ; v0.28 : dict
+    if isinstance(usage, dict):
+        return int(usage.get(name) or 0)
+    return int(getattr(usage, name, 0) or 0)
+
+
+def ledger_snapshot() -> dict:
+    """Copie du ledger avec latence moyenne calculée (pour /health ou logs)."""
+    with _ledger_lock:
+        out = {}
+        for key, e in _ledger.items():
+            d = dict(e)
+            d["latency_avg"] = round(e["latency_total"] / e["calls"], 3) if e["calls"] else 0.0
+            out[key] = d
+        return out
+
+
+# ==== Appels OpenAI (v1 ou v0.28) ====
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    """Client OpenAI v1 réutilisé (évite de refaire le pool HTTP à chaque message)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+    return _client
+
+
+def warm_up():
+    """Crée le client au démarrage du worker plutôt qu'au premier message."""
+    try:
+        _get_client()
+    except ImportError:
+        pass  # SDK v0.28 : pas de client à créer
+
+
+def reset_client():
+    """Process enfant (fork) : le pool HTTP du parent n'est pas réutilisable."""
+    global _client, _client_lock
+    _client_lock = threading.Lock()
+    _client = None
+
+
+def _call(messages: list, step: dict, timeout: float, temperature: float):
+    try:
+        client = _get_client()
+    except ImportError:
+        # SDK v0.28
+        import openai
+        openai.api_key = OPENAI_API_KEY
+        resp = openai.ChatCompletion.create(
+            model=step["model"],
+            messages=messages,
+            temperature=temperature,
+            max_tokens=int(step["max_tokens"]),
+            request_timeout=timeout,
+        )
+        return resp["choices"][0]["message"]["content"].strip(), resp.get("usage")
+
+    resp = client.with_options(timeout=timeout).chat.completions.create(
+        model=step["model"],
+        messages=messages,
+        temperature=temperature,
+        max_tokens=int(step["max_tokens"]),
+    )
+    return resp.choices[0].message.content.strip(), resp.usage
+
+
+def complete(messages: list, route: str | None = None, deadline: float | None = None,
+             temperature: float = 0.7) -> str | None:
+    """
+    Exécute la chaîne de la route (choisie automatiquement si route=None).
+    - deadline : instant time.monotonic() à ne pas dépasser (réponse de bout en bout)
+    Retourne le texte, ou None si tous les essais ont échoué / plus de temps.
+    """
+    if not OPENAI_API_KEY:
+        return None
+    if route is None:
+        route = choose_route(extract_features(messages, deadline))
+    steps = ROUTES.get(route) or ROUTES["chat"]
+
+    for step in steps:
+        timeout = float(step.get("timeout", 15))
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining < MIN_ATTEMPT_SECONDS:
+                log.warning("deadline atteinte, abandon", extra={"route": route})
+                break
+            timeout = min(timeout, remaining)
+
+        t0 = time.monotonic()
+        try:
+            text, usage = _call(messages, step, timeout, temperature)
+        except Exception as e:
+            latency = time.monotonic() - t0
+            _record(route, step["model"], False, latency)
+            log.warning("échec: %s", e, extra={"route": route, "model": step["model"], "latency": round(latency, 3)})
+            continue
+
+        latency = time.monotonic() - t0
+        _record(route, step["model"], True, latency, usage)
+        log.info("réponse", extra={"route": route, "model": step["model"], "latency": round(latency, 3)})
+        if text:
+            return text
+    return None
@@ -0,0 +1,122 @@
+# profile_index.py — mini index BM25 sur les faits du profil (précalculé au chargement)
+import math
+import re
+import unicodedata
+from collections import Counter
+
+# Sections jamais indexées (consignes de Lanai, pas des faits sur la personne)
+SKIP_SECTIONS = ("Lanai",)
+
+# Faits toujours injectés : l'identité de base, quelle que soit la question
+CORE_KEYS = (
+    "Prénom",
+    "Âge",
+    "Nom de son épouse",
+    "Nom(s) et âge(s) des enfants",
+    "Particularités de santé (Parkinson, etc.)",
+    "Ton préféré",
+)
+
+# Libellés courts pour le prompt (clé JSON -> libellé), sinon la clé brute
+LABELS = {
+    "Nom de son épouse": "Épouse",
+    "Nom(s) et âge(s) des enfants": "Enfants",
+    "Petits-enfants (noms, âges, relation)": "Petits-enfants",
+    "Particularités de santé (Parkinson, etc.)": "Santé",
+    "Métier exercé": "Profession",
+    "Musique/chanteur préféré": "Musique",
+    "Film ou série préférée": "Films/séries",
+    "Plaisirs simples": "Plaisirs",
+    "Expressions fréquentes": "Expressions",
+}
+
+STOPWORDS = set("""
+a ai as au aux avec ce ces cet cette c ca d dans de des du elle en est et etre il ils
+j je l la le les leur lui m ma mais me mes moi mon n ne nos notre nous on ou par pas
+pour qu que qui s sa se ses son sur t ta te tes toi ton tu un une vos votre vous y
+quoi comment quand est-ce tres bien fait faire dit dire
+""".split())
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list:
+    """Minuscules, sans accents, sans mots vides, pluriel simple retiré (voitures -> voiture)."""
+    out = []
+    for tok in re.findall(r"[a-z0-9]+", _fold(text or "")):
+        if tok in STOPWORDS or len(tok) < 2:
+            continue
+        if len(tok) > 4 and tok[-1] in "sx":
+            tok = tok[:-1]
+        out.append(tok)
+    return out
+
+
+def profile_facts(mem: dict) -> list:
+    """[(section, clé, valeur), ...] pour toutes les sections du profil."""
+    facts = []
+    for section, entries in mem.items():
+        if section in SKIP_SECTIONS or not isinstance(entries, dict):
+            continue
+        for key, value in entries.items():
+            if value:
+                facts.append((section, key, str(value)))
+    return facts
+
+
+def fact_line(key: str, value: str) -> str:
+    return f"{LABELS.get(key, key)}: {value}"
+
+
+class ProfileIndex:
+    """BM25 (k1, b classiques) sur « section + clé + valeur » de chaque fait."""
+
+    def __init__(self, facts: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lines = [fact_line(k, v) for _, k, v in facts]
+        self.core = [fact_line(k, v) for _, k, v in facts if k in CORE_KEYS]
+        self._core_set = set(self.core)
+
+        self.doc_tf = []
+        self.doc_len = []
+        df = Counter()
+        for section, key, value in facts:
+            toks = tokenize(f"{section} {key} {value}")
+            tf = Counter(toks)
+            self.doc_tf.append(tf)
+            self.doc_len.append(len(toks))
+            df.update(tf.keys())
+        n = len(facts) or 1
+        self.avg_len = (sum(self.doc_len) / n) or 1.0
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: str) -> list:
+        q = [t for t in set(tokenize(query)) if t in self.idf]
+        out = []
+        for i, tf in enumerate(self.doc_tf):
+            s = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[i] / self.avg_len)
+            for t in q:
+                f = tf.get(t)
+                if f:
+                    s += self.idf[t] * f * (self.k1 + 1) / (f + norm)
+            if s > 0:
+                out.append((s, i))
+        out.sort(reverse=True)
+        return out
+
+    def relevant(self, query: str, k: int = 4) -> list:
+        """Lignes pertinentes pour le message (hors identité de base déjà injectée)."""
+        picked = []
+        for _, i in self.scores(query):
+            line = self.lines[i]
+            if line in self._core_set:
+                continue
+            picked.append(line)
+            if len(picked) >= k:
+                break
+        return picked
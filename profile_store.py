@@ -0,0 +1,274 @@
+# profile_store.py — profils par user_phone + cache des prompts système compilés
+import os
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from profile_index import ProfileIndex, profile_facts
+import lanai_log
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+log = lanai_log.get_logger("profile")
+
+# ==== Config via ENV ====
+# files : un JSON par personne dans LANAI_PROFILES_DIR (ex: profiles/33612345678.json)
+# db    : table public.profiles (data JSONB + version)
+PROFILE_BACKEND = os.environ.get("LANAI_PROFILE_BACKEND", "files").lower()
+PROFILES_DIR = os.environ.get("LANAI_PROFILES_DIR", os.path.join(BASE_DIR, "profiles"))
+# Profil utilisé quand le numéro n'a pas (encore) de fiche : historique mono-utilisateur
+DEFAULT_PROFILE_FILE = os.environ.get("LANAI_DEFAULT_PROFILE",
+                                      os.path.join(BASE_DIR, "memoire_mohamed_lanai.json"))
+# Backend DB : on ne revérifie la version qu'au bout de N secondes (évite un SELECT par message)
+DB_CHECK_SECONDS = float(os.environ.get("LANAI_PROFILE_CHECK_SECONDS", "30"))
+CACHE_SIZE = int(os.environ.get("LANAI_PROFILE_CACHE_SIZE", "256"))
+# Persona filtré : identité de base + N faits pertinents pour le message (0 = persona complet)
+RELEVANT_FACTS = int(os.environ.get("LANAI_PROFILE_TOPK", "4"))
+
+
+def phone_key(user_phone: str) -> str:
+    """'whatsapp:+33 6 12...' -> '33612...' (nom de fichier stable)."""
+    return re.sub(r"\D", "", user_phone or "")
+
+
+# ==== Compilation du prompt système ====
+def _line(infos: list, label: str, value):
+    if value:
+        infos.append(f"{label}: {value}")
+
+
+def build_profile_lines(mem: dict) -> list:
+    """Lignes « Label: valeur » du persona (identité, famille, goûts, communication)."""
+    ident = mem.get("Identité", {})
+    fam = mem.get("Famille", {})
+    gouts = mem.get("Goûts", {})
+    com = mem.get("Communication", {})
+
+    infos = []
+    _line(infos, "Prénom", ident.get("Prénom"))
+    _line(infos, "Âge", ident.get("Âge"))
+    epouse = fam.get("Nom de son épouse")
+    if epouse:
+        depuis = fam.get("Depuis combien de temps ensemble ?")
+        infos.append(f"Épouse: {epouse}" + (f" ({depuis})" if depuis else ""))
+    _line(infos, "Enfants", fam.get("Nom(s) et âge(s) des enfants"))
+    _line(infos, "Petits-enfants", fam.get("Petits-enfants (noms, âges, relation)"))
+    metier = ident.get("Métier exercé")
+    if metier:
+        infos.append(f"Profession: {metier} (retraité)")
+    _line(infos, "Religion", ident.get("Religion"))
+    _line(infos, "Santé", ident.get("Particularités de santé (Parkinson, etc.)"))
+    _line(infos, "Sport préféré", gouts.get("Sport préféré"))
+    _line(infos, "Plaisirs", gouts.get("Plaisirs simples"))
+    _line(infos, "Musique", gouts.get("Musique/chanteur préféré"))
+    _line(infos, "Films/séries", gouts.get("Film ou série préférée"))
+    _line(infos, "Ton préféré", com.get("Ton préféré"))
+    _line(infos, "Expressions", com.get("Expressions fréquentes"))
+    return infos
+
+
+def build_persona_rules(mem: dict) -> str:
+    """Consignes de ton de Lanai, personnalisées avec le prénom (et la section « Lanai » du profil)."""
+    ident = mem.get("Identité", {})
+    lanai = mem.get("Lanai", {})
+    prenom = ident.get("Prénom") or "ton ami"
+
+    rules = (
+        f"Tu es **Lanai**, compagnon WhatsApp de {prenom}. "
+        "Langage simple, phrases courtes, ton chaleureux, bienveillant et rassurant. "
+    )
+    clins = lanai.get("Clins d'œil")
+    if clins:
+        rules += f"Si pertinent, fais des clins d'œil à {clins}. "
+    rules += (
+        "Réponds toujours en français, de manière naturelle et douce. "
+        "Évite le jargon et les réponses trop longues. "
+        f"Tes réponses doivent faire 1 à 3 phrases maximum, sauf si {prenom} te demande clairement plus de détails. "
+        "Ne pose pas de question de relance automatiquement. "
+        "Ne termine pas systématiquement tes messages par une question. "
+        f"Tu ne poses une question QUE si {prenom} te le demande explicitement "
+        "(par exemple : 'pose-moi des questions'). "
+        "Sinon, tu réponds simplement et tu peux conclure ton message sans poser de nouvelle question. "
+    )
+    if lanai.get("Histoire"):
+        rules += (
+            f"Si {prenom} te demande qui t'a créé, comment tu es né ou quelle est ton histoire, "
+            "réponds toujours de la manière suivante, sans inventer d'autres détails et sans poser de question : "
+            f"\"{lanai['Histoire']}\""
+        )
+    return rules
+
+
+def build_system_prompt(mem: dict) -> str:
+    ident = mem.get("Identité", {})
+    full_name = " ".join(x for x in (ident.get("Prénom"), ident.get("Nom")) if x) or "la personne"
+    return (
+        f"Voici des informations personnelles sur {full_name}:\n"
+        + "\n".join(f"- {x}" for x in build_profile_lines(mem))
+        + "\n\n" + build_persona_rules(mem)
+    )
+
+
+# ==== Chargement (fichiers ou DB) ====
+def _profile_path(user_phone: str) -> str | None:
+    key = phone_key(user_phone)
+    if key:
+        path = os.path.join(PROFILES_DIR, f"{key}.json")
+        if os.path.exists(path):
+            return path
+    if DEFAULT_PROFILE_FILE and os.path.exists(DEFAULT_PROFILE_FILE):
+        return DEFAULT_PROFILE_FILE
+    return None
+
+
+def _load_file(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _file_stamp(user_phone: str):
+    """(chemin, mtime) : change dès qu'on édite ou qu'on ajoute la fiche de la personne."""
+    path = _profile_path(user_phone)
+    if not path:
+        raise FileNotFoundError(f"❌ Aucun profil pour {user_phone} (ni {DEFAULT_PROFILE_FILE})")
+    return (path, os.stat(path).st_mtime_ns)
+
+
+def init_profiles_schema():
+    """Table des profils (backend db). Idempotent."""
+    from memory_store import _get_conn
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.profiles (
+            user_phone TEXT PRIMARY KEY,
+            data JSONB NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """)
+        conn.commit()
+
+
+def _db_version(user_phone: str):
+    from memory_store import _get_conn
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT version FROM public.profiles WHERE user_phone = %s", (user_phone,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _db_load(user_phone: str) -> dict | None:
+    from memory_store import _get_conn
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT data FROM public.profiles WHERE user_phone = %s", (user_phone,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def save_profile(user_phone: str, data: dict):
+    """Crée / met à jour un profil (backend db) ; la version incrémentée invalide les caches."""
+    from memory_store import _get_conn
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO public.profiles (user_phone, data)
+            VALUES (%s, %s::jsonb)
+            ON CONFLICT (user_phone) DO UPDATE
+              SET data = EXCLUDED.data,
+                  version = public.profiles.version + 1,
+                  updated_at = NOW();
+        """, (user_phone, json.dumps(data, ensure_ascii=False)))
+        conn.commit()
+    invalidate(user_phone)
+
+
+def load_profile(user_phone: str) -> dict:
+    """Profil brut de la personne (fiche dédiée, sinon profil par défaut)."""
+    if PROFILE_BACKEND == "db":
+        data = _db_load(user_phone)
+        if data is not None:
+            return data
+        if DEFAULT_PROFILE_FILE and os.path.exists(DEFAULT_PROFILE_FILE):
+            return _load_file(DEFAULT_PROFILE_FILE)
+        raise LookupError(f"❌ Aucun profil en base pour {user_phone}")
+    return _load_file(_file_stamp(user_phone)[0])
+
+
+# ==== Cache des prompts compilés (LRU, thread-safe) ====
+_lock = threading.Lock()
+_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _current_stamp(user_phone: str, entry: dict | None) -> tuple:
+    """(stamp, vérifié) : vérifié = la version a réellement été relue en base."""
+    if PROFILE_BACKEND == "db":
+        # On réutilise la version connue tant que le délai de vérification n'est pas écoulé
+        if entry and time.monotonic() - entry["checked_at"] < DB_CHECK_SECONDS:
+            return entry["stamp"], False
+        return ("db", _db_version(user_phone)), True
+    return _file_stamp(user_phone), True
+
+
+def get_compiled(user_phone: str) -> dict:
+    """
+    Entrée de cache {'profile', 'prompt', 'rules', 'index', 'stamp', 'checked_at'} pour ce numéro.
+    Recompilée seulement si le fichier (mtime) ou la version en base a changé.
+    """
+    with _lock:
+        entry = _cache.get(user_phone)
+    stamp, checked = _current_stamp(user_phone, entry)
+
+    if entry and entry["stamp"] == stamp:
+        with _lock:
+            # Délai repoussé seulement après une vraie relecture : sinon un trafic continu
+            # ne revérifierait jamais la version en base
+            if checked:
+                entry["checked_at"] = time.monotonic()
+            _cache.move_to_end(user_phone, last=True)
+        return entry
+
+    profile = load_profile(user_phone)
+    entry = {
+        "profile": profile,
+        "prompt": build_system_prompt(profile),
+        "rules": build_persona_rules(profile),
+        "index": ProfileIndex(profile_facts(profile)),
+        "stamp": stamp,
+        "checked_at": time.monotonic(),
+    }
+    with _lock:
+        _cache[user_phone] = entry
+        _cache.move_to_end(user_phone, last=True)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    log.info("prompt compilé", extra={"user": user_phone, "chars": len(entry["prompt"])})
+    return entry
+
+
+def get_system_prompt(user_phone: str, message: str | None = None) -> str:
+    """
+    Sans message : persona complet (comme avant).
+    Avec message : identité de base + seulement les faits pertinents (BM25), prompt plus court.
+    """
+    entry = get_compiled(user_phone)
+    if not message or RELEVANT_FACTS <= 0:
+        return entry["prompt"]
+
+    index = entry["index"]
+    lines = index.core + index.relevant(message, k=RELEVANT_FACTS)
+    ident = entry["profile"].get("Identité", {})
+    full_name = " ".join(x for x in (ident.get("Prénom"), ident.get("Nom")) if x) or "la personne"
+    return (
+        f"Voici des informations personnelles sur {full_name}:\n"
+        + "\n".join(f"- {x}" for x in lines)
+        + "\n\n" + entry["rules"]
+    )
+
+
+def invalidate(user_phone: str | None = None):
+    """Vide le cache d'un numéro (ou de tout le monde)."""
+    with _lock:
+        if user_phone is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_phone, None)
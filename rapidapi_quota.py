@@ -0,0 +1,265 @@
+# rapidapi_quota.py — compteur de quota RapidAPI partagé (crons, scheduler, live, webhook)
+# Chaque appel passe par request() : lecture des en-têtes x-ratelimit-requests-*, état du quota
+# par API en DB (partagé entre process), réserve pour les jobs planifiés, compteurs par appelant.
+# Aucun accès DB sur le chemin d'un appel : état et compteurs en mémoire, synchronisés par un thread.
+import os
+import time
+import atexit
+import hashlib
+import threading
+
+from lanai_clients import get_session
+from memory_store import _get_conn
+from singleflight import group, request_key
+import lanai_log
+
+# Requêtes gardées pour les jobs planifiés : en dessous, webhook / live passent en mode cache seul
+RESERVE = int(os.environ.get("LANAI_RAPIDAPI_RESERVE", "20"))
+# Relecture de l'état partagé (écrit par les autres process) au plus toutes les N secondes
+REFRESH_SECONDS = float(os.environ.get("LANAI_RAPIDAPI_REFRESH", "30"))
+# Écriture des compteurs en DB : toutes les N secondes, ou plus tôt après N appels non écrits
+FLUSH_SECONDS = float(os.environ.get("LANAI_RAPIDAPI_FLUSH", "15"))
+FLUSH_CALLS = int(os.environ.get("LANAI_RAPIDAPI_FLUSH_CALLS", "20"))
+SCHEDULED_CALLERS = {"results"}
+# Base des URL (test de charge : faux serveur local) ; vide → https://<host RapidAPI>
+BASE_URL = os.environ.get("LANAI_RAPIDAPI_BASE", "").rstrip("/")
+log = lanai_log.get_logger("rapidapi")
+
+_lock = threading.Lock()
+_state: dict = {}   # api -> {'limit', 'remaining', 'reset_at' (epoch), 'updated' (epoch)}
+_usage: dict = {}   # (api, caller) -> {'calls', 'denied', 'errors'}
+_flight = group("rapidapi")
+
+
+def api_of(headers: dict) -> str:
+    """Identifiant de l'API (host + empreinte de la clé, jamais la clé elle-même)."""
+    host = (headers or {}).get("x-rapidapi-host", "?").split(".")[0]
+    key = (headers or {}).get("x-rapidapi-key") or ""
+    return f"{host}:{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+
+def url(host: str, path: str) -> str:
+    """'api-football-v1.p.rapidapi.com', '/v3/teams' → URL complète (LANAI_RAPIDAPI_BASE si défini)."""
+    return f"{BASE_URL or 'https://' + host}{path}"
+
+
+def init_quota_schema():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.rapidapi_quota (
+            api TEXT PRIMARY KEY,
+            quota_limit INTEGER,
+            remaining INTEGER,
+            reset_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.rapidapi_usage (
+            day DATE NOT NULL DEFAULT CURRENT_DATE,
+            api TEXT NOT NULL,
+            caller TEXT NOT NULL,
+            calls INTEGER NOT NULL DEFAULT 0,
+            denied INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, api, caller)
+        );
+        """)
+        conn.commit()
+
+
+# ==== État du quota (mémoire du process ; la DB est lue / écrite par le thread de synchronisation) ====
+def remaining(api: str) -> int | None:
+    """Requêtes restantes connues pour l'API (None = inconnu ou période de quota écoulée)."""
+    _ensure_sync()
+    with _lock:
+        st = dict(_state.get(api) or {})
+    if st.get("reset_at") and time.time() >= st["reset_at"]:
+        return None
+    return st.get("remaining")
+
+
+def allow(api: str, caller: str) -> bool:
+    rem = remaining(api)
+    if rem is None:
+        return True
+    return rem > 0 if caller in SCHEDULED_CALLERS else rem > RESERVE
+
+
+def low(headers: dict, caller: str = "webhook") -> bool:
+    """Vrai si l'appelant doit se contenter du cache (quota réservé aux jobs planifiés)."""
+    return not allow(api_of(headers), caller)
+
+
+def _count(api: str, caller: str, field: str):
+    """Compteur du process (/stats) + delta à écrire dans rapidapi_usage au prochain flush."""
+    with _lock:
+        for store in (_usage, _pending):
+            u = store.setdefault((api, caller), {"calls": 0, "denied": 0, "errors": 0})
+            u[field] += 1
+
+
+def _int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _record(api: str, resp_headers):
+    """Met à jour l'état en mémoire depuis les en-têtes x-ratelimit-requests-* (aucun accès DB)."""
+    limit = _int(resp_headers.get("x-ratelimit-requests-limit")) if resp_headers is not None else None
+    rem = _int(resp_headers.get("x-ratelimit-requests-remaining")) if resp_headers is not None else None
+    reset = _int(resp_headers.get("x-ratelimit-requests-reset")) if resp_headers is not None else None
+    reset_at = time.time() + reset if reset is not None else None
+    with _lock:
+        st = _state.setdefault(api, {"limit": None, "remaining": None, "reset_at": None, "updated": 0.0})
+        if rem is not None:
+            st.update(limit=limit, remaining=rem, reset_at=reset_at)
+        elif st.get("remaining") is not None:
+            st["remaining"] = max(0, st["remaining"] - 1)  # pas d'en-tête : estimation
+        else:
+            return
+        st["updated"] = time.time()
+        _dirty.add(api)
+        n = sum(u["calls"] for u in _pending.values())
+    if n >= FLUSH_CALLS:
+        _sync["wake"].set()
+
+
+# ==== Synchronisation avec la DB (thread du process, toutes les LANAI_RAPIDAPI_FLUSH secondes) ====
+_pending: dict = {}   # (api, caller) -> deltas pas encore écrits dans rapidapi_usage
+_dirty: set = set()   # API dont l'état a changé depuis le dernier flush
+_sync = {"pid": None, "wake": threading.Event()}
+_sync_lock = threading.Lock()
+
+
+def _ensure_sync():
+    """Démarre le thread de synchronisation du process courant (celui d'avant un fork n'existe plus)."""
+    if _sync["pid"] == os.getpid():
+        return
+    with _sync_lock:
+        if _sync["pid"] != os.getpid():
+            _sync.update(pid=os.getpid(), wake=threading.Event())
+            threading.Thread(target=_sync_loop, name="rapidapi-sync", daemon=True).start()
+
+
+def _sync_loop():
+    while True:
+        try:
+            flush()
+            _load()
+        except Exception as e:
+            log.warning("synchronisation du quota impossible: %s", e)
+        _sync["wake"].wait(min(FLUSH_SECONDS, REFRESH_SECONDS))
+        _sync["wake"].clear()
+
+
+def flush():
+    """Écrit les compteurs et l'état du quota accumulés (thread de synchro, fin des scripts cron)."""
+    with _lock:
+        usage = {key: dict(u) for key, u in _pending.items()}
+        _pending.clear()
+        states = {api: dict(_state[api]) for api in _dirty if api in _state}
+        _dirty.clear()
+    if not usage and not states:
+        return
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            for (api, caller), u in usage.items():
+                cur.execute("""
+                    INSERT INTO public.rapidapi_usage (api, caller, calls, denied, errors)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (day, api, caller) DO UPDATE
+                      SET calls = rapidapi_usage.calls + EXCLUDED.calls,
+                          denied = rapidapi_usage.denied + EXCLUDED.denied,
+                          errors = rapidapi_usage.errors + EXCLUDED.errors;
+                """, (api, caller, u["calls"], u["denied"], u["errors"]))
+            for api, st in states.items():
+                cur.execute("""
+                    INSERT INTO public.rapidapi_quota (api, quota_limit, remaining, reset_at, updated_at)
+                    VALUES (%s, %s, %s, to_timestamp(%s), to_timestamp(%s))
+                    ON CONFLICT (api) DO UPDATE
+                      SET quota_limit = COALESCE(EXCLUDED.quota_limit, rapidapi_quota.quota_limit),
+                          remaining = EXCLUDED.remaining,
+                          reset_at = COALESCE(EXCLUDED.reset_at, rapidapi_quota.reset_at),
+                          updated_at = EXCLUDED.updated_at
+                      WHERE rapidapi_quota.updated_at <= EXCLUDED.updated_at;
+                """, (api, st.get("limit"), st["remaining"], st.get("reset_at"), st["updated"]))
+            conn.commit()
+    except Exception as e:
+        # remis en attente : réécrits au prochain passage
+        with _lock:
+            for key, u in usage.items():
+                p = _pending.setdefault(key, {"calls": 0, "denied": 0, "errors": 0})
+                for field, n in u.items():
+                    p[field] += n
+            _dirty.update(api for api in states if api in _state)
+        log.warning("usage non enregistré: %s", e)
+
+
+def _load():
+    """Relit l'état écrit par les autres process ; garde le nôtre s'il est plus récent."""
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT api, quota_limit, remaining, EXTRACT(EPOCH FROM reset_at), EXTRACT(EPOCH FROM updated_at)
+            FROM public.rapidapi_quota
+        """)
+        rows = cur.fetchall()
+    with _lock:
+        for api, limit, rem, reset_at, updated in rows:
+            st = _state.setdefault(api, {"limit": None, "remaining": None, "reset_at": None, "updated": 0.0})
+            if api not in _dirty and float(updated or 0) > st["updated"]:
+                st.update(limit=limit, remaining=rem, reset_at=float(reset_at) if reset_at else None,
+                          updated=float(updated))
+
+
+# ==== Appel ====
+def request(url: str, headers: dict, params: dict, caller: str, timeout: float = 25):
+    """
+    GET RapidAPI comptabilisé → (status, json). Quota insuffisant pour cet appelant :
+    pas d'appel, (429, {'error': 'quota'}) → l'appelant se rabat sur son cache.
+    Requêtes identiques simultanées dans ce process (même host, chemin, paramètres et clé) : une seule
+    est envoyée et décomptée, les autres appelants reçoivent le même résultat. Pas de coordination entre
+    process : le webhook lit le snapshot écrit par le job des résultats (results_store) plutôt que l'API.
+    Les jobs planifiés ont leur propre clé : un refus fait au webhook (réserve) ne leur est jamais transmis.
+    """
+    key = (api_of(headers), caller in SCHEDULED_CALLERS) + request_key(url, params)
+    return _flight.do(key, lambda: _request(url, headers, params, caller, timeout))
+
+
+def _request(url: str, headers: dict, params: dict, caller: str, timeout: float):
+    api = api_of(headers)
+    if not allow(api, caller):
+        _count(api, caller, "denied")
+        log.warning("appel refusé (réserve)", extra={"caller": caller, "api": api, "remaining": remaining(api), "reserve": RESERVE})
+        return 429, {"error": "quota"}
+
+    _count(api, caller, "calls")
+    try:
+        r = get_session().get(url, headers=headers, params=params, timeout=timeout)
+    except Exception as e:
+        _count(api, caller, "errors")
+        _record(api, None)
+        return 0, {"error": str(e)}
+    _record(api, r.headers)
+    if r.status_code != 200:
+        _count(api, caller, "errors")
+    try:
+        return r.status_code, r.json()
+    except ValueError:
+        return r.status_code, {"error": "réponse non JSON"}
+
+
+# Scripts cron : les compteurs restants sont écrits à la sortie
+atexit.register(flush)
+
+
+def snapshot() -> dict:
+    """Pour /stats : quota connu par API + compteurs par appelant depuis le démarrage du process."""
+    with _lock:
+        quota = {api: {"limit": st.get("limit"), "remaining": st.get("remaining"),
+                       "reset_in": round(st["reset_at"] - time.time()) if st.get("reset_at") else None}
+                 for api, st in _state.items()}
+        usage = {f"{api}/{caller}": dict(u) for (api, caller), u in _usage.items()}
+    return {"reserve": RESERVE, "quota": quota, "usage": usage}
@@ -0,0 +1,148 @@
+# results_store.py — snapshot normalisé des matchs terminés (écrit par lanai_results, lu par sports_query)
+# Une ligne par match (foot / basket) ; les questions « qu'a fait le PSG hier ? » sont servies
+# depuis cette table, l'API RapidAPI n'est appelée qu'en cas d'absence.
+import os
+import unicodedata
+from datetime import date
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+from memory_store import _get_conn
+import lanai_log
+
+KEEP_DAYS = int(os.environ.get("LANAI_RESULTS_KEEP_DAYS", "30"))
+log = lanai_log.get_logger("results")
+
+SNAPSHOT_COLUMNS = (
+    "sport", "fixture_id", "match_date", "league_id", "league_name",
+    "home_id", "home_name", "away_id", "away_name", "home_score", "away_score", "status",
+)
+
+
+def init_results_schema():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.match_results (
+            sport TEXT NOT NULL,               -- 'football' | 'basketball'
+            fixture_id BIGINT NOT NULL,
+            match_date DATE NOT NULL,          -- jour du match (Europe/Paris)
+            league_id BIGINT,
+            league_name TEXT,
+            home_id BIGINT,
+            home_name TEXT NOT NULL,
+            away_id BIGINT,
+            away_name TEXT NOT NULL,
+            home_score INTEGER,
+            away_score INTEGER,
+            status TEXT,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (sport, fixture_id)
+        );
+        """)
+        # Recherche par équipe (id connu) ou par période (nom comparé côté Python sur peu de lignes)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_match_results_home ON public.match_results (home_id, match_date);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_match_results_away ON public.match_results (away_id, match_date);")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_match_results_date ON public.match_results (match_date);")
+        # Noms tapés par l'utilisateur déjà résolus via l'API ('psg' → 85 / Paris Saint Germain)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.team_aliases (
+            alias TEXT NOT NULL,
+            sport TEXT NOT NULL,
+            team_id BIGINT NOT NULL,
+            team_name TEXT NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (alias, sport)
+        );
+        """)
+        conn.commit()
+
+
+def fold(text: str) -> str:
+    """'Paris Saint-Germain' → 'paris saint germain' (minuscules, sans accents ni tirets)."""
+    t = unicodedata.normalize("NFKD", text or "")
+    t = "".join(c for c in t if not unicodedata.combining(c)).lower()
+    return " ".join(t.replace("-", " ").replace("'", " ").split())
+
+
+# ==== Écriture (job des résultats) ====
+def save_results(matches: list) -> int:
+    """Upsert des matchs normalisés (dicts avec SNAPSHOT_COLUMNS) + purge au-delà de LANAI_RESULTS_KEEP_DAYS."""
+    rows = {(m["sport"], m["fixture_id"]): tuple(m.get(c) for c in SNAPSHOT_COLUMNS)
+            for m in matches if m.get("fixture_id") is not None}
+    with _get_conn() as conn, conn.cursor() as cur:
+        if rows:
+            execute_values(cur, f"""
+                INSERT INTO public.match_results ({", ".join(SNAPSHOT_COLUMNS)})
+                VALUES %s
+                ON CONFLICT (sport, fixture_id) DO UPDATE SET
+                  home_score = EXCLUDED.home_score, away_score = EXCLUDED.away_score,
+                  status = EXCLUDED.status, fetched_at = NOW();
+            """, list(rows.values()), page_size=len(rows))
+        cur.execute("DELETE FROM public.match_results WHERE match_date < CURRENT_DATE - %s;", (KEEP_DAYS,))
+        conn.commit()
+    return len(rows)
+
+
+# ==== Alias d'équipes ====
+def remember_alias(alias: str, sport: str, team_id: int, team_name: str):
+    try:
+        with _get_conn() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO public.team_aliases (alias, sport, team_id, team_name)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (alias, sport) DO UPDATE
+                  SET team_id = EXCLUDED.team_id, team_name = EXCLUDED.team_name, updated_at = NOW();
+            """, (fold(alias), sport, team_id, team_name))
+            conn.commit()
+    except Exception as e:
+        log.warning("alias non enregistré: %s", e)
+
+
+def lookup_alias(alias: str, sport: str) -> dict | None:
+    with _get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT team_id AS id, team_name AS name FROM public.team_aliases WHERE alias = %s AND sport = %s",
+                    (fold(alias), sport))
+        return cur.fetchone()
+
+
+# ==== Lecture (webhook) ====
+def find_team_result(team_query: str, start: date, end: date, sport: str | None = None,
+                     team_id: int | None = None) -> dict | None:
+    """
+    Dernier match terminé de l'équipe entre start et end (inclus), None si absent du snapshot.
+    - team_id connu → index (home_id|away_id, match_date)
+    - sinon : matchs de la période (index match_date), nom comparé sans accents
+    Le dict retourné porte aussi 'team_name' (nom officiel de l'équipe demandée).
+    """
+    with _get_conn() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        if team_id is not None:
+            cur.execute("""
+                SELECT * FROM public.match_results
+                WHERE (home_id = %(id)s OR away_id = %(id)s)
+                  AND match_date BETWEEN %(start)s AND %(end)s
+                  AND (%(sport)s IS NULL OR sport = %(sport)s)
+                ORDER BY match_date DESC
+                LIMIT 1
+            """, {"id": team_id, "start": start, "end": end, "sport": sport})
+            row = cur.fetchone()
+            if row:
+                row["team_name"] = row["home_name"] if row["home_id"] == team_id else row["away_name"]
+            return row
+
+        cur.execute("""
+            SELECT * FROM public.match_results
+            WHERE match_date BETWEEN %s AND %s
+            ORDER BY match_date DESC
+        """, (start, end))
+        rows = cur.fetchall()
+
+    q = fold(team_query)
+    if not q:
+        return None
+    for row in rows:
+        for side in ("home_name", "away_name"):
+            # mots entiers : 'om' ne doit pas trouver 'Roma'
+            if f" {q} " in f" {fold(row[side])} ":
+                row["team_name"] = row[side]
+                return row
+    return None
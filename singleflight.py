@@ -0,0 +1,77 @@
+# singleflight.py — regroupement des requêtes identiques en vol (sport, météo)
+# Le premier appelant fait la requête ; ceux qui arrivent pendant qu'elle est en cours attendent
+# et reçoivent le même résultat (déjà décodé : à lire, pas à modifier).
+# Portée : un seul process (threads d'un worker gunicorn, du scheduler…). Entre process, la météo
+# est coordonnée par un verrou Postgres (lanai_meteo._fetch_shared) ; le sport ne l'est pas.
+import threading
+from urllib.parse import urlsplit, parse_qsl
+
+_groups_lock = threading.Lock()
+_groups: dict = {}
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict = {}
+        self.executed = 0   # requêtes réellement envoyées
+        self.saved = 0      # appels servis par une requête déjà en vol
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.saved += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"executed": self.executed, "saved": self.saved, "in_flight": len(self._calls)}
+
+
+def group(name: str) -> SingleFlight:
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def request_key(url: str, params: dict | None = None) -> tuple:
+    """(host, chemin, paramètres triés) — ceux de l'URL et ceux passés à part confondus."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + [(k, str(v)) for k, v in (params or {}).items()]
+    return parts.netloc, parts.path, tuple(sorted(query))
+
+
+def stats() -> dict:
+    with _groups_lock:
+        groups = list(_groups.values())
+    return {g.name: g.stats() for g in groups}
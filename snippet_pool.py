@@ -0,0 +1,177 @@
+# snippet_pool.py — réserve de snippets GPT pré-générés pour le message du jour (lanai_content)
+# Remplie hors heures de pointe (job 'snippets' du scheduler) : une requête par thème qui renvoie
+# plusieurs snippets ; le cron du matin n'a plus qu'à en prendre un (un UPDATE ... RETURNING).
+import os
+import re
+import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import execute_values
+
+import model_router
+from memory_store import _get_conn, compute_content_hash
+import lanai_log
+
+POOL_MIN = int(os.environ.get("LANAI_SNIPPET_POOL_MIN", "8"))    # en dessous : on régénère
+BATCH_SIZE = int(os.environ.get("LANAI_SNIPPET_BATCH", "5"))     # snippets par thème et par requête
+KEEP_DAYS = int(os.environ.get("LANAI_HISTORY_DAYS", "60"))      # snippets utilisés gardés (dédup)
+log = lanai_log.get_logger("snippets")
+
+# La réserve est commune à tous les abonnés du job 'content' : aucun détail personnel (prénom, proches,
+# animaux) dans ce qui est généré ; la salutation avec le prénom est ajoutée à l'envoi (lanai_content).
+SYSTEM_PROMPT = (
+    "Tu es Lanai, compagnon WhatsApp bienveillant. "
+    "Langage simple, phrases courtes, ton chaleureux, bienveillant. "
+    "Le même message est envoyé à plusieurs personnes : aucun prénom, aucun proche, aucun animal. "
+    "2 à 3 phrases max."
+)
+THEMES = [
+    "encouragement doux + mini question",
+    "prise de nouvelles + question sur sa journée",
+    "mot positif + petite suggestion (respiration, marche)",
+    "check-in basket (as-tu regardé les scores?) + phrase motivante",
+]
+# Snippets générés avec un autre prompt (ancienne version personnelle comprise) : jamais servis, purgés
+PROMPT_VERSION = hashlib.sha1((SYSTEM_PROMPT + "\n".join(THEMES)).encode("utf-8")).hexdigest()[:12]
+
+GREETING_RE = re.compile(r"^\s*salam aleykum[^,\n]*,?\s*", re.IGNORECASE)
+NUMBERING_RE = re.compile(r"^\s*(\d+[.)]|[-•*])\s*")
+
+
+def init_snippets_schema():
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS public.content_snippets (
+            id SERIAL PRIMARY KEY,
+            theme TEXT NOT NULL,
+            text TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            used_at TIMESTAMPTZ
+        );
+        """)
+        # Dédup : un snippet déjà en réserve ou envoyé (gardé KEEP_DAYS jours) n'est pas réinséré
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uniq_content_snippets_hash
+          ON public.content_snippets (content_hash);
+        """)
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_content_snippets_ready
+          ON public.content_snippets (id) WHERE used_at IS NULL;
+        """)
+        cur.execute("ALTER TABLE public.content_snippets ADD COLUMN IF NOT EXISTS prompt_version TEXT;")
+        conn.commit()
+
+
+# ==== Génération par lot ====
+def parse_batch(raw: str | None) -> list:
+    """Réponse du modèle → liste de snippets (JSON attendu, listes numérotées tolérées), sans salutation."""
+    if not raw:
+        return []
+    items = None
+    cleaned = raw.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    try:
+        data = json.loads(cleaned)
+        items = data.get("snippets") if isinstance(data, dict) else data
+    except ValueError:
+        pass
+    if not isinstance(items, list):
+        items = [NUMBERING_RE.sub("", block) for block in re.split(r"\n\s*\n|\n(?=\s*(?:\d+[.)]|[-•*])\s)", raw)]
+    out = []
+    for it in items:
+        text = GREETING_RE.sub("", str(it)).strip().strip('"').strip()
+        if len(text) >= 20:
+            out.append(text)
+    return out
+
+
+def generate_batch(theme: str, n: int = BATCH_SIZE) -> list:
+    user_prompt = (
+        f"Écris {n} messages différents pour le thème : {theme}. "
+        "Sans salutation au début (elle est ajoutée à part). Évite le jargon. Pas d'emojis. "
+        'Réponds uniquement en JSON : {"snippets": ["...", "..."]}'
+    )
+    raw = model_router.complete(
+        [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ],
+        route="content_batch",
+        temperature=0.9,
+    )
+    return parse_batch(raw)
+
+
+# ==== Réserve en DB ====
+def add_snippets(theme: str, texts: list) -> int:
+    values = {compute_content_hash(t): (theme, t, compute_content_hash(t), PROMPT_VERSION) for t in texts}
+    if not values:
+        return 0
+    with _get_conn() as conn, conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO public.content_snippets (theme, text, content_hash, prompt_version)
+            VALUES %s
+            ON CONFLICT (content_hash) DO NOTHING;
+        """, list(values.values()), page_size=len(values))
+        inserted = cur.rowcount
+        conn.commit()
+    return inserted
+
+
+def pool_size() -> int:
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM public.content_snippets WHERE used_at IS NULL AND prompt_version = %s",
+                    (PROMPT_VERSION,))
+        return cur.fetchone()[0]
+
+
+def pop_snippet() -> str | None:
+    """Prend un snippet prêt au hasard (SKIP LOCKED : sûr si deux runs se chevauchent)."""
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE public.content_snippets SET used_at = NOW()
+            WHERE id = (
+                SELECT id FROM public.content_snippets
+                WHERE used_at IS NULL AND prompt_version = %s
+                ORDER BY random()
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING text;
+        """, (PROMPT_VERSION,))
+        row = cur.fetchone()
+        conn.commit()
+    return row[0] if row else None
+
+
+def purge_used(days: int = KEEP_DAYS) -> int:
+    with _get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM public.content_snippets
+            WHERE (used_at IS NOT NULL AND used_at < NOW() - make_interval(days => %s))
+               OR (used_at IS NULL AND prompt_version IS DISTINCT FROM %s);
+        """, (days, PROMPT_VERSION))
+        deleted = cur.rowcount
+        conn.commit()
+    return deleted
+
+
+def refill(min_ready: int = POOL_MIN, batch: int = BATCH_SIZE, force: bool = False) -> int:
+    """Si la réserve est basse : un lot par thème (requêtes en parallèle). Retourne le nb ajouté."""
+    ready = pool_size()
+    if ready >= min_ready and not force:
+        log.info("réserve OK", extra={"ready": ready})
+        return 0
+    with ThreadPoolExecutor(max_workers=len(THEMES)) as pool:
+        batches = list(pool.map(lanai_log.bind(lambda th: (th, generate_batch(th, batch))), THEMES))
+    added = sum(add_snippets(theme, texts) for theme, texts in batches)
+    purged = purge_used()
+    log.info("réserve rechargée", extra={"added": added, "ready_before": ready, "purged": purged})
+    return added
+
+
+if __name__ == "__main__":
+    init_snippets_schema()
+    refill(force="--force" in sys.argv)
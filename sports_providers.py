@@ -0,0 +1,346 @@
+# sports_providers.py — fournisseurs de résultats sportifs derrière une interface commune
+# Un fournisseur = une API (hôte, clé, chemins, parseur) : recherche d'équipe, matchs d'une équipe
+# sur une période, matchs d'une ligue un jour donné, normalisation en fixtures.Match.
+# Le registre interroge les fournisseurs en parallèle (délai propre à chacun, cache mémoire) ;
+# ajouter un sport (rugby, hand, tennis…) = une sous-classe de Provider + registry.register().
+import os
+import time
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import date, datetime
+
+import rapidapi_quota
+import lanai_log
+from fixtures import parse_football, parse_basketball
+from results_store import fold
+
+PROVIDER_TIMEOUT = float(os.environ.get("LANAI_PROVIDER_TIMEOUT", "15"))         # s, question du webhook
+DIGEST_TIMEOUT = float(os.environ.get("LANAI_PROVIDER_DIGEST_TIMEOUT", "300"))   # s, récap quotidien
+CACHE_TTL = int(os.environ.get("LANAI_PROVIDER_CACHE_TTL", "600"))               # matchs (équipe / ligue)
+TEAM_TTL = int(os.environ.get("LANAI_PROVIDER_TEAM_TTL", str(24 * 3600)))        # recherche d'équipe
+CACHE_SIZE = int(os.environ.get("LANAI_PROVIDER_CACHE_SIZE", "512"))             # entrées par process
+LEAGUES_TTL = int(os.environ.get("LANAI_BASKET_LEAGUES_TTL", str(24 * 3600)))    # ligues résolues via l'API
+FANOUT_WORKERS = int(os.environ.get("LANAI_PROVIDER_WORKERS", "8"))
+log = lanai_log.get_logger("providers")
+
+
+# ==== Cache mémoire (par process, LRU borné à LANAI_PROVIDER_CACHE_SIZE entrées) ====
+_cache_lock = threading.Lock()
+_cache: OrderedDict = OrderedDict()   # clé -> (expire à, valeur), du moins au plus récemment utilisé
+
+
+def cached(key, ttl: float, fn):
+    """Valeur en cache si encore fraîche, sinon fn() ; None (erreur API) n'est jamais mis en cache."""
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            _cache.move_to_end(key)
+            return hit[1]
+        if hit:
+            del _cache[key]
+    value = fn()
+    if value is not None:
+        with _cache_lock:
+            _cache[key] = (now + ttl, value)
+            _cache.move_to_end(key)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return value
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+# ==== Interface ====
+class Provider(ABC):
+    """
+    Fournisseur RapidAPI. Une sous-classe fixe sport, hôte, variable de clé, chemins et parse() ;
+    leagues() / league_params() décrivent les ligues du récap quotidien.
+    """
+    sport = ""
+    key_env = ""
+    host_env = ""
+    default_host = ""
+    teams_path = ""
+    fixtures_path = ""
+    variant_key = ""          # clé des variantes d'abonnés du récap ({'foot': [ids]}…)
+    select_by = "id"          # champ de la ligue comparé à la variante ('id' ou 'nom')
+    section = ("•", "")       # (emoji, titre) de la section du récap
+    section_rank = 0          # ordre des sections dans le récap
+    timeout = PROVIDER_TIMEOUT
+
+    def __init__(self):
+        self.key = os.environ.get(self.key_env)
+        self.host = os.environ.get(self.host_env, self.default_host) if self.host_env else self.default_host
+        self.headers = {"x-rapidapi-key": self.key, "x-rapidapi-host": self.host}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.sport})"
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.key)
+
+    def low(self, caller: str = "webhook") -> bool:
+        """Quota réservé aux jobs planifiés : l'appelant se contente du snapshot."""
+        return rapidapi_quota.low(self.headers, caller)
+
+    def url(self, path: str) -> str:
+        return rapidapi_quota.url(self.host, path)
+
+    def get(self, path: str, params: dict, caller: str) -> dict | None:
+        """GET comptabilisé (rapidapi_quota) → corps JSON, None si erreur / quota."""
+        timeout = 25 if caller in rapidapi_quota.SCHEDULED_CALLERS else 10
+        status, data = rapidapi_quota.request(self.url(path), self.headers, params, caller, timeout=timeout)
+        if status != 200 or not isinstance(data, dict):
+            return None
+        return data
+
+    @abstractmethod
+    def parse(self, response: list) -> list:
+        """Items 'response' de l'API → [fixtures.Match]."""
+
+    # ---- Équipes ----
+    def search_team(self, query: str, caller: str = "webhook") -> dict | None:
+        """Nom ou acronyme → {'id', 'name'} (premier résultat de l'API), None si inconnu."""
+        if not self.configured or not query:
+            return None
+
+        def fetch():
+            data = self.get(self.teams_path, {"search": query}, caller)
+            if data is None:
+                return None
+            resp = data.get("response") or []
+            if not resp:
+                return {}
+            team = resp[0].get("team") or resp[0]
+            return {"id": team.get("id"), "name": team.get("name", query)}
+
+        return cached((self.sport, "team", fold(query)), TEAM_TTL, fetch) or None
+
+    def team_fixtures(self, team_id: int, start: date, end: date, caller: str = "webhook") -> list | None:
+        """Matchs de l'équipe entre start et end (inclus), normalisés ; None si l'API n'a pas répondu."""
+        if not self.configured:
+            return None
+        params = {"team": team_id, "from": start.isoformat(), "to": end.isoformat()}
+
+        def fetch():
+            data = self.get(self.fixtures_path, params, caller)
+            return None if data is None else self.parse(data.get("response"))
+
+        return cached((self.sport, "team_fixtures", team_id, params["from"], params["to"]), CACHE_TTL, fetch)
+
+    # ---- Ligues (récap) ----
+    def leagues(self, date_iso: str) -> list:
+        """[{'id', 'nom', 'emoji'?, …}] suivies par le récap."""
+        return []
+
+    def league_params(self, league: dict, date_iso: str) -> dict:
+        return {"date": date_iso, "league": league["id"]}
+
+    def league_fixtures(self, league: dict, date_iso: str, caller: str = "results") -> list | None:
+        """Matchs de la ligue le jour date_iso, normalisés ; None si l'API n'a pas répondu."""
+        if not self.configured:
+            return None
+
+        def fetch():
+            data = self.get(self.fixtures_path, self.league_params(league, date_iso), caller)
+            return None if data is None else self.parse(data.get("response"))
+
+        return cached((self.sport, "league_fixtures", league["id"], date_iso), CACHE_TTL, fetch)
+
+
+# ==== Football (API-Football) ====
+def season_football(date_iso_str: str) -> int:
+    d = datetime.strptime(date_iso_str, "%Y-%m-%d")
+    return d.year if d.month >= 7 else d.year - 1  # ex: 2025 pour 2025/26
+
+
+class FootballProvider(Provider):
+    sport = "football"
+    key_env = "RAPIDAPI_KEY_FOOT"
+    host_env = "RAPIDAPI_FOOT_HOST"
+    default_host = "api-football-v1.p.rapidapi.com"
+    teams_path = "/v3/teams"
+    fixtures_path = "/v3/fixtures"
+    variant_key = "foot"
+    section = ("⚽", "Football européen")
+    section_rank = 20
+
+    # IDs API-FOOTBALL
+    LEAGUES = [
+        {"id": 140, "nom": "LaLiga (Espagne)",   "emoji": "🇪🇸"},
+        {"id": 78,  "nom": "Bundesliga (Allemagne)", "emoji": "🇩🇪"},
+        {"id": 135, "nom": "Serie A (Italie)",   "emoji": "🇮🇹"},
+        {"id": 61,  "nom": "Ligue 1 (France)",   "emoji": "🇫🇷"},
+        {"id": 39,  "nom": "Premier League (Angleterre)", "emoji": "🏴"},
+        {"id": 2,   "nom": "Ligue des Champions (UEFA)",  "emoji": "🏆"},
+    ]
+
+    def parse(self, response: list) -> list:
+        return parse_football(response)
+
+    def leagues(self, date_iso: str) -> list:
+        return self.LEAGUES
+
+    def league_params(self, league: dict, date_iso: str) -> dict:
+        return {"date": date_iso, "league": league["id"], "season": season_football(date_iso),
+                "timezone": "Europe/Paris"}
+
+
+# ==== Basket (API-Basketball) ====
+class BasketballProvider(Provider):
+    sport = "basketball"
+    key_env = "RAPIDAPI_KEY_BASKET"
+    host_env = "RAPIDAPI_BASKET_HOST"
+    default_host = "api-basketball.p.rapidapi.com"
+    teams_path = "/teams"
+    fixtures_path = "/games"
+    variant_key = "basket"
+    select_by = "nom"
+    section = ("🏀", "Basket")
+    section_rank = 10
+
+    # (recherche API, nom affiché, id de repli si la recherche échoue)
+    SEARCHES = [("NBA", "NBA", 12), ("Euroleague", "EuroLeague", None),
+                ("France", "Betclic Élite (France)", None)]  # Pro A / Betclic Élite
+
+    def __init__(self):
+        super().__init__()
+        self._leagues_lock = threading.Lock()
+        self._leagues = {"leagues": None, "at": 0.0}
+
+    def parse(self, response: list) -> list:
+        return parse_basketball(response)
+
+    def resolve_league(self, search_term: str, caller: str = "results"):
+        """Trouve l'ID + saison la plus récente pour une ligue (ex: 'Euroleague', 'France')"""
+        data = self.get("/leagues", {"search": search_term}, caller)
+        if data is None:
+            return None, None
+        best = None
+        for lg in data.get("response", []):
+            if search_term.lower() in lg.get("name", "").lower():
+                best = lg
+                break
+            # fallback: si on cherche "France", garder une ligue de type "league" en France
+            if search_term.lower() == "france" and lg.get("type") == "league" and lg.get("country", {}).get("name") == "France":
+                best = lg
+                break
+        if not best:
+            return None, None
+        seasons = [s.get("season") for s in best.get("seasons", []) if s.get("season")]
+        return best.get("id"), seasons[-1] if seasons else None
+
+    def leagues(self, date_iso: str | None = None) -> list:
+        """Ligues résolues via l'API, gardées LANAI_BASKET_LEAGUES_TTL dans le process (scheduler)."""
+        with self._leagues_lock:
+            if self._leagues["leagues"] is not None and time.monotonic() - self._leagues["at"] < LEAGUES_TTL:
+                return self._leagues["leagues"]
+            leagues = []
+            for search, nom, fallback_id in self.SEARCHES:
+                league_id, season = self.resolve_league(search)
+                if league_id or fallback_id:
+                    leagues.append({"id": league_id or fallback_id, "nom": nom, "season": season})
+            self._leagues.update(leagues=leagues, at=time.monotonic())
+            return leagues
+
+    def league_params(self, league: dict, date_iso: str) -> dict:
+        params = {"date": date_iso, "league": league["id"]}
+        # Si l'API fournit 'season' (format 'YYYY-YYYY+1'), on l'utilise, sinon on omet (certains endpoints déduisent)
+        if league.get("season"):
+            params["season"] = league["season"]
+        return params
+
+
+# ==== Registre ====
+class Registry:
+    def __init__(self):
+        self._providers: list = []
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+
+    def register(self, provider: Provider) -> Provider:
+        """Ajoute (ou remplace, même sport) un fournisseur ; l'ordre d'ajout = priorité des réponses."""
+        with self._lock:
+            self._providers = [p for p in self._providers if p.sport != provider.sport] + [provider]
+        return provider
+
+    def get(self, sport: str) -> Provider | None:
+        return next((p for p in self._providers if p.sport == sport), None)
+
+    def all(self) -> list:
+        return list(self._providers)
+
+    def sports(self) -> list:
+        return [p.sport for p in self._providers]
+
+    def configured(self) -> list:
+        return [p for p in self._providers if p.configured]
+
+    def _executor(self) -> ThreadPoolExecutor:
+        """Pool du process courant (celui hérité d'un fork n'a plus de threads)."""
+        pid = os.getpid()
+        if self._pool is None or self._pool_pid != pid:
+            with self._lock:
+                if self._pool is None or self._pool_pid != pid:
+                    self._pool = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="provider")
+                    self._pool_pid = pid
+        return self._pool
+
+    def fan_out(self, fn, providers: list | None = None, timeout: float | None = None) -> dict:
+        """
+        fn(provider) sur chaque fournisseur en parallèle → {sport: résultat}.
+        Délai propre à chaque fournisseur (provider.timeout, ou timeout pour tous) : un fournisseur
+        en retard ou en erreur est absent du résultat, les autres ne l'attendent pas.
+        """
+        providers = self.configured() if providers is None else providers
+        if not providers:
+            return {}
+        t0 = time.monotonic()
+        pool = self._executor()
+        call = lanai_log.bind(fn)
+        futures = [(p, pool.submit(call, p)) for p in providers]
+        out = {}
+        for p, fut in futures:
+            limit = timeout if timeout is not None else p.timeout
+            try:
+                out[p.sport] = fut.result(timeout=max(0.0, t0 + limit - time.monotonic()))
+            except FutureTimeout:
+                log.warning("fournisseur trop lent", extra={"sport": p.sport, "timeout_s": limit})
+            except Exception as e:
+                log.warning("fournisseur en erreur: %s", e, extra={"sport": p.sport})
+        return out
+
+
+    def first(self, fn, providers: list | None = None) -> tuple:
+        """
+        fn(provider) sur chaque fournisseur, l'un après l'autre, jusqu'au premier résultat → (sport, résultat),
+        (None, None) si aucun. Même délai par fournisseur que fan_out ; les suivants ne sont pas appelés.
+        """
+        providers = self.configured() if providers is None else providers
+        pool = self._executor()
+        call = lanai_log.bind(fn)
+        for p in providers:
+            try:
+                result = pool.submit(call, p).result(timeout=p.timeout)
+            except FutureTimeout:
+                log.warning("fournisseur trop lent", extra={"sport": p.sport, "timeout_s": p.timeout})
+                continue
+            except Exception as e:
+                log.warning("fournisseur en erreur: %s", e, extra={"sport": p.sport})
+                continue
+            if result:
+                return p.sport, result
+        return None, None
+
+
+registry = Registry()
+registry.register(FootballProvider())
+registry.register(BasketballProvider())
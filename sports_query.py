@@ -1,23 +1,20 @@
 import os
 import re
-from datetime import date, datetime, timedelta
-from typing import Optional, Tuple, Literal
+from datetime import date, timedelta
+from typing import Optional, Tuple
 
-import requests
+import lanai_log
+from sports_providers import Provider, registry
+from results_store import find_team_result, lookup_alias, remember_alias
+from fixtures import Match, from_row, last_finished
 
-# --- Configuration API depuis l'environnement (comme tes crons) ---
-
-RAPIDAPI_KEY_FOOT = os.getenv("RAPIDAPI_KEY_FOOT")
-RAPIDAPI_KEY_BASKET = os.getenv("RAPIDAPI_KEY_BASKET")
-
-# On met des valeurs par défaut pour les hosts RapidAPI.
-# Si dans ton fichier lanai_results.py tu utilises d'autres hosts,
-# mets les mêmes ici ou configure RAPIDAPI_FOOT_HOST / RAPIDAPI_BASKET_HOST dans Render.
-RAPIDAPI_FOOT_HOST = os.getenv("RAPIDAPI_FOOT_HOST", "api-football-v1.p.rapidapi.com")
-RAPIDAPI_BASKET_HOST = os.getenv("RAPIDAPI_BASKET_HOST", "api-basketball.p.rapidapi.com")
+# --- APIs sport : clés, hosts (RAPIDAPI_FOOT_HOST / RAPIDAPI_BASKET_HOST) et appels dans sports_providers ---
+# Question hors snapshot : fournisseurs interrogés en parallèle (1) ou l'un après l'autre (défaut, quota)
+LIVE_FANOUT = os.environ.get("LANAI_SPORTS_FANOUT", "0") == "1"
+log = lanai_log.get_logger("sports")
 
 # --- Types ---
-SportType = Literal["football", "basketball"]
+SportType = str  # sport d'un fournisseur enregistré (cf. sports_providers.registry.sports())
 
 
 # ==========================
@@ -152,271 +149,123 @@ def resolve_period_to_dates(period: str, today: Optional[date] = None) -> Tuple[
 
 
 # ==========================
-# 4. Appels API – FOOT
+# 4. Sélection + formatage (communs à tous les sports, cf. sports_providers)
 # ==========================
 
-def _foot_headers() -> dict:
-    return {
-        "x-rapidapi-key": RAPIDAPI_KEY_FOOT,
-        "x-rapidapi-host": RAPIDAPI_FOOT_HOST,
-    }
-
-
-def search_team_football(team_query: str) -> Optional[dict]:
+def pick_last_finished_football(fixtures: list, team_id: int) -> Optional[Match]:
     """
-    Utilise l'API-Football pour chercher une équipe à partir d'un nom ou acronyme.
-    Retourne un dict minimal : {"id": ..., "name": ...} ou None.
+    Parmi les fixtures (déjà normalisées), retourne le dernier match TERMINÉ pour l'équipe.
     """
-    if not RAPIDAPI_KEY_FOOT:
-        return None
-
-    url = f"https://{RAPIDAPI_FOOT_HOST}/v3/teams"
-    params = {"search": team_query}
-
-    try:
-        r = requests.get(url, headers=_foot_headers(), params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-    except Exception:
-        return None
-
-    resp = data.get("response") or []
-    if not resp:
-        return None
-
-    team_info = resp[0].get("team") or resp[0]
-    return {
-        "id": team_info.get("id"),
-        "name": team_info.get("name", team_query),
-    }
-
-
-def get_football_fixtures(team_id: int, start_date: date, end_date: date):
-    """
-    Récupère les fixtures d'une équipe entre deux dates (inclus).
-    S'appuie sur l'endpoint /v3/fixtures.
-    """
-    if not RAPIDAPI_KEY_FOOT:
-        return []
-
-    url = f"https://{RAPIDAPI_FOOT_HOST}/v3/fixtures"
-    params = {
-        "team": team_id,
-        "from": start_date.isoformat(),
-        "to": end_date.isoformat(),
-    }
-
-    try:
-        r = requests.get(url, headers=_foot_headers(), params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-    except Exception:
-        return []
+    return last_finished(fixtures, team_id)
 
-    return data.get("response") or []
 
-
-def pick_last_finished_football(fixtures: list, team_id: int) -> Optional[dict]:
+def pick_last_finished_basketball(games: list, team_id: int) -> Optional[Match]:
     """
-    Parmi la liste de fixtures, retourne le dernier match TERMINÉ pour l'équipe.
+    Retourne le dernier match terminé pour l'équipe ('FT', 'AOT'… cf. fixtures.BASKET_FINAL).
     """
-    if not fixtures:
-        return None
-
-    # On trie du plus récent au plus ancien (en fonction de la date du fixture)
-    def fixture_datetime(f):
-        dt_str = f.get("fixture", {}).get("date")
-        try:
-            return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-        except Exception:
-            return datetime.min
-
-    fixtures_sorted = sorted(fixtures, key=fixture_datetime, reverse=True)
-
-    for f in fixtures_sorted:
-        status = f.get("fixture", {}).get("status", {}).get("short")
-        if status not in ("FT", "AET", "PEN"):
-            continue  # match pas terminé
-
-        teams = f.get("teams", {})
-        home = teams.get("home", {})
-        away = teams.get("away", {})
-
-        if team_id not in (home.get("id"), away.get("id")):
-            continue
-
-        return f
-
-    return None
+    return last_finished(games, team_id)
 
 
-def format_football_answer(team_name: str, fixture: dict) -> str:
+def _format_answer(team_name: str, match: Match, team_id: Optional[int] = None) -> str:
     """
     Formate une phrase du type :
     - "Le PSG a gagné 3–1 contre Lyon ce week-end."
+    Côté de l'équipe : par id si connu, sinon par nom.
     """
-    teams = fixture.get("teams", {})
-    goals = fixture.get("goals", {})
-
-    home = teams.get("home", {})
-    away = teams.get("away", {})
-
-    home_name = home.get("name", "Équipe domicile")
-    away_name = away.get("name", "Équipe extérieur")
-    home_goals = goals.get("home", 0)
-    away_goals = goals.get("away", 0)
-
-    # Déterminer si team_name est à domicile ou extérieur
-    # On compare en lower pour tolérer les variations
-    ln = team_name.lower()
-    is_home = ln in home_name.lower()
-    is_away = ln in away_name.lower()
+    hs = match.home_score if match.home_score is not None else 0
+    as_ = match.away_score if match.away_score is not None else 0
+    is_home = match.is_home(team_id, team_name)
+    is_away = not is_home and (match.involves(team_id) or team_name.lower() in (match.away_name or "").lower())
 
     # Déterminer victoire / nul / défaite
-    if home_goals == away_goals:
+    if hs == as_:
         result = "a fait match nul"
-    elif (is_home and home_goals > away_goals) or (is_away and away_goals > home_goals):
+    elif (is_home and hs > as_) or (is_away and as_ > hs):
         result = "a gagné"
     else:
         result = "a perdu"
 
     # Nom de l'adversaire
-    opponent = away_name if is_home else home_name
+    opponent = (match.away_name if is_home else match.home_name) or "l'adversaire"
+    return f"{team_name} {result} {hs}–{as_} contre {opponent}."
 
-    return f"{team_name} {result} {home_goals}–{away_goals} contre {opponent}."
 
+def format_football_answer(team_name: str, fixture: Match, team_id: Optional[int] = None) -> str:
+    return _format_answer(team_name, fixture, team_id)
 
-# ==========================
-# 5. Appels API – BASKET
-# ==========================
 
-def _basket_headers() -> dict:
-    return {
-        "x-rapidapi-key": RAPIDAPI_KEY_BASKET,
-        "x-rapidapi-host": RAPIDAPI_BASKET_HOST,
-    }
-
-
-def search_team_basketball(team_query: str) -> Optional[dict]:
+def format_basketball_answer(team_name: str, game: Match, team_id: Optional[int] = None) -> str:
     """
-    Cherche une équipe de basket via API-Basketball.
-    """
-    if not RAPIDAPI_KEY_BASKET:
-        return None
-
-    url = f"https://{RAPIDAPI_BASKET_HOST}/teams"
-    params = {"search": team_query}
-
-    try:
-        r = requests.get(url, headers=_basket_headers(), params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-    except Exception:
-        return None
-
-    resp = data.get("response") or []
-    if not resp:
-        return None
-
-    team_info = resp[0].get("team") or resp[0]
-    return {
-        "id": team_info.get("id"),
-        "name": team_info.get("name", team_query),
-    }
-
-
-def get_basketball_games(team_id: int, start_date: date, end_date: date):
-    """
-    Récupère les matchs de basket (games) pour une équipe.
+    Formate une phrase simple pour le basket.
     """
-    if not RAPIDAPI_KEY_BASKET:
-        return []
-
-    url = f"https://{RAPIDAPI_BASKET_HOST}/games"
-    params = {
-        "team": team_id,
-        "from": start_date.isoformat(),
-        "to": end_date.isoformat(),
-    }
+    return _format_answer(team_name, game, team_id)
 
-    try:
-        r = requests.get(url, headers=_basket_headers(), params=params, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-    except Exception:
-        return []
-
-    return data.get("response") or []
 
+# ==========================
+# 5. Recherche en direct (un fournisseur)
+# ==========================
 
-def pick_last_finished_basketball(games: list, team_id: int) -> Optional[dict]:
+def lookup_team_result(provider: Provider, team: str, start_date: date, end_date: date) -> Optional[tuple]:
     """
-    Retourne le dernier match terminé pour l'équipe.
+    Équipe → dernier match terminé sur la période chez ce fournisseur : (team_info, Match) ou None.
     """
-    if not games:
+    team_info = provider.search_team(team)
+    if not team_info or not team_info.get("id"):
         return None
+    # Alias mémorisé : la prochaine question sur cette équipe se résout sans API
+    remember_alias(team, provider.sport, team_info["id"], team_info["name"])
+    fixtures = provider.team_fixtures(team_info["id"], start_date, end_date) or []
+    match = last_finished(fixtures, team_info["id"])
+    return (team_info, match) if match else None
 
-    def game_datetime(g):
-        dt_str = g.get("date")
-        try:
-            return datetime.fromisoformat(dt_str.replace("Z", "+00:00"))
-        except Exception:
-            return datetime.min
-
-    games_sorted = sorted(games, key=game_datetime, reverse=True)
 
-    for g in games_sorted:
-        status = (g.get("status") or {}).get("short") or ""
-        # Dans l'API-Basketball, 'FT' = terminé, parfois 'AOT', etc.
-        if status not in ("FT", "AOT", "FT OT"):
-            continue
-
-        teams = g.get("teams", {})
-        home = teams.get("home", {})
-        away = teams.get("visitors", {})
+# ==========================
+# 6. Snapshot local (match_results, rempli chaque nuit par lanai_results)
+# ==========================
 
-        if team_id not in (home.get("id"), away.get("id")):
-            continue
+def format_snapshot_answer(row: dict) -> str:
+    """Même phrase que format_football_answer / format_basketball_answer, depuis une ligne du snapshot."""
+    match = from_row(row)
+    team_id = row["home_id"] if row["team_name"] == row["home_name"] else row["away_id"]
+    return _format_answer(row["team_name"], match, team_id)
 
-        return g
 
-    return None
+def known_aliases(team: str) -> dict:
+    """{sport: {'id', 'name'}} des alias déjà résolus pour ce nom (un par sport au plus)."""
+    aliases = {}
+    try:
+        for sport in registry.sports():
+            alias = lookup_alias(team, sport)
+            if alias:
+                aliases[sport] = alias
+    except Exception as e:
+        log.warning("alias indisponibles: %s", e)
+    return aliases
 
 
-def format_basketball_answer(team_name: str, game: dict) -> str:
+def answer_from_snapshot(team: str, start_date: date, end_date: date,
+                         aliases: Optional[dict] = None) -> Optional[str]:
     """
-    Formate une phrase simple pour le basket.
+    Cherche d'abord via les alias déjà résolus (id d'équipe → index), puis par nom.
+    Retourne None si le match n'est pas dans le snapshot (→ API en direct).
     """
-    teams = game.get("teams", {})
-    scores = game.get("scores", {})
-
-    home = teams.get("home", {})
-    away = teams.get("visitors", {})
-
-    home_name = home.get("name", "Équipe domicile")
-    away_name = away.get("name", "Équipe extérieur")
-
-    home_points = (scores.get("home") or {}).get("points", 0)
-    away_points = (scores.get("visitors") or {}).get("points", 0)
-
-    ln = team_name.lower()
-    is_home = ln in home_name.lower()
-    is_away = ln in away_name.lower()
-
-    if home_points == away_points:
-        result = "a fait match nul"
-    elif (is_home and home_points > away_points) or (is_away and away_points > home_points):
-        result = "a gagné"
-    else:
-        result = "a perdu"
-
-    opponent = away_name if is_home else home_name
-
-    return f"{team_name} {result} {home_points}–{away_points} contre {opponent}."
+    if aliases is None:
+        aliases = known_aliases(team)
+    try:
+        for sport, alias in aliases.items():
+            row = find_team_result(team, start_date, end_date, sport, alias["id"])
+            if row:
+                return format_snapshot_answer(row)
+        row = find_team_result(team, start_date, end_date)
+        if row:
+            return format_snapshot_answer(row)
+    except Exception as e:
+        log.warning("snapshot indisponible: %s", e)
+    return None
 
 
 # ==========================
-# 6. Pipeline principal : traiter une question sport
+# 7. Pipeline principal : traiter une question sport
 # ==========================
 
 def handle_sports_question(text: str) -> Optional[str]:
@@ -424,7 +273,9 @@ def handle_sports_question(text: str) -> Optional[str]:
     Pipeline complet :
     - extrait équipe + période
     - résout les dates
-    - tente FOOT puis BASKET
+    - cherche dans le snapshot local (aucun appel API)
+    - sinon interroge les fournisseurs (foot, basket…) l'un après l'autre, sport déjà connu d'abord
+      (LANAI_SPORTS_FANOUT=1 : tous en parallèle)
     - retourne une phrase prête à envoyer
 
     Retourne None si on n'a pas réussi (→ fallback GPT dans app.py).
@@ -440,29 +291,38 @@ def handle_sports_question(text: str) -> Optional[str]:
     period = extract_time_period(text)
     start_date, end_date = resolve_period_to_dates(period)
 
-    # 1) FOOTBALL
-    if RAPIDAPI_KEY_FOOT:
-        team_info_foot = search_team_football(team)
-        if team_info_foot and team_info_foot.get("id"):
-            fixtures = get_football_fixtures(team_info_foot["id"], start_date, end_date)
-            match = pick_last_finished_football(fixtures, team_info_foot["id"])
-            if match:
-                # On a trouvé un match de foot
-                return format_football_answer(team_info_foot["name"], match)
-
-    # 2) BASKET (si rien trouvé en foot)
-    if RAPIDAPI_KEY_BASKET:
-        team_info_basket = search_team_basketball(team)
-        if team_info_basket and team_info_basket.get("id"):
-            games = get_basketball_games(team_info_basket["id"], start_date, end_date)
-            game = pick_last_finished_basketball(games, team_info_basket["id"])
-            if game:
-                return format_basketball_answer(team_info_basket["name"], game)
+    # 0) SNAPSHOT (résultats de la nuit)
+    aliases = known_aliases(team)
+    answer = answer_from_snapshot(team, start_date, end_date, aliases)
+    if answer:
+        return answer
+
+    # Quota bas : on garde les requêtes restantes pour les jobs planifiés (réponse depuis le cache seulement)
+    configured = registry.configured()
+    available = [p for p in configured if not p.low()]
+    if configured and not available:
+        return f"Je n’ai pas le résultat de {team} en mémoire, et je ne peux pas vérifier en direct pour le moment."
+
+    # 1) Sport déjà connu pour ce nom (alias) d'abord, puis ordre du registre (foot, basket…)
+    available.sort(key=lambda p: p.sport not in aliases)
+    def lookup(provider):
+        return lookup_team_result(provider, team, start_date, end_date)
+
+    if LIVE_FANOUT:
+        # Tous en parallèle : plus rapide sur un échec, mais chaque fournisseur dépense son quota
+        found = registry.fan_out(lookup, available)
+        hit = next((found[p.sport] for p in available if found.get(p.sport)), None)
+    else:
+        # L'un après l'autre : le suivant n'est appelé (et décompté) que si le précédent n'a rien trouvé
+        hit = registry.first(lookup, available)[1]
+    if hit:
+        team_info, match = hit
+        return _format_answer(team_info["name"], match, team_info["id"])
 
     # Si on arrive ici, rien trouvé ou pas d'API dispo
     # On renvoie une phrase honnête.
     # Si tu préfères laisser GPT gérer, retourne None ici.
-    if RAPIDAPI_KEY_FOOT or RAPIDAPI_KEY_BASKET:
+    if configured:
         return f"Je n’ai pas trouvé de match pour {team} sur cette période."
     else:
         # Aucun accès API configuré
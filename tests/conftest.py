@@ -0,0 +1,108 @@
+# conftest.py — les modules testés sont à la racine du dépôt (pas de package)
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# memory_store refuse de s'importer sans DATABASE_URL ; les tests n'ouvrent aucune connexion
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/lanai_test")
+
+
+# ==== Fausse base (requêtes enregistrées, résultats préparés à l'avance) ====
+class FakeCursor:
+    def __init__(self, db, name=None):
+        self.db = db
+        self.name = name
+        self.rowcount = 0
+        self.itersize = None
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.db.queries.append((sql, params))
+        if self.db.handler:
+            result = self.db.handler(sql)
+        else:
+            result = self.db.results.pop(0) if self.db.results else []
+        if isinstance(result, int):          # INSERT / UPDATE : seulement un rowcount
+            result, self.rowcount = [], result
+        else:
+            self.rowcount = len(result)
+        self._rows = list(result)
+
+    def copy_expert(self, sql, f):
+        self.db.queries.append((" ".join(sql.split()), None))
+        if "FROM STDIN" in sql:
+            self.db.copied = f.read()
+        else:
+            f.write(self.db.copy_out)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+        self.closed = False
+
+    def cursor(self, name=None, cursor_factory=None):
+        return FakeCursor(self.db, name)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeDB:
+    def __init__(self):
+        self.queries = []     # [(sql sur une ligne, params)]
+        self.results = []     # une entrée par execute : liste de lignes ou rowcount (int)
+        self.handler = None   # ou sql -> résultat, quand l'ordre des requêtes importe peu
+        self.commits = 0
+        self.conns = []
+        self.copied = None
+        self.copy_out = b""
+
+    def connect(self, *args, **kwargs):
+        conn = FakeConn(self)
+        self.conns.append(conn)
+        return conn
+
+    def sql(self, i: int = -1) -> str:
+        return self.queries[i][0]
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """memory_store._get_conn → FakeDB (psycopg2 doit être installé : memory_store l'importe)."""
+    pytest.importorskip("psycopg2")
+    import memory_store
+    db = FakeDB()
+    monkeypatch.setattr(memory_store, "_get_conn", db.connect)
+    return db
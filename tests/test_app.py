@@ -0,0 +1,160 @@
+import os
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+# Variables lues à l'import (create_app les vérifie) ; rien n'est ouvert tant qu'aucune route n'est appelée
+for name, value in {"OPENAI_API_KEY": "sk-test", "TWILIO_ACCOUNT_SID": "AC-test", "TWILIO_AUTH_TOKEN": "test",
+                    "TWILIO_WHATSAPP_NUMBER": "whatsapp:+14155238886", "LANAI_WARMUP": "0"}.items():
+    os.environ.setdefault(name, value)
+import app as lanai_app  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    return lanai_app.app.test_client()
+
+
+@pytest.fixture
+def boot(monkeypatch):
+    """Étapes du préchauffage remplacées par des fonctions qui ne touchent à rien."""
+    calls = []
+    for name in ("init_schemas", "get_executor", "_ping_db", "get_twilio", "get_session"):
+        monkeypatch.setattr(lanai_app, name, lambda name=name: calls.append(name))
+    monkeypatch.setattr(lanai_app.model_router, "warm_up", lambda: calls.append("openai"))
+    monkeypatch.delenv("MY_WHATSAPP_NUMBER", raising=False)
+    lanai_app._ready.clear()
+    yield calls
+    lanai_app._ready.clear()
+
+
+def test_create_app_checks_config(monkeypatch):
+    monkeypatch.setattr(lanai_app, "OPENAI_API_KEY", None)
+    with pytest.raises(ValueError, match="OPENAI_API_KEY"):
+        lanai_app.create_app()
+    monkeypatch.setattr(lanai_app, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(lanai_app, "twilio_whatsapp", None)
+    with pytest.raises(ValueError, match="Twilio"):
+        lanai_app.create_app()
+
+
+def test_import_opens_nothing():
+    assert not lanai_app._schema_ready and lanai_app._executor is None
+
+
+def test_health(client):
+    assert client.get("/health").data == b"ok"
+
+
+def test_ready_after_warm_up(client, boot, monkeypatch):
+    monkeypatch.setattr(lanai_app, "start_warm_up", lambda retry=False: None)
+    assert client.get("/ready").status_code == 503
+    lanai_app.warm_up()
+    resp = client.get("/ready")
+    assert resp.status_code == 200
+    assert set(resp.get_json()["steps"]) == {"schema", "executor", "db", "twilio", "openai", "http"}
+    assert boot == ["init_schemas", "get_executor", "_ping_db", "get_twilio", "openai", "get_session"]
+
+
+def test_failed_warm_up_reports_the_step(boot, monkeypatch):
+    def db_down():
+        raise ConnectionError("db injoignable")
+
+    monkeypatch.setattr(lanai_app, "_ping_db", db_down)
+    lanai_app.warm_up()
+    assert not lanai_app._ready.is_set()
+    assert lanai_app._boot["error"] == "db: db injoignable" and "db" not in lanai_app._boot["steps"]
+
+
+def test_schemas_created_once(monkeypatch):
+    done = []
+    for name in ("init_schema", "init_weather_schema", "init_results_schema"):
+        monkeypatch.setattr(lanai_app, name, lambda name=name: done.append(name))
+    monkeypatch.setattr(lanai_app.rapidapi_quota, "init_quota_schema", lambda: done.append("quota"))
+    monkeypatch.setattr(lanai_app, "_schema_ready", False)
+    lanai_app.init_schemas()
+    lanai_app.init_schemas()
+    assert done == ["init_schema", "init_weather_schema", "init_results_schema", "quota"]
+
+
+def test_executor_recreated_after_fork(monkeypatch):
+    monkeypatch.setattr(lanai_app, "_executor", None)
+    first = lanai_app.get_executor()
+    assert lanai_app.get_executor() is first
+    monkeypatch.setattr(lanai_app.os, "getpid", lambda: -1)
+    assert lanai_app.get_executor() is not first
+    first.shutdown()
+    lanai_app.get_executor().shutdown()
+
+
+def test_webhook_answers_immediately(client, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(lanai_app, "get_executor",
+                        lambda: type("Pool", (), {"submit": lambda self, *a: submitted.append(a)})())
+    resp = client.post("/webhook", data={"From": "whatsapp:+33600000000", "Body": " Salam ", "MessageSid": "SM1"})
+    assert resp.status_code == 200
+    assert submitted[0][1:4] == ("whatsapp:+33600000000", "Salam", "SM1")
+    client.post("/webhook", data={"From": "whatsapp:+33600000000", "Body": "  "})
+    assert len(submitted) == 1
+
+
+@pytest.mark.parametrize("text,past", [
+    ("Tu te souviens de mon genou ?", True),
+    ("Je t’ai parlé de Karim l'autre jour", True),
+    ("Quel temps demain ?", False),
+    (None, False),
+])
+def test_refers_to_past(text, past):
+    assert lanai_app.refers_to_past(text) is past
+
+
+def test_recall_terms_drop_noise():
+    assert lanai_app.recall_terms("Tu te souviens de mon genou et du médecin ?") == ["mon", "genou", "médecin"]
+
+
+# ==== /debug/profiles et /stats (jeton LANAI_PROFILE_TOKEN) ====
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    from collections import Counter
+    monkeypatch.setattr(lanai_app.lanai_profiler, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(lanai_app, "PROFILE_TOKEN", "s3cret")
+    return lanai_app.lanai_profiler.save("abc", Counter({("main", "gpt"): 4}), 6000.0, "slow")
+
+
+def test_debug_routes_hidden_without_token(client, monkeypatch):
+    monkeypatch.setattr(lanai_app, "PROFILE_TOKEN", None)
+    assert client.get("/debug/profiles", headers={"X-Lanai-Token": "x"}).status_code == 404
+
+
+def test_debug_routes_require_the_token(client, profiles):
+    assert client.get("/debug/profiles").status_code == 403
+    assert client.get("/debug/profiles", headers={"X-Lanai-Token": "faux"}).status_code == 403
+    resp = client.get("/debug/profiles", headers={"X-Lanai-Token": "s3cret"})
+    assert resp.status_code == 200 and resp.get_json()["profiles"][0]["id"] == profiles
+
+
+def test_download_profile(client, profiles):
+    auth = {"X-Lanai-Token": "s3cret"}
+    resp = client.get(f"/debug/profiles/{profiles}", headers=auth)
+    assert resp.data == b"main;gpt 4\n" and "attachment" in resp.headers["Content-Disposition"]
+    assert client.get(f"/debug/profiles/{profiles}?format=json", headers=auth).get_json()["trace"] == "abc"
+    assert client.get("/debug/profiles/inconnu", headers=auth).status_code == 404
+
+
+def test_token_in_query_string_is_refused(client, profiles):
+    # un ?token= finirait dans les logs d'accès
+    assert client.get("/debug/profiles?token=s3cret").status_code == 403
+
+
+def test_stats_requires_the_token(client, monkeypatch):
+    for name in ("db_stats", "replica_lag"):
+        monkeypatch.setattr(lanai_app, name, lambda: None)
+    monkeypatch.setattr(lanai_app, "PROFILE_TOKEN", None)
+    assert client.get("/stats").status_code == 404
+    monkeypatch.setattr(lanai_app, "PROFILE_TOKEN", "s3cret")
+    assert client.get("/stats").status_code == 403
+    assert client.get("/stats?token=s3cret").status_code == 403
+    resp = client.get("/stats", headers={"X-Lanai-Token": "s3cret"})
+    assert resp.status_code == 200 and set(resp.get_json()) >= {"db", "replica_lag", "llm"}
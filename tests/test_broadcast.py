@@ -0,0 +1,103 @@
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+import lanai_broadcast as lb  # noqa: E402
+
+
+class FakeTwilio:
+    def __init__(self, fail_for=()):
+        self.sent = []
+        self.fail_for = set(fail_for)
+        self.lock = threading.Lock()
+        self.messages = self
+
+    def create(self, from_, body, to):
+        if to in self.fail_for:
+            raise RuntimeError("numéro invalide")
+        with self.lock:
+            self.sent.append((to, body))
+            return type("Msg", (), {"sid": f"SM{len(self.sent)}"})()
+
+
+@pytest.fixture
+def env(monkeypatch, fake_db):
+    monkeypatch.setattr(lb, "_get_conn", fake_db.connect)
+    monkeypatch.setenv("TWILIO_WHATSAPP_NUMBER", "whatsapp:+14155238886")
+    monkeypatch.setenv("MY_WHATSAPP_NUMBER", "whatsapp:+33600000000")
+    monkeypatch.setattr(lb, "SEND_RATE", 0)
+    logged = []
+    monkeypatch.setattr(lb, "add_messages", lambda rows: logged.extend(rows) or len(rows))
+    twilio = FakeTwilio(fail_for={"whatsapp:+33699999999"})
+    monkeypatch.setattr(lb, "get_twilio", lambda: twilio)
+    return fake_db, twilio, logged
+
+
+def test_subscribers_from_db(env):
+    db, _, _ = env
+    db.results = [[("whatsapp:+331", "Ali", {"villes": ["Lille"]}), ("whatsapp:+332", None, None)]]
+    assert lb.load_subscribers("weather") == [
+        {"user_phone": "whatsapp:+331", "prenom": "Ali", "variant": {"villes": ["Lille"]}},
+        {"user_phone": "whatsapp:+332", "prenom": None, "variant": {}},
+    ]
+    assert db.queries[0][1] == ("weather",)
+
+
+def test_default_recipient_when_table_empty_or_unreadable(env, monkeypatch):
+    db, _, _ = env
+    assert lb.load_subscribers("results") == [
+        {"user_phone": "whatsapp:+33600000000", "prenom": "Mohamed", "variant": {}}]
+
+    def broken():
+        raise RuntimeError("relation public.subscriptions does not exist")
+
+    monkeypatch.setattr(lb, "_get_conn", broken)
+    assert lb.load_subscribers("results")[0]["user_phone"] == "whatsapp:+33600000000"
+
+
+def test_group_by_variant_is_order_insensitive():
+    subs = [{"user_phone": "a", "variant": {"x": 1, "y": 2}},
+            {"user_phone": "b", "variant": {"y": 2, "x": 1}},
+            {"user_phone": "c", "variant": {}}]
+    groups = lb.group_by_variant(subs)
+    assert sorted(len(members) for _, members in groups.values()) == [1, 2]
+    by_city = lb.group_by_variant(subs, variant_of=lambda s: s["user_phone"] == "c")
+    assert {k: [s["user_phone"] for s in m] for k, (_, m) in by_city.items()} == {"false": ["a", "b"], "true": ["c"]}
+
+
+def test_rate_limiter_spaces_sends():
+    limiter = lb.RateLimiter(50)
+    t0 = time.monotonic()
+    for _ in range(6):
+        limiter.wait()
+    assert time.monotonic() - t0 >= 5 / 50 * 0.9
+    lb.RateLimiter(0).wait()   # 0 = pas de limite
+
+
+def test_fan_out_builds_once_per_variant(env):
+    db, twilio, logged = env
+    db.results = [[("whatsapp:+331", "Ali", {"villes": ["Lille"]}),
+                   ("whatsapp:+332", "Nora", {"villes": ["Lille"]}),
+                   ("whatsapp:+333", "Yanis", {"villes": ["Nice"]}),
+                   ("whatsapp:+33699999999", "Inconnu", {"villes": ["Nice"]})]]
+    built = []
+
+    def build(variant):
+        built.append(variant["villes"][0])
+        return f"Météo {variant['villes'][0]}"
+
+    stats = lb.fan_out("weather", "cron_weather", build, lambda content, sub: f"Bonjour {sub['prenom']} ! {content}")
+    assert sorted(built) == ["Lille", "Nice"]
+    assert stats == {"subscribers": 4, "variants": 2, "sent": 3}
+    assert sorted(twilio.sent)[0] == ("whatsapp:+331", "Bonjour Ali ! Météo Lille")
+    assert sorted(r["user_phone"] for r in logged) == ["whatsapp:+331", "whatsapp:+332", "whatsapp:+333"]
+    assert all(r["source"] == "cron_weather" and r["direction"] == "out" and r["msg_sid"] for r in logged)
+
+
+def test_fan_out_without_subscribers(env, monkeypatch):
+    monkeypatch.delenv("MY_WHATSAPP_NUMBER")
+    assert lb.fan_out("content", "cron_content", lambda v: "x", lambda c, s: c) == \
+        {"subscribers": 0, "variants": 0, "sent": 0}
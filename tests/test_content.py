@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+import lanai_content as lc  # noqa: E402
+
+PROFIL = {"Identité": {"Prénom": "Fatima"}, "Lanai": {"Clins d'œil": "son chat Minou"}}
+
+
+@pytest.fixture
+def gpt(monkeypatch):
+    calls = []
+    monkeypatch.setattr(lc, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(lc, "MODE", "gpt")
+    monkeypatch.setattr(lc, "pop_snippet", lambda: None)   # réserve vide → génération de secours
+    monkeypatch.setattr(lc.model_router, "complete",
+                        lambda messages, route=None: calls.append(messages) or messages[1]["content"])
+    return calls
+
+
+def test_fallback_uses_the_recipient_profile(gpt):
+    lc.build_message("Fatima", profile=PROFIL)
+    system = gpt[0][0]["content"]
+    assert "compagnon WhatsApp de Fatima" in system and "clins d'œil à son chat Minou" in system
+
+
+def test_fallback_without_profile_stays_neutral(gpt):
+    lc.build_message("Ali")
+    assert gpt[0][0]["content"] == lc.SYSTEM_PROMPT
+
+
+def test_pooled_snippet_gets_the_name_at_send_time(monkeypatch):
+    monkeypatch.setattr(lc, "pop_snippet", lambda: "Belle journée à toi.")
+    assert lc.pooled_snippet("Fatima") == "Salam aleykum Fatima,\nBelle journée à toi."
+
+
+def test_run_personalizes_per_recipient(gpt, monkeypatch):
+    subs = [{"user_phone": "whatsapp:+331", "prenom": None, "variant": {}},
+            {"user_phone": "whatsapp:+332", "prenom": "Ali", "variant": {}}]
+    profiles = {"whatsapp:+331": PROFIL}
+    outgoing = []
+
+    def fan_out(job, source, build_variant, render, variant_of):
+        for sub in subs:
+            outgoing.append((sub["user_phone"], render(build_variant(variant_of(sub)), sub)))
+        return {"sent": len(outgoing)}
+
+    monkeypatch.setattr(lc, "fan_out", fan_out)
+    monkeypatch.setattr(lc, "load_sent_hashes", set)
+    monkeypatch.setattr(lc, "load_rotation", lambda bank: None)
+    monkeypatch.setattr(lc, "save_rotation", lambda rotation: None)
+    monkeypatch.setattr(lc, "refill", lambda: 0)
+    monkeypatch.setattr(lc, "recipient_profile", lambda phone: profiles.get(phone, {}))
+    lc.run()
+    assert "« Salam aleykum Fatima, »" in outgoing[0][1] and "« Salam aleykum Ali, »" in outgoing[1][1]
+    assert "Minou" in gpt[0][0]["content"] and gpt[1][0]["content"] == lc.SYSTEM_PROMPT
+
+
+def test_recipient_profile_unavailable(monkeypatch):
+    def boom(phone):
+        raise FileNotFoundError("aucun profil")
+    monkeypatch.setattr(lc.profile_store, "get_compiled", boom)
+    assert lc.recipient_profile("whatsapp:+331") == {} and lc.recipient_profile(None) == {}
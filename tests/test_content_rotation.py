@@ -0,0 +1,71 @@
+import random
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("psycopg2")
+from content_rotation import Deck, Rotation, parse_weights  # noqa: E402
+
+BANK = {
+    "hadith": [f"hadith {i}" for i in range(5)],
+    "citations": [f"citation {i}" for i in range(3)],
+    "vide": [],
+    "pas_une_liste": "ignoré",
+}
+
+
+def test_each_line_once_per_cycle():
+    rot = Rotation({"hadith": BANK["hadith"]})
+    for _ in range(3):
+        assert sorted(rot.pick()[1] for _ in range(5)) == BANK["hadith"]
+
+
+def test_no_repeat_across_cycles():
+    random.seed(0)
+    deck = Deck(3, "fp")
+    draws = [deck.draw() for _ in range(300)]
+    assert all(a != b for a, b in zip(draws, draws[1:]))
+
+
+def test_weighted_round_robin():
+    rot = Rotation(BANK, {"hadith": 3, "citations": 1})
+    cats = [rot.pick()[0] for _ in range(8)]
+    assert Counter(cats) == {"hadith": 6, "citations": 2}
+    assert "citations" not in cats[:1] and cats[:4].count("citations") == 1   # lissé, pas 3 d'affilée puis 1
+
+
+def test_empty_and_zero_weight_categories_are_dropped():
+    rot = Rotation(BANK, {"citations": 0})
+    assert set(rot.decks) == {"hadith"}
+    assert Rotation({}).pick() is None
+
+
+def test_state_roundtrip_resumes_cycle():
+    rot = Rotation(BANK)
+    seen = [rot.pick() for _ in range(4)]
+    states = {cat: rot.state(cat) for cat in rot.dirty}
+    resumed = Rotation(BANK, states=states)
+    rest = [resumed.pick() for _ in range(4)]
+    assert Counter(cat for cat, _ in seen + rest) == {"hadith": 4, "citations": 4}
+    hadiths = [line for cat, line in seen + rest if cat == "hadith"]
+    assert len(set(hadiths)) == 4   # 4 tirages sur 5 lignes, de part et d'autre de la sauvegarde : aucun doublon
+
+
+def test_changed_bank_reshuffles():
+    rot = Rotation({"citations": BANK["citations"]})
+    rot.pick()
+    st = rot.state("citations")
+    assert Rotation({"citations": BANK["citations"]}, states={"citations": st}).decks["citations"].cursor == 1
+    changed = BANK["citations"] + ["citation 3"]
+    assert Rotation({"citations": changed}, states={"citations": st}).decks["citations"].cursor == 0
+
+
+def test_corrupt_state_starts_new_deck():
+    st = {"fingerprint": None, "order": [0, 0, 1], "cursor": 2}
+    deck = Deck(3, "fp", st["order"], st["cursor"])
+    assert sorted(deck.order) == [0, 1, 2] and deck.cursor == 0
+
+
+def test_parse_weights():
+    assert parse_weights("hadith=3, coran=2,sante=x,citations=-1,seul") == {"hadith": 3, "coran": 2, "citations": 0}
+    assert parse_weights("") == {}
@@ -0,0 +1,68 @@
+import io
+import csv
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import memory_store  # noqa: E402
+import lanai_export  # noqa: E402
+
+T0 = datetime(2026, 1, 1, 8, tzinfo=timezone.utc)
+
+
+def rows(n, phone="whatsapp:+33600000000"):
+    return [{"id": i, "user_phone": phone, "role": "user", "content": f"message {i}",
+             "created_at": T0 + timedelta(minutes=i), "direction": "in", "source": "webhook", "msg_sid": None}
+            for i in range(1, n + 1)]
+
+
+def test_keyset_pages(fake_db):
+    data = rows(5)
+    fake_db.results = [data[:2], data[2:4], data[4:]]
+    out = list(memory_store.export_messages(page_size=2))
+    assert out == data
+    assert len(fake_db.queries) == 3 and fake_db.commits == 3   # une transaction courte par page
+    first, _ = fake_db.queries[0]
+    second, params = fake_db.queries[1]
+    assert "WHERE" not in first and first.endswith("ORDER BY user_phone, created_at, id LIMIT %s")
+    assert "WHERE (user_phone, created_at, id) > (%s, %s, %s)" in second and "OFFSET" not in second
+    assert params == ["whatsapp:+33600000000", data[1]["created_at"], 2, 2]
+
+
+def test_exact_multiple_of_page_size_ends_on_empty_page(fake_db):
+    data = rows(4)
+    fake_db.results = [data[:2], data[2:], []]
+    assert len(list(memory_store.export_messages(page_size=2))) == 4
+    assert len(fake_db.queries) == 3
+
+
+def test_filters(fake_db):
+    since, until = T0, T0 + timedelta(days=1)
+    list(memory_store.export_messages("whatsapp:+33600000000", since, until, page_size=10))
+    sql, params = fake_db.queries[0]
+    assert "WHERE user_phone = %s AND created_at >= %s AND created_at < %s ORDER BY" in sql
+    assert params == ["whatsapp:+33600000000", since, until, 10]
+
+
+def test_jsonl_and_csv_writers():
+    data = rows(2)
+    buf = io.StringIO()
+    assert lanai_export.write_jsonl(iter(data), buf) == 2
+    first = json.loads(buf.getvalue().splitlines()[0])
+    assert first["created_at"] == "2026-01-01T08:01:00+00:00" and first["content"] == "message 1"
+
+    buf = io.StringIO()
+    assert lanai_export.write_csv(iter(data), buf) == 2
+    parsed = list(csv.DictReader(io.StringIO(buf.getvalue())))
+    assert list(parsed[0]) == list(memory_store.EXPORT_COLUMNS) and parsed[1]["id"] == "2"
+
+
+def test_cli_writes_file(fake_db, tmp_path, capsys):
+    fake_db.results = [rows(3)]
+    out = tmp_path / "export.jsonl"
+    lanai_export.main(["--user", "whatsapp:+33600000000", "--since", "2026-01-01", "--out", str(out)])
+    assert len(out.read_text(encoding="utf-8").splitlines()) == 3
+    assert fake_db.queries[0][1][1] == T0.replace(hour=0)
+    assert "3 messages exportés" in capsys.readouterr().err
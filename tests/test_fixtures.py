@@ -0,0 +1,110 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from fixtures import Status, from_row, last_finished, parse_basketball, parse_football
+
+
+def foot(fid, short, home=(85, "PSG", 2), away=(81, "Marseille", 1), ts=None, date_iso="2026-10-18T21:00:00+02:00",
+         long=None, elapsed=None):
+    return {
+        "fixture": {"id": fid, "timestamp": ts, "date": date_iso,
+                    "status": {"short": short, "long": long, "elapsed": elapsed}},
+        "league": {"id": 61, "name": "Ligue 1"},
+        "teams": {"home": {"id": home[0], "name": home[1]}, "away": {"id": away[0], "name": away[1]}},
+        "goals": {"home": home[2], "away": away[2]},
+    }
+
+
+def basket(gid, short, long=None, home=(1, "Paris", 88), away=(2, "Monaco", 91), scores_key="visitors"):
+    return {
+        "id": gid, "date": "2026-10-18T20:00:00+00:00", "timestamp": 1792353600,
+        "status": {"short": short, "long": long},
+        "league": {"id": 2, "name": "LNB"},
+        "teams": {"home": {"id": home[0], "name": home[1]}, scores_key: {"id": away[0], "name": away[1]}},
+        "scores": {"home": {"total": home[2]}, scores_key: {"total": away[2]}},
+    }
+
+
+# ==== Football ====
+def test_parse_football_finished():
+    [m] = parse_football([foot(1, "FT")])
+    assert (m.sport, m.fixture_id, m.league_id, m.league_name) == ("football", 1, 61, "Ligue 1")
+    assert (m.home_id, m.home_name, m.away_id, m.away_name) == (85, "PSG", 81, "Marseille")
+    assert (m.home_score, m.away_score) == (2, 1) and m.has_score
+    assert m.status is Status.FINISHED and m.finished and m.status_code == m.short == "FT"
+    assert m.kickoff == datetime(2026, 10, 18, 19, tzinfo=timezone.utc).timestamp()
+    assert m.line() == "PSG 2 - 1 Marseille"
+
+
+@pytest.mark.parametrize("short,status", [
+    ("AET", Status.FINISHED), ("PEN", Status.FINISHED),
+    ("1H", Status.LIVE), ("HT", Status.LIVE), ("P", Status.LIVE),
+    ("NS", Status.SCHEDULED), ("TBD", Status.SCHEDULED),
+    ("PST", Status.OTHER), ("CANC", Status.OTHER), (None, Status.OTHER),
+])
+def test_football_status(short, status):
+    assert parse_football([foot(1, short)])[0].status is status
+
+
+def test_football_live_keeps_elapsed_and_null_goals():
+    [m] = parse_football([foot(1, "1H", home=(85, "PSG", None), away=(81, "OM", None), elapsed=12)])
+    assert m.elapsed == 12 and not m.has_score and not m.finished
+
+
+def test_football_kickoff_prefers_timestamp_then_iso():
+    assert parse_football([foot(1, "FT", ts=1700000000)])[0].kickoff == 1700000000.0
+    assert parse_football([foot(1, "FT", date_iso="2026-10-18T19:00:00Z")])[0].kickoff == \
+        datetime(2026, 10, 18, 19, tzinfo=timezone.utc).timestamp()
+    assert parse_football([foot(1, "FT", date_iso="pas une date")])[0].kickoff == 0.0
+
+
+def test_parse_skips_garbage():
+    assert parse_football(None) == [] and parse_basketball([]) == []
+    assert len(parse_football([foot(1, "FT"), None, "x", {}])) == 2   # {} → match vide, statut OTHER
+    assert parse_football([{}])[0].status is Status.OTHER
+
+
+# ==== Basket ====
+def test_parse_basketball_visitors_and_totals():
+    [m] = parse_basketball([basket(7, "FT")])
+    assert (m.sport, m.away_name, m.home_score, m.away_score) == ("basketball", "Monaco", 88, 91)
+    assert m.finished and m.short == "FT"
+
+
+def test_basketball_away_key_and_points_fallback():
+    g = basket(7, "Q2", scores_key="away")
+    g["scores"] = {"home": {"points": 40}, "away": 38}
+    [m] = parse_basketball([g])
+    assert (m.away_name, m.home_score, m.away_score) == ("Monaco", 40, 38)
+    assert m.status is Status.LIVE
+
+
+@pytest.mark.parametrize("short,long", [("AOT", None), ("FT OT", None), (None, "Game Finished"), ("X", "Finished")])
+def test_basketball_finished_by_short_or_long(short, long):
+    [m] = parse_basketball([basket(7, short, long)])
+    assert m.finished
+    assert m.status_code == (long or short) and m.short == (short or long)   # pas de code court : le libellé
+
+
+# ==== Sélection / snapshot ====
+def test_last_finished_picks_latest_finished_of_team():
+    old = foot(1, "FT", ts=100)
+    new = foot(2, "FT", ts=300, home=(99, "Lens", 0), away=(85, "PSG", 3))
+    live = foot(3, "2H", ts=400)
+    other = foot(4, "FT", ts=500, home=(1, "Lyon", 1), away=(2, "Nice", 1))
+    matches = parse_football([old, live, new, other])
+    assert last_finished(matches, 85).fixture_id == 2
+    assert last_finished(matches, 12345) is None
+    assert last_finished(matches, None) is None
+
+
+def test_from_row_and_snapshot_roundtrip():
+    [m] = parse_football([foot(1, "FT")])
+    row = m.snapshot("2026-10-18")
+    assert row["status"] == "FT" and row["league_name"] == "Ligue 1"
+    row["match_date"] = date(2026, 10, 18)
+    back = from_row(row)
+    assert back.finished and back.line() == m.line() and back.league_id == 61
+    assert back.kickoff == datetime(2026, 10, 18, tzinfo=timezone.utc).timestamp()
+    assert m.snapshot("2026-10-18", league_id=1, league_name="Coupe")["league_id"] == 1
@@ -0,0 +1,103 @@
+import io
+import csv
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import memory_store  # noqa: E402
+from lanai_import import PARIS, SOURCE, parse_whatsapp_export  # noqa: E402
+
+USER = "whatsapp:+33600000000"
+
+ANDROID = """\
+12/03/2024 14:05 - Les messages et les appels sont chiffrés de bout en bout.
+12/03/2024 14:05 - Papa: Salam Lanai
+12/03/2024, 14:06 - Lanai: Wa aleykum salam !
+Comment vas-tu ?
+12/03/2024 14:07 - Papa: <Médias omis>
+12/03/24 14:08 - Papa: Bien, hamdoulilah
+""".splitlines(keepends=True)
+
+IOS = [
+    "‎[12/03/2024 14:05:32] Papa: Tu te souviens de mon genou ?\r\n",
+    "[12/03/2024 14:05:40] ‎Lanai: Oui, il allait mieux la semaine dernière.\r\n",
+    "‎[12/03/2024 14:06:01] Papa ajouté par Karim\r\n",
+    "ligne orpheline après un message système\r\n",
+]
+
+
+def test_android_export():
+    rows = list(parse_whatsapp_export(ANDROID, USER))
+    assert [(r["role"], r["direction"], r["content"]) for r in rows] == [
+        ("user", "in", "Salam Lanai"),
+        ("assistant", "out", "Wa aleykum salam !\nComment vas-tu ?"),
+        ("user", "in", "Bien, hamdoulilah"),
+    ]
+    assert rows[0]["created_at"] == datetime(2024, 3, 12, 14, 5, tzinfo=PARIS)
+    assert rows[2]["created_at"] == datetime(2024, 3, 12, 14, 8, tzinfo=PARIS)   # année sur 2 chiffres
+    assert all(r["user_phone"] == USER and r["source"] == SOURCE for r in rows)
+
+
+def test_ios_export_with_marks_and_system_lines():
+    rows = list(parse_whatsapp_export(IOS, USER))
+    assert [(r["role"], r["content"]) for r in rows] == [
+        ("user", "Tu te souviens de mon genou ?"),
+        ("assistant", "Oui, il allait mieux la semaine dernière."),
+    ]
+    assert rows[0]["created_at"] == datetime(2024, 3, 12, 14, 5, 32, tzinfo=PARIS)
+
+
+def test_bot_names_are_case_insensitive():
+    rows = list(parse_whatsapp_export(ANDROID, USER, bot_names=("papa ",)))
+    assert [r["role"] for r in rows] == ["assistant", "user", "assistant"]
+
+
+def test_msg_sid_is_stable_and_distinct():
+    a = [r["msg_sid"] for r in parse_whatsapp_export(ANDROID, USER)]
+    b = [r["msg_sid"] for r in parse_whatsapp_export(ANDROID, USER)]
+    other = [r["msg_sid"] for r in parse_whatsapp_export(ANDROID, "whatsapp:+33611111111")]
+    assert a == b and len(set(a)) == 3
+    assert all(s.startswith("import:") and len(s) == len("import:") + 24 for s in a)
+    assert not set(a) & set(other)
+
+
+def test_empty_and_headerless_input():
+    assert list(parse_whatsapp_export([], USER)) == []
+    assert list(parse_whatsapp_export(["texte sans en-tête\n", "\n"], USER)) == []
+
+
+# ==== COPY en flux ====
+def test_csv_stream_reads_in_chunks():
+    rows = list(parse_whatsapp_export(ANDROID, USER))
+    stream = memory_store._CsvRowStream(iter(rows))
+    chunks = []
+    while True:
+        chunk = stream.read(16)
+        if not chunk:
+            break
+        assert len(chunk) <= 16
+        chunks.append(chunk)
+    parsed = list(csv.reader(io.StringIO("".join(chunks))))
+    assert [r[2] for r in parsed] == [r["content"] for r in rows]
+    assert parsed[1][3] == "2024-03-12T14:06:00+01:00" and parsed[1][7] == rows[1]["content_hash"]
+    assert stream.count == 3 and stream.oldest == rows[0]["created_at"]
+
+
+def _partitioned_db(sql):
+    if "relkind" in sql:
+        return [("p",)]
+    return 2 if sql.startswith("INSERT INTO public.messages") else []
+
+
+def test_bulk_import_copies_then_merges(fake_db):
+    rows = list(parse_whatsapp_export(ANDROID, USER))
+    fake_db.handler = _partitioned_db
+    stats = memory_store.bulk_import_messages(iter(rows))
+    assert (stats["parsed"], stats["inserted"], stats["duplicates"]) == (3, 2, 1)
+    sqls = [sql for sql, _ in fake_db.queries]
+    assert sqls[0].startswith("CREATE TEMP TABLE messages_import")
+    assert sqls[1].startswith("COPY messages_import (user_phone, role, content, created_at, msg_sid")
+    assert any("PARTITION OF public.messages FOR VALUES FROM ('2024-03-01" in s for s in sqls)   # vieux mois créés
+    assert sqls[-1].startswith("INSERT INTO public.messages") and sqls[-1].endswith("ON CONFLICT DO NOTHING;")
+    assert len(list(csv.reader(io.StringIO(fake_db.copied)))) == 3 and fake_db.commits == 1
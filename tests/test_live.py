@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+import lanai_live as live  # noqa: E402
+from fixtures import Match, Status  # noqa: E402
+from lanai_live import diff, format_event  # noqa: E402
+
+
+def foot(short, home=0, away=0, status=Status.LIVE, fid=1, elapsed=None):
+    return Match("football", fid, 0.0, 61, "Ligue 1", 85, "PSG", 81, "OM", home, away, status, short,
+                 elapsed=elapsed)
+
+
+def basket(short, home, away, status=Status.LIVE, long=None):
+    return Match("basketball", 7, 0.0, 2, "LNB", 1, "Paris", 2, "Monaco", home, away, status, long or short, short)
+
+
+def kinds(events):
+    return [(m.fixture_id, kind) for m, kind in events]
+
+
+def test_first_sighting_only_reports_kickoff():
+    prev = {}
+    assert kinds(diff(prev, [foot("1H", fid=1), foot("2H", 1, 0, fid=2)])) == [(1, "status")]
+    assert set(prev) == {("football", 1), ("football", 2)}
+
+
+def test_unchanged_state_is_silent():
+    prev = {}
+    diff(prev, [foot("2H", 1, 0)])
+    assert diff(prev, [foot("2H", 1, 0, elapsed=70)]) == []
+
+
+def test_goal_then_half_time_then_full_time():
+    prev = {}
+    diff(prev, [foot("1H")])
+    [(m, kind)] = diff(prev, [foot("1H", 1, 0, elapsed=23)])
+    assert kind == "goal" and format_event(m, kind) == "⚽ But ! (23') PSG 1 - 0 OM"
+    assert kinds(diff(prev, [foot("HT", 1, 0)])) == [(1, "status")]
+    # but dans les arrêts de jeu + coup de sifflet final dans le même tour : un seul message, le score final
+    [(m, kind)] = diff(prev, [foot("FT", 2, 0, Status.FINISHED)])
+    assert kind == "status" and format_event(m, kind) == "⚽ Fin du match : PSG 2 - 0 OM"
+
+
+def test_score_correction_after_final_whistle_is_reported_as_goal():
+    prev = {}
+    diff(prev, [foot("FT", 2, 0, Status.FINISHED)])
+    assert kinds(diff(prev, [foot("FT", 2, 1, Status.FINISHED)])) == [(1, "goal")]
+
+
+def test_basket_only_reports_period_changes_and_end():
+    prev = {}
+    assert kinds(diff(prev, [basket("Q1", 0, 0)])) == [(7, "status")]
+    assert diff(prev, [basket("Q1", 12, 9)]) == []      # pas un message par panier
+    [(m, kind)] = diff(prev, [basket("Q2", 25, 22)])
+    assert format_event(m, kind) == "🏀 2e quart-temps : Paris 25 - 22 Monaco"
+    [(m, kind)] = diff(prev, [basket(None, 88, 91, Status.FINISHED, long="Game Finished")])
+    assert kind == "status" and format_event(m, kind) == "🏀 Game Finished : Paris 88 - 91 Monaco"
+
+
+def test_basket_overtime_finish():
+    prev = {}
+    diff(prev, [basket("OT", 99, 99)])
+    [(m, kind)] = diff(prev, [basket("AOT", 105, 101, Status.FINISHED)])
+    assert format_event(m, kind) == "🏀 Fin après prolongation : Paris 105 - 101 Monaco"
+
+
+def test_matches_are_tracked_independently():
+    prev = {}
+    diff(prev, [foot("1H", fid=1), foot("1H", fid=2)])
+    assert kinds(diff(prev, [foot("1H", 0, 1, fid=1), foot("1H", fid=2)])) == [(1, "goal")]
+
+
+def test_quiet_hours_wrap_midnight(monkeypatch):
+    monkeypatch.setattr(live, "QUIET_HOURS", "23-8")
+    assert live.in_quiet_hours(datetime(2026, 3, 7, 23, 30))
+    assert live.in_quiet_hours(datetime(2026, 3, 8, 7, 59))
+    assert not live.in_quiet_hours(datetime(2026, 3, 8, 8, 0))
+    monkeypatch.setattr(live, "QUIET_HOURS", "13-14")
+    assert live.in_quiet_hours(datetime(2026, 3, 8, 13, 15))
+    monkeypatch.setattr(live, "QUIET_HOURS", "")
+    assert not live.in_quiet_hours(datetime(2026, 3, 8, 3, 0))
+
+
+def test_budget_spreads_remaining_requests_until_midnight():
+    budget = live.LiveBudget(10)
+    budget.spend(4)
+    assert budget.remaining() == 6
+    interval = budget.min_interval(cost=2)          # 3 tours restants d'ici minuit
+    assert 0 < interval <= 24 * 3600 / 3
+    budget.spend(6)
+    assert budget.remaining() == 0 and budget.min_interval(cost=1) > interval
+
+
+def test_follows_of_missing_variant():
+    assert live.follows_of({"user_phone": "x"}) == {"foot": set(), "foot_teams": set(),
+                                                   "basket": set(), "basket_teams": set()}
@@ -0,0 +1,103 @@
+import os
+import json
+import urllib.request
+
+import pytest
+
+import lanai_loadtest as lt
+
+
+@pytest.fixture(scope="module")
+def fakes():
+    services = lt.start_fakes({}, {})
+    yield services
+    for f in services.values():
+        f.server.shutdown()
+
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=5) as r:
+        return json.loads(r.read()), r.headers
+
+
+def _post(url, data: bytes):
+    with urllib.request.urlopen(url, data=data, timeout=5) as r:
+        return r.status, json.loads(r.read())
+
+
+# ==== Faux services (sans app ni Postgres) ====
+def test_fake_rapidapi_football(fakes):
+    base = fakes["rapidapi"].base_url
+    teams, headers = _get(base + "/v3/teams?search=psg")
+    assert teams["response"][0]["team"]["name"] == "Psg"
+    assert int(headers["x-ratelimit-requests-remaining"]) > 0
+    tid = teams["response"][0]["team"]["id"]
+    data, _ = _get(f"{base}/v3/fixtures?team={tid}&last=5")
+    [fx] = data["response"]
+    assert fx["fixture"]["status"]["short"] == "FT" and fx["teams"]["home"]["id"] == tid
+    assert fx["goals"]["home"] is not None and fx["goals"]["away"] is not None
+
+
+def test_fake_rapidapi_basketball(fakes):
+    data, _ = _get(fakes["rapidapi"].base_url + "/games?team=42&season=2025-2026")
+    [g] = data["response"]
+    assert g["status"]["short"] == "FT" and 42 in (g["teams"]["home"]["id"], g["teams"]["visitors"]["id"])
+    assert g["scores"]["home"]["total"] is not None
+
+
+def test_fake_openai_twilio_weather(fakes):
+    status, chat = _post(fakes["openai"].base_url + "/v1/chat/completions",
+                         json.dumps({"model": "m", "messages": [{"role": "user", "content": "salut"}]}).encode())
+    assert status == 200 and chat["choices"][0]["message"]["content"] in lt._REPLIES
+    status, msg = _post(fakes["twilio"].base_url + "/2010-04-01/Accounts/AC0/Messages.json",
+                        b"To=whatsapp%3A%2B33600000000&Body=ok")
+    assert status == 201 and msg["body"] == "ok"
+    daily, _ = _get(fakes["weather"].base_url + "/data/3.0/onecall?lat=43&lon=6")
+    assert len(daily["daily"]) == 8
+
+
+def test_fake_error_injection():
+    svc = lt.FakeService("boom", lambda *a: (200, {}, None), error_rate=1.0).start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as exc:
+            _get(svc.base_url + "/x")
+        assert exc.value.code == 500
+        assert svc.stats()["errors_injected"] == 1
+    finally:
+        svc.server.shutdown()
+
+
+# ==== Rejeu ====
+def test_schedule_is_reproducible_and_retries_keep_sid():
+    mix = lt.parse_pairs(lt.DEFAULT_MIX)
+    a = lt.build_schedule(5, 4, mix, 3, dup=0.2, retry=0.5, seed=7)
+    assert a == lt.build_schedule(5, 4, mix, 3, dup=0.2, retry=0.5, seed=7)
+    assert [t for t, *_ in a] == sorted(t for t, *_ in a)
+    sids = [sid for *_, sid in a]
+    assert len(set(sids)) == 20 and len(sids) > 20   # 5 msg/s × 4 s, plus les renvois Twilio
+
+
+def test_percentile():
+    assert lt.percentile([], 50) is None
+    assert lt.percentile([3, 1, 2], 50) == 2
+    assert lt.percentile(list(range(101)), 99) == 99
+
+
+# ==== De bout en bout : app + Postgres dédié ====
+@pytest.mark.skipif(not os.environ.get("LANAI_LOADTEST_DATABASE_URL"),
+                    reason="LANAI_LOADTEST_DATABASE_URL non défini (Postgres dédié au test de charge)")
+def test_replay_a_few_messages(tmp_path):
+    pytest.importorskip("flask")
+    saved = dict(os.environ)
+    os.environ["DATABASE_URL"] = os.environ["LANAI_LOADTEST_DATABASE_URL"]
+    out = tmp_path / "rapport.json"
+    try:
+        lt.main(["--rate", "2", "--duration", "3", "--users", "3", "--latency", "openai=50",
+                 "--drain", "30", "--seed", "1", "--json", str(out)])
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["http_failures"] == 0
+    assert report["messages"] == 6 and report["replied"] == 6
+    assert report["duplicate_replies"] == 0
@@ -0,0 +1,71 @@
+import sys
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import lanai_log
+
+
+def record(msg="webhook reçu", level=logging.INFO, trace_id=None, **extra):
+    rec = logging.LogRecord("lanai.app", level, __file__, 1, msg, (), None)
+    rec.trace_id = trace_id
+    rec.__dict__.update(extra)
+    return rec
+
+
+def test_trace_from_sid():
+    assert lanai_log.trace_from_sid("SM0123456789abcdef0123456789abcdef") == "456789abcdef"
+    generated = lanai_log.trace_from_sid(None)
+    assert len(generated) == 12 and generated != lanai_log.trace_from_sid(None)
+
+
+def test_trace_is_scoped_and_bound_to_worker_threads():
+    assert lanai_log.current_trace() is None
+    with lanai_log.trace("abc123"):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            bound = list(pool.map(lanai_log.bind(lambda _: lanai_log.current_trace()), range(2)))
+            unbound = pool.submit(lanai_log.current_trace).result()
+    assert bound == ["abc123", "abc123"] and unbound is None
+    assert lanai_log.current_trace() is None
+
+
+def test_json_line_carries_trace_and_extra_fields():
+    line = lanai_log.JsonFormatter().format(record(trace_id="abc123", job="weather", duration_ms=12))
+    out = json.loads(line)
+    assert out["level"] == "info" and out["logger"] == "lanai.app" and out["msg"] == "webhook reçu"
+    assert out["trace"] == "abc123" and out["job"] == "weather" and out["duration_ms"] == 12
+    assert out["ts"].endswith("Z") and "\n" not in line
+
+
+def test_json_line_with_exception():
+    try:
+        raise ValueError("boum")
+    except ValueError:
+        rec = record(level=logging.ERROR)
+        rec.exc_info = sys.exc_info()
+    out = json.loads(lanai_log.JsonFormatter().format(rec))
+    assert "ValueError: boum" in out["exc"] and "trace" not in out
+
+
+def test_text_format():
+    line = lanai_log.TextFormatter().format(record(trace_id="abc123", job="weather"))
+    assert line == "I [lanai.app][abc123] webhook reçu job=weather"
+
+
+def test_debug_sampling(monkeypatch):
+    f = lanai_log._ContextFilter()
+    monkeypatch.setattr(lanai_log, "DEBUG_SAMPLE", 0.0)
+    assert not f.filter(record(level=logging.DEBUG))
+    assert f.filter(record(level=logging.WARNING))
+    monkeypatch.setattr(lanai_log, "DEBUG_SAMPLE", 1.0)
+    with lanai_log.trace("t1"):
+        rec = record(level=logging.DEBUG)
+        assert f.filter(rec) and rec.trace_id == "t1"
+
+
+def test_loggers_share_one_handler():
+    a, b = lanai_log.get_logger("a"), lanai_log.get_logger("b")
+    assert a.name == "lanai.a" and b.name == "lanai.b"
+    root = logging.getLogger("lanai")
+    assert len([h for h in root.handlers if isinstance(h, lanai_log._FastQueueHandler)]) == 1
+    assert not root.propagate
@@ -0,0 +1,126 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+import lanai_meteo as lm  # noqa: E402
+from lanai_meteo import is_weather_question  # noqa: E402
+
+LOFFRE = (50.3844, 3.1069)
+
+
+def day(offset, temp=12, description="Nuageux"):
+    return {"date": (datetime.now(lm.PARIS) + timedelta(days=offset)).strftime("%Y-%m-%d"),
+            "temp": temp, "description": description, "humidity": 80}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """API One Call simulée, base injoignable : seul le cache mémoire du process sert."""
+    calls = []
+    state = {"days": [day(0), day(1, 14, "Pluie"), day(2)]}
+
+    def fetch(lat, lon):
+        calls.append(lm.loc_key(lat, lon))
+        return state["days"]
+
+    def no_db():
+        raise RuntimeError("base injoignable")
+
+    monkeypatch.setattr(lm, "api_key", "test")
+    monkeypatch.setattr(lm, "fetch_daily", fetch)
+    monkeypatch.setattr(lm, "_get_conn", no_db)
+    monkeypatch.setattr(lm, "_mem_cache", {})
+    state["calls"] = calls
+    return state
+
+
+def test_loc_key_rounds_to_about_a_kilometre():
+    assert lm.loc_key(50.3844, 3.1069) == lm.loc_key(50.38, 3.11) == "50.38,3.11"
+
+
+def test_forecast_is_cached_until_ttl(api, monkeypatch):
+    assert lm.get_forecast(LOFFRE, 1)["description"] == "Pluie"
+    assert lm.get_forecast("loffre", 0)["temp"] == 12      # nom de ville, même clé
+    assert api["calls"] == ["50.38,3.11"]
+    key = lm.loc_key(*LOFFRE)
+    lm._mem_cache[key] = (time.time() - lm.WEATHER_TTL - 1, lm._mem_cache[key][1])
+    lm.get_forecast(LOFFRE, 1)
+    assert len(api["calls"]) == 2
+
+
+def test_stale_forecast_served_when_api_is_down(api):
+    key = lm.loc_key(*LOFFRE)
+    lm._mem_cache[key] = (time.time() - lm.WEATHER_TTL - 1, [day(1, 9, "Ancienne")])
+    api["days"] = None
+    assert lm.get_forecast(LOFFRE, 1)["description"] == "Ancienne"
+
+
+def test_unknown_location_or_missing_key(api, monkeypatch):
+    assert lm.get_forecast("Tombouctou") is None
+    monkeypatch.setattr(lm, "api_key", None)
+    assert lm.get_forecast(LOFFRE) is None
+    assert api["calls"] == []
+
+
+def test_prefetch_calls_once_per_location(api):
+    lm.prefetch([LOFFRE, (50.3841, 3.1071), (43.5769, 7.0191)])
+    assert sorted(api["calls"]) == ["43.58,7.02", "50.38,3.11"]
+
+
+def test_weather_question_answers_named_city(api):
+    answer = lm.handle_weather_question("Quelle est la météo demain à Loffre ?")
+    assert answer.startswith("Météo demain (")
+    assert "🌤 Loffre : 14°C, Pluie, humidité 80%" in answer and "Cannet" not in answer
+    both = lm.handle_weather_question("météo aujourd'hui")
+    assert "Loffre : 12°C" in both and "Le Cannet" in both
+
+
+def test_weather_question_without_forecast_falls_back_to_gpt(api):
+    api["days"] = None
+    assert lm.handle_weather_question("météo demain") is None
+
+
+@pytest.mark.parametrize("text", [
+    "Quelle est la météo demain ?",
+    "meteo Loffre",
+    "Quel temps fera-t-il ce week-end ?",
+    "Il va pleuvoir demain ?",
+    "Est-ce qu'il va faire beau aujourd'hui ?",
+    "Il fera combien après-demain au Cannet ?",
+    "Va-t-il neiger cette nuit ?",
+    "Ça neigera ce soir ?",
+])
+def test_forecast_questions(text):
+    assert is_weather_question(text)
+
+
+@pytest.mark.parametrize("text", [
+    "j'ai pris ma température",
+    "il fait froid ici",
+    "j'ai glissé sur la neige",
+    "la pluie m'a fatigué",
+    "il va faire ses devoirs demain",
+    "il va pleuvoir des critiques sur ce film",   # futur sans moment : pas une demande de prévision
+    "on va faire quoi ce week-end ?",
+    "",
+    None,
+])
+def test_chat_is_not_weather(text):
+    assert not is_weather_question(text)
+
+
+@pytest.mark.parametrize("text", [
+    "météo à Lyon demain",
+    "Quel temps fera-t-il demain sur Paris ?",
+    "Il va pleuvoir au Havre aujourd'hui ?",
+])
+def test_weather_question_for_unknown_city_goes_to_gpt(api, text):
+    assert lm.handle_weather_question(text) is None
+
+
+def test_weather_question_ignores_non_places(api):
+    assert "Loffre" in lm.handle_weather_question("Il va pleuvoir demain à midi ?")
+    assert "Le Cannet" in lm.handle_weather_question("Il fera combien après-demain au Cannet ?")
@@ -0,0 +1,68 @@
+import pytest
+
+import model_router
+from model_router import choose_route, detect_intent, extract_features
+
+
+@pytest.fixture(autouse=True)
+def default_routes(monkeypatch):
+    monkeypatch.setattr(model_router, "ROUTES", {k: list(v) for k, v in model_router.DEFAULT_ROUTES.items()})
+
+
+def features(intent="chat", msg_len=80, history=4, budget=None):
+    return {"intent": intent, "msg_len": msg_len, "history": history, "budget": budget}
+
+
+@pytest.mark.parametrize("text,intent", [
+    ("Explique-moi pourquoi il faut boire de l'eau", "details"),
+    ("Raconte-moi une histoire", "details"),
+    ("Salam aleykum", "smalltalk"),
+    ("merci", "smalltalk"),
+    ("Merci, et tu peux me rappeler l'heure de mon rendez-vous chez le médecin ?", "chat"),
+    ("Je suis fatigué", "chat"),
+    ("", "chat"),
+])
+def test_detect_intent(text, intent):
+    assert detect_intent(text) == intent
+
+
+@pytest.mark.parametrize("feat,route", [
+    (features(intent="details", msg_len=10), "long"),
+    (features(intent="smalltalk", msg_len=30), "short"),
+    (features(intent="smalltalk", msg_len=30, history=30), "chat"),   # longue conversation : plus de marge
+    (features(intent="smalltalk", msg_len=10, history=30), "short"),
+    (features(msg_len=24), "short"),
+    (features(msg_len=25), "chat"),
+])
+def test_route_by_intent_and_length(feat, route):
+    assert choose_route(feat) == route
+
+
+@pytest.mark.parametrize("intent,budget,route", [
+    ("details", None, "long"),
+    ("details", 25, "long"),
+    ("details", 18, "chat"),    # < 20 s (long) mais ≥ 15 s (chat)
+    ("details", 10, "short"),   # descend de deux crans
+    ("chat", 14.9, "short"),
+    ("chat", 15, "chat"),
+    ("smalltalk", 0.5, "short"),  # jamais en dessous de short
+])
+def test_budget_downgrades(intent, budget, route):
+    assert choose_route(features(intent=intent, budget=budget)) == route
+
+
+def test_downgrade_follows_route_overrides(monkeypatch):
+    monkeypatch.setitem(model_router.ROUTES, "long", [{"model": "m", "timeout": 5}])
+    assert choose_route(features(intent="details", budget=6)) == "long"
+
+
+def test_extract_features_uses_last_user_message():
+    msgs = [
+        {"role": "system", "content": "..."},
+        {"role": "user", "content": "Explique-moi la marche nordique"},
+        {"role": "assistant", "content": "..."},
+        {"role": "user", "content": "ok merci"},
+    ]
+    f = extract_features(msgs)
+    assert f == {"msg_len": 8, "intent": "smalltalk", "history": 3, "budget": None}
+    assert choose_route(f) == "short"
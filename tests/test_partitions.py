@@ -0,0 +1,111 @@
+import gzip
+from datetime import date, datetime, timezone
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import memory_store as ms  # noqa: E402
+
+PARTITIONED = [("p",)]
+
+
+def this_month() -> date:
+    return ms._month_start(datetime.now(timezone.utc).date())
+
+
+def test_month_arithmetic():
+    assert ms._add_months(date(2026, 11, 1), 1) == date(2026, 12, 1)
+    assert ms._add_months(date(2026, 12, 1), 1) == date(2027, 1, 1)
+    assert ms._add_months(date(2026, 1, 1), -13) == date(2024, 12, 1)
+    assert ms._month_start(date(2026, 2, 28)) == date(2026, 2, 1)
+    assert ms.partition_name(date(2026, 3, 1)) == "messages_p2026_03"
+
+
+def test_ensure_partitions_creates_months_ahead(fake_db):
+    fake_db.results = [PARTITIONED]
+    ms.ensure_partitions(months_ahead=2, since=ms._add_months(this_month(), -1))
+    created = [sql for sql, _ in fake_db.queries if sql.startswith("CREATE TABLE IF NOT EXISTS public.messages_p")]
+    names = [ms.partition_name(ms._add_months(this_month(), n)) for n in range(-1, 3)]
+    assert [sql.split()[5] for sql in created] == [f"public.{n}" for n in names]
+    first = ms._add_months(this_month(), -1)
+    assert f"FOR VALUES FROM ('{first.isoformat()} 00:00:00+00') TO ('{this_month().isoformat()} 00:00:00+00')" \
+        in created[0]
+    assert fake_db.commits == 1
+
+
+def test_ensure_partitions_noop_on_plain_table(fake_db):
+    fake_db.results = [[("r",)]]
+    ms.ensure_partitions()
+    assert len(fake_db.queries) == 1
+
+
+def test_list_partitions_sorted_and_filtered():
+    class Cur:
+        def execute(self, sql):
+            pass
+
+        def fetchall(self):
+            return [("messages_p2026_02",), ("messages_default",), ("messages_p2025_12",)]
+
+    assert ms.list_partitions(Cur()) == [("messages_p2025_12", date(2025, 12, 1)),
+                                         ("messages_p2026_02", date(2026, 2, 1))]
+
+
+def _old_partition():
+    month = ms._add_months(this_month(), -14)
+    return ms.partition_name(month)
+
+
+def test_archive_old_partitions(fake_db, tmp_path):
+    old, recent = _old_partition(), ms.partition_name(this_month())
+    fake_db.copy_out = b"id,content\n1,salam\n2,merci\n"
+    fake_db.results = [PARTITIONED, [(old,), (recent,)], [(2,)], 0, 0]
+    written = ms.archive_partitions(12, str(tmp_path))
+    assert written == [str(tmp_path / f"{old}.csv.gz")]
+    with gzip.open(written[0], "rb") as f:
+        assert f.read() == fake_db.copy_out
+    sqls = [sql for sql, _ in fake_db.queries]
+    assert f"ALTER TABLE public.messages DETACH PARTITION public.{old};" in sqls
+    assert f"DROP TABLE public.{old};" in sqls
+    assert not any(recent in sql for sql in sqls[2:])
+
+
+def test_incomplete_archive_keeps_partition(fake_db, tmp_path):
+    old = _old_partition()
+    fake_db.copy_out = b"id,content\n1,salam\n"
+    fake_db.results = [PARTITIONED, [(old,)], [(2,)]]
+    with pytest.raises(RuntimeError, match="incomplète"):
+        ms.archive_partitions(12, str(tmp_path))
+    assert not any(sql.startswith("DROP") for sql, _ in fake_db.queries)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_archive_needs_partitioned_table(fake_db, tmp_path):
+    fake_db.results = [[("r",)]]
+    assert ms.archive_partitions(12, str(tmp_path)) == []
+
+
+def test_history_reads_recent_months_first(fake_db):
+    fake_db.results = [[{"role": "assistant", "content": "b"}, {"role": "user", "content": "a"}]]
+    assert ms.get_history("whatsapp:+33", limit=2) == [{"role": "user", "content": "a"},
+                                                       {"role": "assistant", "content": "b"}]
+    sql, params = fake_db.queries[0]
+    assert len(fake_db.queries) == 1 and "AND created_at >= %s" in sql
+    assert params == ("whatsapp:+33", ms._add_months(this_month(), -1), 2)
+
+
+def test_history_falls_back_to_older_months(fake_db):
+    fake_db.results = [[{"role": "user", "content": "récent"}], [{"role": "assistant", "content": "ancien"}]]
+    assert [m["content"] for m in ms.get_history("whatsapp:+33", limit=5)] == ["ancien", "récent"]
+    sql, params = fake_db.queries[1]
+    assert "AND created_at < %s" in sql and params[2] == 4
+
+
+def test_retention_without_archive_dir_only_ensures_partitions(monkeypatch):
+    import lanai_retention
+    calls = []
+    monkeypatch.setattr(lanai_retention, "ARCHIVE_DIR", None)
+    monkeypatch.setattr(lanai_retention, "ensure_partitions", lambda: calls.append("ensure"))
+    monkeypatch.setattr(lanai_retention, "archive_partitions", lambda *a: calls.append("archive"))
+    lanai_retention.run()
+    assert calls == ["ensure"]
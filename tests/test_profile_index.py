@@ -0,0 +1,63 @@
+import os
+import json
+
+import pytest
+
+import profile_store
+from profile_index import ProfileIndex, profile_facts, tokenize
+
+with open(os.path.join(profile_store.BASE_DIR, "memoire_mohamed_lanai.json"), encoding="utf-8") as f:
+    MEM = json.load(f)
+
+
+def test_tokenize_folds_accents_stopwords_and_plurals():
+    assert tokenize("Les Voitures de Mohamed, à l'hôpital !") == ["voiture", "mohamed", "hopital"]
+    assert tokenize("") == [] and tokenize(None) == []
+
+
+def test_facts_skip_lanai_section_and_empty_values():
+    facts = profile_facts({"Identité": {"Prénom": "Ali", "Nom": ""}, "Lanai": {"Histoire": "x"}, "Notes": "texte"})
+    assert facts == [("Identité", "Prénom", "Ali")]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return ProfileIndex(profile_facts(MEM))
+
+
+def test_core_lines_always_present(index):
+    assert "Prénom: Mohamed" in index.core
+    assert any(line.startswith("Épouse: Milouda") for line in index.core)
+    assert any(line.startswith("Santé: Parkinson") for line in index.core)
+
+
+@pytest.mark.parametrize("question,expected", [
+    ("Tu te souviens de ma Ford Escort ?", "Métier préféré (rêvé)"),
+    ("La NBA reprend bientôt", "Sport préféré"),
+    ("Tu as des nouvelles de Jean Schultz ?", "Personnes souvent mentionnées"),
+    ("Qu'est-ce que je pourrais manger ce soir, des pâtes ?", "Plat préféré"),
+])
+def test_relevant_fact_in_top_k(index, question, expected):
+    assert any(line.startswith(expected) for line in index.relevant(question, k=3))
+
+
+def test_relevant_excludes_core_and_respects_k(index):
+    picked = index.relevant("Milouda et Faïza et le basket et la Ford", k=2)
+    assert len(picked) == 2 and not set(picked) & set(index.core)
+    assert index.relevant("zzz qwerty", k=4) == []
+
+
+def test_filtered_prompt_is_shorter(monkeypatch):
+    monkeypatch.setattr(profile_store, "PROFILE_BACKEND", "files")
+    monkeypatch.setattr(profile_store, "PROFILES_DIR", "/nonexistent")
+    monkeypatch.setattr(profile_store, "DEFAULT_PROFILE_FILE",
+                        os.path.join(profile_store.BASE_DIR, "memoire_mohamed_lanai.json"))
+    profile_store.invalidate()
+    full = profile_store.get_system_prompt("whatsapp:+33600000000")
+    short = profile_store.get_system_prompt("whatsapp:+33600000000", "On regarde le basket ce soir ?")
+    assert len(short) < len(full)
+    assert "Prénom: Mohamed" in short and "Sport préféré: Basket" in short
+    assert "Plat préféré" not in short
+    monkeypatch.setattr(profile_store, "RELEVANT_FACTS", 0)
+    assert profile_store.get_system_prompt("whatsapp:+33600000000", "basket") == full
+    profile_store.invalidate()
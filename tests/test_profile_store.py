@@ -0,0 +1,149 @@
+import os
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import profile_store as ps
+
+MOHAMED = "whatsapp:+33 6 12 34 56 78"
+
+
+def fiche(prenom, epouse=None, **lanai):
+    data = {"Identité": {"Prénom": prenom, "Nom": "Test", "Âge": "70 ans"}, "Famille": {}, "Lanai": lanai}
+    if epouse:
+        data["Famille"]["Nom de son épouse"] = epouse
+    return data
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(ps, "PROFILE_BACKEND", "files")
+    monkeypatch.setattr(ps, "PROFILES_DIR", str(tmp_path))
+    default = tmp_path / "defaut.json"
+    default.write_text(json.dumps(fiche("Défaut")), encoding="utf-8")
+    monkeypatch.setattr(ps, "DEFAULT_PROFILE_FILE", str(default))
+    ps.invalidate()
+    yield tmp_path
+    ps.invalidate()
+
+
+def write(tmp_path, phone, data, mtime=None):
+    path = tmp_path / f"{ps.phone_key(phone)}.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    if mtime:
+        os.utime(path, ns=(mtime, mtime))
+    return path
+
+
+def test_phone_key():
+    assert ps.phone_key(MOHAMED) == "33612345678"
+    assert ps.phone_key(None) == ""
+
+
+def test_prompt_from_repo_profile():
+    with open(os.path.join(ps.BASE_DIR, "memoire_mohamed_lanai.json"), encoding="utf-8") as f:
+        prompt = ps.build_system_prompt(json.load(f))
+    assert prompt.startswith("Voici des informations personnelles sur Mohamed Djeziri:\n- Prénom: Mohamed")
+    assert "- Épouse: Milouda (Mariés depuis le 25 mai 1991)" in prompt
+    assert "compagnon WhatsApp de Mohamed" in prompt
+
+
+def test_rules_use_first_name_and_lanai_section():
+    rules = ps.build_persona_rules(fiche("Fatima", **{"Clins d'œil": "son chat Minou", "Histoire": "Créé par Ali."}))
+    assert "compagnon WhatsApp de Fatima" in rules and "sauf si Fatima te demande" in rules
+    assert "clins d'œil à son chat Minou" in rules and '"Créé par Ali."' in rules
+    assert "compagnon WhatsApp de ton ami" in ps.build_persona_rules({})
+
+
+def test_per_user_file_and_default_fallback(store):
+    write(store, MOHAMED, fiche("Mohamed", "Milouda"))
+    assert "Épouse: Milouda" in ps.get_system_prompt(MOHAMED)
+    assert "sur Défaut Test" in ps.get_system_prompt("whatsapp:+33700000000")
+
+
+def test_missing_profile(store, monkeypatch):
+    monkeypatch.setattr(ps, "DEFAULT_PROFILE_FILE", str(store / "absent.json"))
+    with pytest.raises(FileNotFoundError):
+        ps.get_compiled(MOHAMED)
+
+
+def test_cache_hit_until_file_changes(store, monkeypatch):
+    loads = []
+    real_load = ps._load_file
+    monkeypatch.setattr(ps, "_load_file", lambda p: loads.append(p) or real_load(p))
+    write(store, MOHAMED, fiche("Mohamed"), mtime=1_000_000_000)
+    first = ps.get_compiled(MOHAMED)
+    assert ps.get_compiled(MOHAMED) is first and len(loads) == 1
+    write(store, MOHAMED, fiche("Mohamed", "Milouda"), mtime=2_000_000_000)
+    assert "Épouse: Milouda" in ps.get_system_prompt(MOHAMED) and len(loads) == 2
+
+
+def test_lru_eviction(store, monkeypatch):
+    monkeypatch.setattr(ps, "CACHE_SIZE", 2)
+    phones = [f"whatsapp:+3360000000{i}" for i in range(3)]
+    ps.get_compiled(phones[0])
+    ps.get_compiled(phones[1])
+    ps.get_compiled(phones[0])          # le plus récent : phones[1] devient le plus ancien
+    ps.get_compiled(phones[2])
+    assert list(ps._cache) == [phones[0], phones[2]]
+
+
+def test_invalidate(store):
+    ps.get_compiled(MOHAMED)
+    ps.invalidate(MOHAMED)
+    assert MOHAMED not in ps._cache
+
+
+# ==== Backend db (version en base, revérifiée au plus toutes les DB_CHECK_SECONDS) ====
+@pytest.fixture
+def db(monkeypatch):
+    state = {"version": 1, "data": fiche("Mohamed"), "version_queries": 0, "loads": 0}
+
+    def version(phone):
+        state["version_queries"] += 1
+        return state["version"]
+
+    def load(phone):
+        state["loads"] += 1
+        return state["data"]
+
+    monkeypatch.setattr(ps, "PROFILE_BACKEND", "db")
+    monkeypatch.setattr(ps, "_db_version", version)
+    monkeypatch.setattr(ps, "_db_load", load)
+    return state
+
+
+def test_db_version_checked_only_after_delay(db, monkeypatch):
+    monkeypatch.setattr(ps, "DB_CHECK_SECONDS", 3600)
+    ps.get_compiled(MOHAMED)
+    for _ in range(5):
+        ps.get_compiled(MOHAMED)
+    assert db["version_queries"] == 1 and db["loads"] == 1
+
+
+def test_db_version_bump_recompiles(db, monkeypatch):
+    monkeypatch.setattr(ps, "DB_CHECK_SECONDS", 0)
+    ps.get_compiled(MOHAMED)
+    db["version"], db["data"] = 2, fiche("Mohamed", "Milouda")
+    assert "Épouse: Milouda" in ps.get_system_prompt(MOHAMED)
+    assert db["loads"] == 2
+
+
+def test_db_missing_profile_falls_back_to_default(db):
+    db["data"] = None
+    assert "sur Défaut Test" in ps.get_system_prompt(MOHAMED)
+
+
+def test_db_steady_traffic_still_sees_edits(db, monkeypatch):
+    # Un appel toutes les 10 s, vérification toutes les 30 s : la modification doit être vue
+    clock = [1000.0]
+    monkeypatch.setattr(ps, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    monkeypatch.setattr(ps, "DB_CHECK_SECONDS", 30)
+    ps.get_compiled(MOHAMED)
+    db["version"], db["data"] = 2, fiche("Mohamed", "Milouda")
+    for _ in range(4):
+        clock[0] += 10
+        prompt = ps.get_system_prompt(MOHAMED)
+    assert "Épouse: Milouda" in prompt
+    assert db["version_queries"] == 2 and db["loads"] == 2
@@ -0,0 +1,76 @@
+import os
+import json
+import time
+from collections import Counter
+
+import pytest
+
+import lanai_profiler as prof
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(prof, "PROFILE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def busy(ms):
+    end = time.monotonic() + ms / 1000
+    while time.monotonic() < end:
+        sum(range(200))
+
+
+def test_disabled_by_default_is_a_shared_no_op(monkeypatch):
+    monkeypatch.setattr(prof, "ENABLED", False)
+    assert prof.turn("abc") is prof._NULL
+    with prof.turn("abc") as t:
+        assert t is None
+
+
+def test_fast_turn_not_kept_unless_sampled(profiles, monkeypatch):
+    monkeypatch.setattr(prof, "ENABLED", True)
+    monkeypatch.setattr(prof, "SAMPLE", 0)
+    monkeypatch.setattr(prof, "SLOW_MS", 0)
+    assert prof.turn("abc") is prof._NULL
+    monkeypatch.setattr(prof, "SLOW_MS", 60_000)
+    with prof.turn("abc"):
+        pass
+    assert prof.list_profiles() == []
+
+
+def test_slow_turn_is_saved_with_its_stacks(profiles, monkeypatch):
+    monkeypatch.setattr(prof, "ENABLED", True)
+    monkeypatch.setattr(prof, "SLOW_MS", 50)
+    monkeypatch.setattr(prof, "INTERVAL_MS", 5)
+    with prof.turn("SM-trace/1"):
+        busy(150)
+    [meta] = prof.list_profiles()
+    assert meta["trace"] == "SM-trace/1" and meta["reason"] == "slow" and meta["total_ms"] >= 150
+    assert "/" not in meta["id"] and meta["samples"] > 0
+    folded = prof.load_profile(meta["id"])
+    assert "busy (test_profiler.py:" in folded
+    summary = json.loads(prof.load_profile(meta["id"], "json"))
+    assert summary["top_self"][0][0].startswith("busy (")
+
+
+def test_summarize_self_and_cumulative():
+    stacks = Counter({("main", "handle", "gpt"): 3, ("main", "handle"): 1, ("main", "handle", "db", "handle"): 2})
+    s = prof.summarize(stacks)
+    assert s["top_self"][0] == ("gpt", 3)
+    assert dict(s["top_cumulative"]) == {"main": 6, "handle": 6, "gpt": 3, "db": 2}   # récursion comptée une fois
+
+
+def test_only_newest_profiles_are_kept(profiles, monkeypatch):
+    monkeypatch.setattr(prof, "KEEP", 2)
+    ids = []
+    for i in range(3):
+        ids.append(prof.save(f"t{i}", Counter({("f",): 1}), 10.0, "sample"))
+        meta = profiles / f"{ids[-1]}.json"
+        os.utime(meta, (1_000_000 + i, 1_000_000 + i))
+        prof._prune()
+    assert sorted(os.listdir(profiles)) == sorted(f"{i}.{ext}" for i in ids[1:] for ext in ("json", "folded"))
+
+
+@pytest.mark.parametrize("profile_id,kind", [("../etc/passwd", "folded"), ("inconnu", "folded"), ("x", "py")])
+def test_load_profile_rejects_unknown_or_unsafe(profiles, profile_id, kind):
+    assert prof.load_profile(profile_id, kind) is None
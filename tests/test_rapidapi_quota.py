@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+import rapidapi_quota as q  # noqa: E402
+
+HEADERS = {"x-rapidapi-host": "api-football-v1.p.rapidapi.com", "x-rapidapi-key": "secret-key"}
+API = q.api_of(HEADERS)
+
+
+class FakeResponse:
+    def __init__(self, status=200, remaining=None, payload=None):
+        self.status_code = status
+        self.headers = {} if remaining is None else {
+            "x-ratelimit-requests-limit": "100", "x-ratelimit-requests-remaining": str(remaining),
+            "x-ratelimit-requests-reset": "3600"}
+        self.payload = {"response": []} if payload is None else payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self):
+        self.responses = []
+        self.calls = []
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        self.calls.append((url, params))
+        r = self.responses.pop(0)
+        if isinstance(r, Exception):
+            raise r
+        return r
+
+
+def test_api_fingerprint_never_contains_the_key():
+    assert API.startswith("api-football-v1:") and "secret" not in API
+    assert q.api_of({**HEADERS, "x-rapidapi-key": "autre"}) != API
+    assert q.api_of({}) == q.api_of(None)
+
+
+@pytest.fixture
+def quota(monkeypatch, fake_db):
+    session = FakeSession()
+    monkeypatch.setattr(q, "_get_conn", fake_db.connect)
+    monkeypatch.setattr(q, "get_session", lambda: session)
+    monkeypatch.setattr(q, "_ensure_sync", lambda: None)     # pas de thread de synchro dans les tests
+    for name in ("_state", "_usage", "_pending"):
+        monkeypatch.setattr(q, name, {})
+    monkeypatch.setattr(q, "_dirty", set())
+    monkeypatch.setattr(q, "RESERVE", 5)
+    return session
+
+
+def known(remaining, reset_in=3600, updated=None):
+    q._state[API] = {"limit": 100, "remaining": remaining, "reset_at": time.time() + reset_in,
+                     "updated": time.time() if updated is None else updated}
+
+
+def test_reserve_is_kept_for_scheduled_jobs(quota):
+    known(5)
+    assert q.low(HEADERS, "webhook") and q.low(HEADERS, "live")
+    assert not q.low(HEADERS, "results")
+    known(0)
+    assert q.low(HEADERS, "results")
+
+
+def test_unknown_or_expired_quota_allows_calls(quota):
+    assert q.remaining(API) is None and not q.low(HEADERS)
+    known(0, reset_in=-1)                    # période de quota écoulée
+    assert q.remaining(API) is None and not q.low(HEADERS)
+
+
+def test_request_path_never_touches_the_db(quota, fake_db):
+    known(50)
+    quota.responses = [FakeResponse(remaining=42, payload={"response": [1]}), FakeResponse(status=500)]
+    assert q.request("https://x/fixtures", HEADERS, {"id": 1}, "webhook") == (200, {"response": [1]})
+    q.request("https://x/fixtures", HEADERS, {"id": 2}, "webhook")
+    assert q.remaining(API) == 41            # 2e réponse sans en-tête : estimation
+    assert fake_db.queries == []
+    assert q.snapshot()["usage"][f"{API}/webhook"] == {"calls": 2, "denied": 0, "errors": 1}
+
+
+def test_denied_call_sends_nothing(quota, fake_db):
+    known(3)
+    assert q.request("https://x/fixtures", HEADERS, {}, "webhook") == (429, {"error": "quota"})
+    assert quota.calls == [] and fake_db.queries == []
+    assert q._pending[(API, "webhook")]["denied"] == 1
+
+
+def test_flush_writes_deltas_once(quota, fake_db):
+    known(50)
+    quota.responses = [FakeResponse(remaining=49), FakeResponse(remaining=48)]
+    q.request("https://x/a", HEADERS, {}, "webhook")
+    q.request("https://x/b", HEADERS, {}, "webhook")
+    q.flush()
+    usage = [p for sql, p in fake_db.queries if "rapidapi_usage" in sql]
+    state = [p for sql, p in fake_db.queries if "rapidapi_quota" in sql]
+    assert usage == [(API, "webhook", 2, 0, 0)]
+    assert state[0][:3] == (API, 100, 48)
+    assert "WHERE rapidapi_quota.updated_at <= EXCLUDED.updated_at" in fake_db.sql()
+    fake_db.queries.clear()
+    q.flush()                                # rien de nouveau : aucune connexion
+    assert fake_db.queries == []
+
+
+def test_failed_flush_requeues(quota, monkeypatch):
+    known(50)
+    quota.responses = [FakeResponse(remaining=49)]
+    q.request("https://x/a", HEADERS, {}, "live")
+
+    def broken():
+        raise RuntimeError("base injoignable")
+
+    monkeypatch.setattr(q, "_get_conn", broken)
+    q.flush()
+    assert q._pending[(API, "live")]["calls"] == 1 and API in q._dirty
+
+
+def test_load_keeps_newer_local_state(quota, fake_db):
+    now = time.time()
+    known(30, updated=now)
+    fake_db.results = [[(API, 100, 10, now + 3600, now - 60), ("autre:1234", 500, 400, None, now)]]
+    q._load()
+    assert q._state[API]["remaining"] == 30
+    assert q._state["autre:1234"]["remaining"] == 400
+    fake_db.results = [[(API, 100, 10, now + 3600, now + 60)]]
+    q._load()
+    assert q._state[API]["remaining"] == 10
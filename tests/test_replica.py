@@ -0,0 +1,101 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+import memory_store as ms  # noqa: E402
+from conftest import FakeDB  # noqa: E402
+
+MOHAMED = "whatsapp:+33600000000"
+
+
+@pytest.fixture
+def replica(monkeypatch, fake_db):
+    """Réplica configuré : psycopg2.connect (réplica) → seconde FakeDB, _get_conn (primaire) → fake_db."""
+    db = FakeDB()
+    monkeypatch.setattr(ms, "DATABASE_REPLICA_URL", "postgresql://replica/lanai")
+    monkeypatch.setattr(ms.psycopg2, "connect", db.connect)
+    monkeypatch.setattr(ms, "_lag", {"value": None, "checked": 0.0})
+    monkeypatch.setattr(ms, "_last_write", {})
+    return db
+
+
+def with_lag(monkeypatch, lag):
+    monkeypatch.setattr(ms, "replica_lag", lambda: lag)
+
+
+def test_no_replica_reads_primary(fake_db, monkeypatch):
+    monkeypatch.setattr(ms, "DATABASE_REPLICA_URL", None)
+    assert ms.replica_lag() is None
+    conn, endpoint = ms._get_read_conn(MOHAMED)
+    assert endpoint == "primary" and conn in fake_db.conns
+
+
+@pytest.mark.parametrize("lag,endpoint", [(None, "primary"), (ms.REPLICA_MAX_LAG + 1, "primary"), (0.5, "replica")])
+def test_routing_by_lag(replica, monkeypatch, lag, endpoint):
+    with_lag(monkeypatch, lag)
+    assert ms._get_read_conn(MOHAMED)[1] == endpoint
+
+
+def test_read_your_writes(replica, fake_db, monkeypatch):
+    with_lag(monkeypatch, 0.5)
+    ms.add_message(MOHAMED, "user", "salam")
+    assert ms._get_read_conn(MOHAMED)[1] == "primary"
+    assert ms._get_read_conn("whatsapp:+33611111111")[1] == "replica"
+    assert ms._get_read_conn(None)[1] == "replica"
+
+
+def test_replica_connect_failure_falls_back(replica, monkeypatch):
+    with_lag(monkeypatch, 0.5)
+
+    def refuse(*args, **kwargs):
+        raise OSError("connexion refusée")
+
+    monkeypatch.setattr(ms.psycopg2, "connect", refuse)
+    assert ms._get_read_conn(MOHAMED)[1] == "primary"
+
+
+def lag_row(in_recovery=True, status="streaming", caught_up=False, since_receipt=0.2, since_replay=1.5):
+    return [(in_recovery, status, caught_up, since_receipt, since_replay)]
+
+
+def test_lag_measure_is_cached(replica, monkeypatch):
+    replica.results = [lag_row()]
+    assert ms.replica_lag() == 1.5
+    assert ms.replica_lag() == 1.5
+    assert len(replica.queries) == 1
+    assert all(conn.closed for conn in replica.conns)
+    monkeypatch.setattr(ms, "REPLICA_LAG_CHECK", 0)
+    replica.results = [lag_row(since_replay=3.0)]
+    assert ms.replica_lag() == 3.0
+
+
+@pytest.mark.parametrize("row,lag", [
+    (lag_row(in_recovery=False, status=None, since_receipt=None, since_replay=None), 0.0),   # primaire
+    (lag_row(caught_up=True, since_receipt=0.4, since_replay=3600.0), 0.4),   # primaire calme, rien à rejouer
+    (lag_row(status="waiting", caught_up=True), None),                         # flux WAL coupé
+    (lag_row(status=None, caught_up=True), None),                              # pas de WAL receiver
+    (lag_row(caught_up=True, since_receipt=None), None),
+    (lag_row(since_replay=None), None),                                        # horodatage de rejeu inconnu
+])
+def test_unknown_lag_makes_replica_unusable(replica, monkeypatch, row, lag):
+    replica.results = [row]
+    assert ms.replica_lag() == lag
+    if lag is None:
+        assert ms._get_read_conn(MOHAMED)[1] == "primary"
+
+
+def test_unreachable_replica_means_no_lag_value(replica, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise OSError("connexion refusée")
+
+    monkeypatch.setattr(ms.psycopg2, "connect", refuse)
+    assert ms.replica_lag() is None
+    assert ms._get_read_conn(MOHAMED)[1] == "primary"
+
+
+def test_history_read_is_timed_per_endpoint(replica, monkeypatch):
+    with_lag(monkeypatch, 0.5)
+    monkeypatch.setattr(ms, "_stats", {})
+    replica.results = [[{"role": "assistant", "content": "b"}, {"role": "user", "content": "a"}]]
+    assert ms.get_history(MOHAMED, limit=2) == [{"role": "user", "content": "a"},
+                                                 {"role": "assistant", "content": "b"}]
+    assert ms.db_stats()["replica"]["get_history"]["count"] == 1
@@ -0,0 +1,80 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import results_store as rs  # noqa: E402
+
+START, END = date(2026, 3, 1), date(2026, 3, 8)
+
+
+def match(fixture_id, home, away, home_id=None, away_id=None, day=date(2026, 3, 7)):
+    return {"sport": "football", "fixture_id": fixture_id, "match_date": day, "league_id": 61,
+            "league_name": "Ligue 1", "home_id": home_id, "home_name": home, "away_id": away_id,
+            "away_name": away, "home_score": 2, "away_score": 1, "status": "FT"}
+
+
+@pytest.fixture
+def db(fake_db, monkeypatch):
+    monkeypatch.setattr(rs, "_get_conn", fake_db.connect)
+    return fake_db
+
+
+def test_fold():
+    assert rs.fold("Paris Saint-Germain") == "paris saint germain"
+    assert rs.fold("  Olympique   d'Évian ") == "olympique d evian"
+    assert rs.fold(None) == ""
+
+
+def test_save_dedupes_then_purges(db, monkeypatch):
+    batches = []
+    monkeypatch.setattr(rs, "execute_values", lambda cur, sql, rows, page_size: batches.append(rows))
+    saved = rs.save_results([match(1, "PSG", "OM"), match(1, "PSG", "OM"), match(2, "Lens", "Lille"),
+                             match(None, "Sans", "Id")])
+    assert saved == 2 and len(batches[0]) == 2
+    assert batches[0][0][:2] == ("football", 1)
+    assert db.sql().startswith("DELETE FROM public.match_results WHERE match_date < CURRENT_DATE")
+    assert db.queries[-1][1] == (rs.KEEP_DAYS,) and db.commits == 1
+
+
+def test_save_nothing_still_purges(db):
+    assert rs.save_results([]) == 0
+    assert len(db.queries) == 1 and db.sql().startswith("DELETE")
+
+
+def test_find_by_name_matches_whole_words(db):
+    db.results = [[match(3, "AS Roma", "Lazio"), match(4, "OM", "Nice"), match(5, "PSG", "Lens")]]
+    row = rs.find_team_result("om", START, END)
+    assert row["fixture_id"] == 4 and row["team_name"] == "OM"
+    assert db.queries[0][1] == (START, END)
+
+
+def test_find_by_name_accent_insensitive(db):
+    db.results = [[match(6, "Saint-Étienne", "Metz")]]
+    assert rs.find_team_result("saint etienne", START, END)["team_name"] == "Saint-Étienne"
+    db.results = [[match(6, "Saint-Étienne", "Metz")]]
+    assert rs.find_team_result("Lyon", START, END) is None
+
+
+def test_find_by_team_id_uses_index(db):
+    db.results = [[match(7, "Monaco", "PSG", home_id=91, away_id=85)]]
+    row = rs.find_team_result("paris", START, END, sport="football", team_id=85)
+    assert row["team_name"] == "PSG"
+    sql, params = db.queries[0]
+    assert "(home_id = %(id)s OR away_id = %(id)s)" in sql and "LIMIT 1" in sql
+    assert params == {"id": 85, "start": START, "end": END, "sport": "football"}
+
+
+def test_aliases_are_folded(db):
+    rs.remember_alias("Paris SG", "football", 85, "Paris Saint Germain")
+    assert db.queries[0][1] == ("paris sg", "football", 85, "Paris Saint Germain")
+    db.results = [[{"id": 85, "name": "Paris Saint Germain"}]]
+    assert rs.lookup_alias("PARIS SG", "football") == {"id": 85, "name": "Paris Saint Germain"}
+    assert db.queries[1][1] == ("paris sg", "football")
+
+
+def test_alias_write_failure_is_not_fatal(monkeypatch):
+    def broken():
+        raise RuntimeError("base injoignable")
+    monkeypatch.setattr(rs, "_get_conn", broken)
+    rs.remember_alias("psg", "football", 85, "PSG")
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+import lanai_scheduler  # noqa: E402
+from lanai_scheduler import CronExpr, Job, PARIS  # noqa: E402
+
+
+def at(*args, fold=0):
+    return datetime(*args, tzinfo=PARIS).replace(fold=fold)
+
+
+def runs(expr: str, start: datetime, n: int) -> list:
+    cron, out = CronExpr(expr), []
+    for _ in range(n):
+        start = cron.next_after(start)
+        out.append(start)
+    return out
+
+
+# ==== Changement d'heure (Europe/Paris) ====
+def test_march_gap_is_skipped():
+    # 29/03/2026 : 02:00 → 03:00, 02:30 n'existe pas ce jour-là
+    assert CronExpr("30 2 * * *").next_after(at(2026, 3, 28, 12)) == at(2026, 3, 30, 2, 30)
+    assert runs("0 * * * *", at(2026, 3, 29, 0, 30), 3) == [
+        at(2026, 3, 29, 1), at(2026, 3, 29, 3), at(2026, 3, 29, 4)]
+
+
+def test_march_offsets_and_daily_spacing():
+    a, b = runs("0 9 * * *", at(2026, 3, 27, 12), 2)
+    assert a.utcoffset() == timedelta(hours=1) and b.utcoffset() == timedelta(hours=2)
+    assert b.astimezone(timezone.utc) - a.astimezone(timezone.utc) == timedelta(hours=23)   # journée de 23 h
+
+
+def test_october_repeated_hour_runs_once():
+    # 25/10/2026 : 03:00 → 02:00, 02:30 existe deux fois
+    assert CronExpr("30 2 * * *").next_after(at(2026, 10, 24, 12)) == at(2026, 10, 25, 2, 30)
+    assert CronExpr("30 2 * * *").next_after(at(2026, 10, 25, 2, 30)) == at(2026, 10, 26, 2, 30)
+    got = runs("*/30 * * * *", at(2026, 10, 25, 1, 50), 4)
+    assert [(t.hour, t.minute) for t in got] == [(2, 0), (2, 30), (3, 0), (3, 30)]
+    assert [t.utcoffset().seconds // 3600 for t in got] == [2, 2, 1, 1]
+
+
+def test_october_after_second_pass():
+    # on part du 2e passage de 02:15 (fold=1) : 02:30 heure d'hiver a déjà été sauté
+    assert CronExpr("30 2 * * *").next_after(at(2026, 10, 25, 2, 15, fold=1)) == at(2026, 10, 26, 2, 30)
+
+
+# ==== Jour du mois / jour de semaine ====
+def test_dom_or_dow_when_both_restricted():
+    # le 1er OU le lundi, comme cron
+    got = runs("0 9 1 * 1", at(2026, 10, 30, 12), 3)
+    assert got == [at(2026, 11, 1, 9), at(2026, 11, 2, 9), at(2026, 11, 9, 9)]
+
+
+def test_dom_only_and_dow_only():
+    assert runs("0 9 1 * *", at(2026, 10, 30, 12), 2) == [at(2026, 11, 1, 9), at(2026, 12, 1, 9)]
+    assert runs("0 9 * * 1", at(2026, 10, 30, 12), 2) == [at(2026, 11, 2, 9), at(2026, 11, 9, 9)]
+
+
+def test_sunday_is_0_or_7():
+    assert CronExpr("0 9 * * 7").next_after(at(2026, 10, 30, 12)) == at(2026, 11, 1, 9)
+    assert CronExpr("0 9 * * 0").dows == CronExpr("0 9 * * 7").dows == {0}
+
+
+def test_ranges_lists_and_steps():
+    c = CronExpr("5,35 8-10/2 * * 1-5")
+    assert c.minutes == {5, 35} and c.hours == {8, 10} and c.dows == {1, 2, 3, 4, 5}
+    assert c.next_after(at(2026, 10, 31, 12)) == at(2026, 11, 2, 8, 5)   # samedi → lundi
+
+
+@pytest.mark.parametrize("expr", ["", "* * * *", "60 * * * *", "* 24 * * *", "0 0 0 * *", "*/0 * * * *", "5-1 * * * *"])
+def test_invalid_expressions(expr):
+    with pytest.raises(ValueError):
+        CronExpr(expr)
+
+
+def test_no_occurrence_within_a_year():
+    with pytest.raises(ValueError):
+        CronExpr("0 0 31 2 *").next_after(at(2026, 1, 1))
+
+
+# ==== Registre / exécution ====
+def test_registry_env_overrides(monkeypatch):
+    monkeypatch.setenv("LANAI_CRON_RESULTS", "15 8 * * 1-5")
+    monkeypatch.setenv("LANAI_CRON_WEATHER", "off")
+    jobs = {j.name: j for j in lanai_scheduler.build_registry()}
+    assert jobs["results"].cron.expr == "15 8 * * 1-5"
+    assert "weather" not in jobs and "content" in jobs
+
+
+def test_jitter_stays_within_bounds():
+    job = Job("x", "0 9 * * *", lambda: None, jitter=60)
+    job.plan(at(2026, 10, 19, 12))
+    assert job.next_run == at(2026, 10, 20, 9)
+    assert job.next_run <= job.due_at() <= job.next_run + timedelta(seconds=60)
+    job = Job("x", "0 9 * * *", lambda: None, jitter=0)
+    job.plan(at(2026, 10, 19, 12))
+    assert job.due_at() == job.next_run
+
+
+def test_failing_job_is_recorded_and_released(monkeypatch):
+    runs = []
+    monkeypatch.setattr(lanai_scheduler, "record_run", lambda *args, **kw: runs.append(args))
+
+    def boom():
+        raise RuntimeError("API en panne")
+
+    job = Job("results", "0 9 * * *", boom)
+    job.running = True
+    lanai_scheduler._execute(job, at(2026, 10, 19, 9))
+    assert not job.running
+    (name, scheduled, status, started, finished, error), = runs
+    assert (name, status) == ("results", "error") and "API en panne" in error
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("psycopg2")
+import memory_store  # noqa: E402
+
+
+def test_no_usable_terms_skips_the_query(fake_db):
+    assert memory_store.search_history("whatsapp:+33", ["", "l'autre", "a-b"]) == []
+    assert fake_db.queries == []
+
+
+def test_terms_are_or_ed_and_ranked(fake_db):
+    row = {"role": "user", "content": "mon genou", "created_at": datetime(2026, 1, 5), "rank": 0.4}
+    fake_db.results = [[row]]
+    assert memory_store.search_history("whatsapp:+33", ["genou", "médecin"], limit=3) == [row]
+    sql, params = fake_db.queries[0]
+    assert "to_tsquery('public.fr_unaccent', %s)" in sql and "content_tsv @@ q" in sql
+    assert "ORDER BY rank DESC, created_at DESC" in sql
+    assert params == ["genou | médecin", "whatsapp:+33", 3]
+
+
+def test_skip_recent_excludes_the_history_window(fake_db):
+    memory_store.search_history("whatsapp:+33", ["genou"], limit=3, skip_recent=20)
+    sql, params = fake_db.queries[0]
+    assert "created_at < ( SELECT min(created_at) FROM ( SELECT created_at FROM public.messages" in sql
+    assert params == ["genou", "whatsapp:+33", "whatsapp:+33", 20, 3]
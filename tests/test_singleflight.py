@@ -0,0 +1,77 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight, group, request_key
+
+
+def concurrent(flight, key, fn, n=5):
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        futures = [pool.submit(flight.do, key, fn) for _ in range(n)]
+        return [f.exception() or f.result() for f in futures]
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond() and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_call():
+    flight, release, calls = SingleFlight("test"), threading.Event(), []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return {"response": [1]}
+
+    results = []
+    t = threading.Thread(target=lambda: results.extend(concurrent(flight, "k", fetch)))
+    t.start()
+    wait_for(lambda: flight.stats()["saved"] == 4)
+    release.set()
+    t.join()
+    assert len(calls) == 1 and all(r is results[0] for r in results)
+    assert flight.stats() == {"executed": 1, "saved": 4, "in_flight": 0}
+
+
+def test_error_is_shared_then_key_is_released():
+    flight, release = SingleFlight("test"), threading.Event()
+
+    def boom():
+        release.wait(2)
+        raise TimeoutError("api lente")
+
+    results = []
+    t = threading.Thread(target=lambda: results.extend(concurrent(flight, "k", boom, n=3)))
+    t.start()
+    wait_for(lambda: flight.stats()["saved"] == 2)
+    release.set()
+    t.join()
+    assert all(isinstance(r, TimeoutError) for r in results) and len({id(r) for r in results}) == 1
+    assert flight.do("k", lambda: "ok") == "ok"     # rien de coincé après l'erreur
+
+
+def test_sequential_calls_are_not_coalesced():
+    flight = SingleFlight("test")
+    assert [flight.do("k", lambda: i) for i in range(3)] == [0, 1, 2]
+    assert flight.stats()["saved"] == 0
+
+
+def test_request_key_merges_url_and_params():
+    a = request_key("https://api.example.com/v3/fixtures?team=85&season=2025", {"last": 1})
+    b = request_key("https://api.example.com/v3/fixtures", {"last": "1", "season": 2025, "team": 85})
+    assert a == b == ("api.example.com", "/v3/fixtures", (("last", "1"), ("season", "2025"), ("team", "85")))
+    assert request_key("https://api.example.com/v3/teams", {"search": "psg"}) != a
+
+
+def test_groups_are_shared_by_name():
+    assert group("test-groupe") is group("test-groupe")
+    assert group("test-groupe") is not group("autre-groupe")
+
+
+@pytest.mark.parametrize("key", [("a", 1), "chaîne", 42])
+def test_any_hashable_key(key):
+    assert SingleFlight("test").do(key, lambda: key) == key
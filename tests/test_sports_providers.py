@@ -0,0 +1,165 @@
+import time
+from datetime import date
+
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("requests")
+import sports_providers as sp  # noqa: E402
+from fixtures import Status  # noqa: E402
+
+
+class FakeProvider(sp.Provider):
+    key_env = "LANAI_TEST_KEY"
+    default_host = "fake.p.rapidapi.com"
+    teams_path = "/teams"
+    fixtures_path = "/fixtures"
+
+    def __init__(self, sport, result=None, delay=0.0, error=None, timeout=1.0):
+        super().__init__()
+        self.sport, self.result, self.delay, self.error, self.timeout = sport, result, delay, error, timeout
+        self.calls = 0
+
+    def parse(self, response):
+        return sp.parse_football(response)
+
+    def lookup(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    sp.clear_cache()
+    yield
+    sp.clear_cache()
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """rapidapi_quota.request simulé : réponses préparées, appels enregistrés."""
+    calls, responses = [], []
+
+    def request(url, headers, params, caller, timeout=25):
+        calls.append((url, params, caller))
+        return responses.pop(0) if responses else (200, {"response": []})
+
+    monkeypatch.setattr(sp.rapidapi_quota, "request", request)
+    monkeypatch.setenv("LANAI_TEST_KEY", "k")
+    return calls, responses
+
+
+def test_cached_keeps_values_but_not_failures():
+    calls = []
+    assert sp.cached("k", 60, lambda: calls.append(1) or "v") == "v"
+    assert sp.cached("k", 60, lambda: calls.append(1) or "autre") == "v"
+    assert sp.cached("none", 60, lambda: calls.append(1)) is None
+    assert sp.cached("none", 60, lambda: calls.append(1) or "ok") == "ok"
+    assert len(calls) == 3
+
+
+def test_cached_expires():
+    sp.cached("k", 0, lambda: "ancien")
+    assert sp.cached("k", 60, lambda: "nouveau") == "nouveau"
+
+
+def test_search_team_is_cached_by_folded_name(api):
+    calls, responses = api
+    responses.append((200, {"response": [{"team": {"id": 85, "name": "Paris Saint Germain"}}]}))
+    p = FakeProvider("football")
+    assert p.search_team("PSG") == {"id": 85, "name": "Paris Saint Germain"}
+    assert p.search_team(" psg ") == {"id": 85, "name": "Paris Saint Germain"}
+    assert calls == [("https://fake.p.rapidapi.com/teams", {"search": "PSG"}, "webhook")]
+
+
+def test_search_team_unknown_or_failed(api):
+    calls, responses = api
+    responses.extend([(200, {"response": []}), (429, {"error": "quota"}), (200, {"response": [{"id": 3}]})])
+    p = FakeProvider("football")
+    assert p.search_team("Inconnu FC") is None
+    assert p.search_team("Lens") is None            # quota : pas mis en cache…
+    assert p.search_team("Lens") == {"id": 3, "name": "Lens"}   # … l'appel suivant retente
+    assert len(calls) == 3
+
+
+def test_team_fixtures_parsed(api):
+    calls, responses = api
+    responses.append((200, {"response": [{
+        "fixture": {"id": 9, "timestamp": 1_700_000_000, "status": {"short": "FT"}},
+        "teams": {"home": {"id": 85, "name": "PSG"}, "away": {"id": 81, "name": "OM"}},
+        "goals": {"home": 3, "away": 0}}]}))
+    [m] = FakeProvider("football").team_fixtures(85, date(2026, 3, 1), date(2026, 3, 8))
+    assert m.fixture_id == 9 and m.status is Status.FINISHED
+    assert calls[0][1] == {"team": 85, "from": "2026-03-01", "to": "2026-03-08"}
+
+
+def test_unconfigured_provider_makes_no_call(api, monkeypatch):
+    monkeypatch.delenv("LANAI_TEST_KEY")
+    p = FakeProvider("football")
+    assert not p.configured and p.search_team("psg") is None and p.team_fixtures(85, date.today(), date.today()) is None
+    assert api[0] == []
+
+
+def test_season_football():
+    assert sp.season_football("2025-08-10") == 2025
+    assert sp.season_football("2026-03-01") == 2025
+
+
+def test_register_replaces_same_sport_and_keeps_order():
+    reg = sp.Registry()
+    reg.register(FakeProvider("football"))
+    reg.register(FakeProvider("basketball"))
+    new_foot = reg.register(FakeProvider("football"))
+    assert reg.sports() == ["basketball", "football"] and reg.get("football") is new_foot
+    assert reg.get("rugby") is None
+
+
+def test_fan_out_drops_slow_and_failing_providers():
+    reg = sp.Registry()
+    ok = FakeProvider("football", result="3-0")
+    slow = FakeProvider("basketball", result="88-91", delay=0.5, timeout=0.05)
+    broken = FakeProvider("rugby", error=RuntimeError("HTTP 500"))
+    t0 = time.monotonic()
+    assert reg.fan_out(lambda p: p.lookup(), [ok, slow, broken]) == {"football": "3-0"}
+    assert time.monotonic() - t0 < 0.4                 # personne n'attend le fournisseur lent
+    assert reg.fan_out(lambda p: p.lookup(), []) == {}
+
+
+def test_registry_has_football_then_basketball():
+    assert sp.registry.sports()[:2] == ["football", "basketball"]
+
+
+def test_cache_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(sp, "CACHE_SIZE", 2)
+    sp.cached("a", 60, lambda: 1)
+    sp.cached("b", 60, lambda: 2)
+    sp.cached("a", 60, lambda: None)              # lu : 'a' devient le plus récent
+    sp.cached("c", 60, lambda: 3)
+    assert list(sp._cache) == ["a", "c"]
+
+
+def test_provider_without_parse_cannot_be_built():
+    class Incomplete(sp.Provider):
+        sport = "rugby"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_first_stops_at_the_first_result():
+    reg = sp.Registry()
+    empty = FakeProvider("football")
+    hit = FakeProvider("basketball", result="88-91")
+    after = FakeProvider("rugby", result="21-18")
+    assert reg.first(lambda p: p.lookup(), [empty, hit, after]) == ("basketball", "88-91")
+    assert (empty.calls, hit.calls, after.calls) == (1, 1, 0)
+
+
+def test_first_skips_slow_and_failing_providers():
+    reg = sp.Registry()
+    providers = [FakeProvider("football", error=RuntimeError("HTTP 500")),
+                 FakeProvider("basketball", result="x", delay=0.5, timeout=0.05)]
+    assert reg.first(lambda p: p.lookup(), providers) == (None, None)